@@ -1,5 +1,12 @@
 #!/bin/sh
+# Usage: ./resetdb.sh [snapshot directory]
+# Without a snapshot (see manage.py dump_snapshot), the fixtures are loaded.
 python3 manage.py reset_db && \
 python3 manage.py migrate && \
-python3 manage.py loaddata sigma_core/fixtures/fixtures_prod.json && \
-python3 manage.py loaddata fixtures.json
+python3 manage.py createcachetable && \
+if [ -n "$1" ]; then
+    python3 manage.py load_snapshot "$1"
+else
+    python3 manage.py loaddata sigma_core/fixtures/fixtures_prod.json && \
+    python3 manage.py loaddata fixtures.json
+fi
@@ -0,0 +1,133 @@
+"""
+Batch of API requests in a single round trip.
+
+Clients POST to /batch/ a list of sub-requests to the routes of the router:
+
+    [
+        {"method": "GET", "url": "/group/42/"},
+        {"method": "GET", "url": "/group-member/?group=42", "headers": {"If-None-Match": "\\"...\\""}},
+        {"method": "PUT", "url": "/user/7/", "body": {"phone": "0123456789"}}
+    ]
+
+and get their results in the same order:
+
+    [{"status": 200, "headers": {"ETag": "..."}, "body": {...}}, ...]
+
+The batch is authenticated (and the CSRF token checked) once: the sub-requests are run by the views with the user and
+the token of the batch, and share its user instance, hence its memoized VisibilityContext and memberships.
+Sub-requests which modify data drop them, so that the next ones see the new memberships and rights. Sub-requests are not run in a transaction: a
+failed sub-request does not roll back the previous ones. Settings:
+
+    BATCH = {
+        'MAX_REQUESTS': 20,    # Sub-requests per batch
+    }
+"""
+import json
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.urlresolvers import Resolver404, get_script_prefix, resolve
+
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ViewSetMixin
+
+from sigma_core.visibility import VisibilityContext
+
+
+DEFAULTS = {
+    'MAX_REQUESTS': 20,
+}
+
+def get_setting(name):
+    return getattr(settings, 'BATCH', {}).get(name, DEFAULTS[name])
+
+
+METHODS = ('GET', 'POST', 'PUT')
+
+# Headers which sub-requests may set, and headers of the sub-responses which are sent back
+REQUEST_HEADERS = ('If-None-Match', 'If-Modified-Since')
+RESPONSE_HEADERS = ('ETag', 'Last-Modified', 'Location')
+
+
+def header_key(name):
+    return 'HTTP_' + name.upper().replace('-', '_')
+
+
+def parse_sub_request(item):
+    """
+    Return the (method, path, query string, headers, body) of a sub-request, or raise ValidationError.
+    """
+    if not isinstance(item, dict):
+        raise ValidationError('Sub-requests must be objects.')
+    method = str(item.get('method', 'GET')).upper()
+    if method not in METHODS:
+        raise ValidationError('Unsupported method: %s.' % method)
+    url = item.get('url')
+    if not isinstance(url, str) or not url.startswith('/'):
+        raise ValidationError('Sub-requests need an absolute path url.')
+    headers = item.get('headers', {})
+    if not isinstance(headers, dict) or not all(name in REQUEST_HEADERS and isinstance(value, str) for (name, value) in headers.items()):
+        raise ValidationError('Sub-requests headers are limited to: %s.' % ', '.join(REQUEST_HEADERS))
+    (path, query) = urlsplit(url)[2:4]
+    return (method, path, query, headers, item.get('body'))
+
+
+class BatchView(APIView):
+    """
+    Run a list of sub-requests (GET, POST or PUT) to the routes of the API, and return their results in order.
+    """
+    def make_sub_request(self, request, method, path, query, headers, body):
+        environ = {key: value for (key, value) in request.META.items() if not key.startswith('HTTP_IF_')}
+        content = json.dumps(body).encode() if body is not None and method != 'GET' else b''
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+            'wsgi.input': BytesIO(content),
+        })
+        environ.update((header_key(name), value) for (name, value) in headers.items())
+        sub_request = WSGIRequest(environ)
+        # Authenticated once, by the batch itself
+        sub_request.user = request.user
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        if hasattr(request._request, 'session'):
+            sub_request.session = request._request.session
+        return sub_request
+
+    def run(self, request, method, path, query, headers, body):
+        prefix = get_script_prefix()
+        try:
+            match = resolve('/' + path[len(prefix):] if path.startswith(prefix) else path)
+        except Resolver404:
+            match = None
+        # Only the routes of the router (this excludes the batches themselves)
+        if match is None or not issubclass(getattr(match.func, 'cls', object), ViewSetMixin):
+            return {'status': status.HTTP_404_NOT_FOUND, 'headers': {}, 'body': {'detail': 'Not found.'}}
+
+        sub_request = self.make_sub_request(request, method, path, query, headers, body)
+        sub_request.resolver_match = match
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if method != 'GET':
+            VisibilityContext.invalidate(request.user)
+            request.user.clear_memberships_cache()
+        return {
+            'status': response.status_code,
+            'headers': {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)},
+            'body': getattr(response, 'data', None),
+        }
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError('Expected a list of sub-requests.')
+        if len(request.data) > get_setting('MAX_REQUESTS'):
+            raise ValidationError('At most %d sub-requests per batch.' % get_setting('MAX_REQUESTS'))
+        sub_requests = [parse_sub_request(item) for item in request.data]
+        return Response([self.run(request, *sub_request) for sub_request in sub_requests])
@@ -0,0 +1,101 @@
+"""
+Conditional GET on the API objects.
+
+The representation of an object is dated by timestamp columns which are bumped whenever it changes: auto_now fields,
+and the signals of sigma_core.signals for its relations and counters. Its ETag and Last-Modified are computed from
+these columns with a single indexed query, before the object is loaded: when the client already has the current
+representation, a 304 is sent without running the serializer.
+"""
+import hashlib
+from functools import wraps
+
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+from sigma.fieldsets import EXPAND_PARAM, FIELDS_PARAM
+
+
+def is_not_modified(request, etag, timestamp):
+    """
+    Return True iff the client's copy, as described by the If-None-Match or If-Modified-Since headers, is current.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # It takes precedence over If-Modified-Since
+        return if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and since >= int(timestamp)
+
+
+def make_etag(key):
+    return '"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def object_version(queryset, pk, fields, variant=None):
+    """
+    Return the version of the object pk of queryset, as expected from the get_version functions of conditional(): its
+    key is made of the values of the given timestamp fields (which may span relations) and of variant (eg. the
+    serializer which is used), and it was last modified at the latest of these timestamps.
+    Return None if queryset does not hold pk.
+    """
+    try:
+        rows = list(queryset.filter(pk=pk).values_list(*fields)[:1])
+    except (TypeError, ValueError):
+        return None
+    if not rows:
+        return None
+    timestamps = [t for t in rows[0] if t is not None]
+    if not timestamps:
+        return None
+    return ((queryset.model._meta.label, str(pk), variant) + rows[0], max(timestamps))
+
+
+def instance_version(instance, fields, variant=None):
+    """
+    Return the version of an instance which is already loaded, as object_version() would from the database. The
+    related objects the fields span must have been loaded along.
+    """
+    values = []
+    for field in fields:
+        value = instance
+        for name in field.split('__'):
+            value = getattr(value, name) if value is not None else None
+        values.append(value)
+    timestamps = [t for t in values if t is not None]
+    if not timestamps:
+        return None
+    return ((instance._meta.label, str(instance.pk), variant) + tuple(values), max(timestamps))
+
+
+def conditional(get_version):
+    """
+    Decorate a viewset method to answer conditional GETs.
+
+    get_version(viewset, request, *args, **kwargs) returns the (key, last_modified datetime) of the representation
+    which would be sent, or None if it cannot be dated (eg. the object does not exist): the method is then called as
+    usual. The key must change whenever the representation does, and hold whatever it depends on besides the object.
+    Expanded relations (see sigma.fieldsets) are not dated: their requests are never conditional.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            is_conditional = request.method in ('GET', 'HEAD') and not request.query_params.get(EXPAND_PARAM)
+            version = get_version(self, request, *args, **kwargs) if is_conditional else None
+            if version is None:
+                return method(self, request, *args, **kwargs)
+
+            (key, last_modified) = version
+            # The JSON and the browsable API representations are not the same
+            etag = make_etag((request.accepted_renderer.format, request.query_params.get(FIELDS_PARAM)) + tuple(key))
+            timestamp = last_modified.timestamp()
+            if is_not_modified(request, etag, timestamp):
+                response = HttpResponseNotModified()
+            else:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(timestamp)
+            return response
+        return wrapper
+    return decorator
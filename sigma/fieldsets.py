@@ -0,0 +1,165 @@
+"""
+Sparse fieldsets and expansion of the relations.
+
+GET requests select the fields of the representations with the `fields` query parameter, and nest related objects
+with the `expand` one:
+
+    /user/?fields=id,firstname,lastname,photo.variants
+    /group-member/?expand=user,group&fields=id,user.lastname,group.name
+
+Dotted names select the fields of nested (or expanded) objects, which are sent whole otherwise. Expanded relations are
+sent whether they are selected or not. The relations which can be expanded are listed by the `expandable` attribute of
+the serializers' Meta; unknown names are ignored.
+
+Unselected fields are not evaluated, and querysets only load what the selected ones need: see load_only(), and
+sigma.values_serializer for the lists. Computed fields (methods and properties) declare the model fields they read in
+the `field_sources` attribute of the serializers' Meta: they load every column otherwise.
+"""
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import ManyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_names(value):
+    """
+    'a,b.c,b.d' => {'a': {}, 'b': {'c': {}, 'd': {}}}
+    """
+    tree = OrderedDict()
+    for name in (value or '').split(','):
+        node = tree
+        for part in name.strip().split('.'):
+            if part:
+                node = node.setdefault(part, OrderedDict())
+    return tree
+
+
+def format_names(tree, prefix=''):
+    """
+    {'b': {'d': {}, 'c': {}}, 'a': {}} => 'a,b.c,b.d': the canonical form of the trees of parse_names
+    """
+    return ','.join(format_names(subtree, prefix + name + '.') if subtree else prefix + name for (name, subtree) in sorted(tree.items()))
+
+
+def get_canonical_selection(query_params):
+    """
+    {param: value} of the `fields` and `expand` parameters in query_params, in their canonical form (empty ones are
+    dropped): requests with the same canonical selection get the same representations.
+    """
+    params = {}
+    for param in (FIELDS_PARAM, EXPAND_PARAM):
+        names = format_names(parse_names(query_params.get(param)))
+        if names:
+            params[param] = names
+    return params
+
+
+class SparseFieldsMixin(object):
+    """
+    Serializer whose fields are selected by the `fields` and `expand` query parameters of GET requests.
+    """
+    # (fields tree or None for every field, expand tree), given by the parent serializer
+    selection = None
+
+    def get_selection(self):
+        if self.selection is not None:
+            return self.selection
+        parent = self.parent.parent if isinstance(self.parent, ListSerializer) else self.parent
+        request = self.context.get('request')
+        # Nested serializers are only selected through their parent
+        if parent is not None or request is None or request.method not in SAFE_METHODS:
+            return (None, {})
+        # No names (eg. "fields=,") selects every field, as no parameter does
+        fields = parse_names(request.query_params.get(FIELDS_PARAM))
+        return (fields or None, parse_names(request.query_params.get(EXPAND_PARAM)))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        (selected, expanded) = self.get_selection()
+        expandable = getattr(self.Meta, 'expandable', {})
+        for name in expanded:
+            if name in expandable:
+                (serializer_class, kwargs) = expandable[name]
+                fields[name] = serializer_class(read_only=True, **kwargs)
+        if selected is not None:
+            fields = OrderedDict((name, field) for (name, field) in fields.items() if name in selected or name in expanded)
+
+        for (name, field) in fields.items():
+            nested = field.child if isinstance(field, ListSerializer) else field
+            if isinstance(nested, SparseFieldsMixin):
+                subfields = selected.get(name) if selected is not None else None
+                nested.selection = (subfields or None, expanded.get(name, {}))
+        return fields
+
+
+def get_field_sources(serializer, name):
+    """
+    Names of the model fields needed by the computed field name, None if unknown.
+    """
+    return getattr(serializer.Meta, 'field_sources', {}).get(name)
+
+
+def get_loaded_fields(serializer, prefix=''):
+    """
+    Return the (only() names, select_related() paths, prefetch_related() paths) needed by the fields of serializer.
+    """
+    model = serializer.Meta.model
+    (only, joins, prefetches) = ([prefix + model._meta.pk.name], [], [])
+    for (name, field) in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, (ManyRelatedField, ListSerializer)):
+            prefetches.append(prefix + field.source)
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            model_field = None
+        if model_field is None or not model_field.concrete:
+            # Computed field
+            sources = get_field_sources(serializer, name)
+            if sources is None:
+                sources = [f.name for f in model._meta.concrete_fields]
+            only.extend(prefix + source for source in sources)
+        elif isinstance(field, BaseSerializer):
+            only.append(prefix + model_field.name)
+            joins.append(prefix + model_field.name)
+            (nested_only, nested_joins, nested_prefetches) = get_loaded_fields(field, prefix + model_field.name + '__')
+            only.extend(nested_only)
+            joins.extend(nested_joins)
+            prefetches.extend(nested_prefetches)
+        else:
+            only.append(prefix + model_field.name)
+    return (only, joins, prefetches)
+
+
+def load_only(queryset, serializer):
+    """
+    Restrict queryset to the columns and the relations which serializer needs. Its joins are replaced (not its
+    prefetches, which the view may need).
+    """
+    (only, joins, prefetches) = get_loaded_fields(serializer)
+    queryset = queryset.select_related(None).only(*only)
+    if joins:
+        queryset = queryset.select_related(*joins)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+class SparseQuerysetMixin(object):
+    """
+    Views whose retrieved objects are loaded with load_only() (lists go through sigma.values_serializer).
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = load_only(queryset, self.get_serializer())
+        return queryset
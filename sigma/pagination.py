@@ -0,0 +1,112 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination: results are ordered on a (sort key, ..., id) tuple and the cursor holds the values of that tuple
+    for the last item of the page. The next page is then fetched with an indexed range condition, whatever its depth,
+    and no COUNT query is ever run.
+
+    Views define their ordering with a `pagination_ordering` attribute; it must end with an unique field.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 500
+    ordering = ('pk', )
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = getattr(view, 'pagination_base_url', None) or request.build_absolute_uri()
+        self.ordering = getattr(view, 'pagination_ordering', self.ordering)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        # Fetch an extra item to know whether there is a following page
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.has_next = len(results) > self.page_size
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_position_filter(self, position):
+        """
+        Translate (f1, f2, ...) > (p1, p2, ...) into (f1 > p1) OR (f1 = p1 AND f2 > p2) OR ...
+        """
+        condition = None
+        for (field, value) in reversed(list(zip(self.ordering, position))):
+            name = field.lstrip('-')
+            after = Q(**{name + ('__lt' if field.startswith('-') else '__gt'): value})
+            condition = after if condition is None else after | (Q(**{name: value}) & condition)
+        return condition
+
+    def get_position(self, item):
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(item, dict):
+            return [item['id' if f == 'pk' and 'pk' not in item else f] for f in fields]
+        return [getattr(item, f) for f in fields]
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [self.to_python(model, field, value) for (field, value) in zip(self.ordering, position)]
+        except (TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, field, value):
+        # Scalars only: the value ends up in a lookup, and range lookups do not accept None
+        if not isinstance(value, (str, int, float, bool)):
+            raise TypeError(value)
+        name = field.lstrip('-')
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+        return field.to_python(value)
+
+    def encode_cursor(self, position):
+        encoded = urlsafe_b64encode(json.dumps(position, default=str).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
@@ -53,6 +53,7 @@ INSTALLED_APPS = (
 
 MIDDLEWARE_CLASSES = (
     'corsheaders.middleware.CorsMiddleware',
+    'sigma.sql_metrics.SQLMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -96,6 +97,16 @@ DATABASES = {
     }
 }
 
+# Shared by every process of the server: the cached clusters (see sigma_core.cluster_cache) are only invalidated in the
+# processes sharing the cache of the one which writes, so a per-process cache (LocMemCache) must not be used there.
+# Create its table with `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'sigma_cache',
+    }
+}
+
 # Rest framework
 REST_FRAMEWORK = {
     'DEFAULT_MODEL_SERIALIZER_CLASS':
@@ -112,9 +123,88 @@ REST_FRAMEWORK = {
         'rest_framework.filters.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter'
     ),
+    'DEFAULT_PAGINATION_CLASS': 'sigma.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 }
 
+# SQL instrumentation (see sigma.sql_metrics)
+SQL_METRICS = {
+    'SAMPLE_RATE': 0.1,
+    'LOG_INTERVAL': 300,
+}
+
+# Batches of API requests (see sigma.batch)
+BATCH = {
+    'MAX_REQUESTS': 20,
+}
+
+# Bulk import of users (see sigma_core.user_import)
+USER_IMPORT = {
+    'BATCH_SIZE': 500,
+    'HASHING_PROCESSES': None,
+}
+
+# Queued outgoing mail, delivered by the send_queued_mail worker (see sigma_core.outbox)
+OUTBOX = {
+    'BATCH_SIZE': 100,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 8,
+    'RETRY_DELAY': 60,
+    'MAX_RETRY_DELAY': 3600,
+    'POLL_INTERVAL': 5,
+}
+
+# Hash the uploads while they are received, for the content-addressed storage (see sigma_files.storage)
+FILE_UPLOAD_HANDLERS = [
+    'sigma_files.uploadhandler.HashingMemoryFileUploadHandler',
+    'sigma_files.uploadhandler.HashingTemporaryFileUploadHandler',
+]
+
+# Delivery of the media files (see sigma_files.media)
+MEDIA_SERVING = {
+    'BACKEND': 'python',
+    'INTERNAL_URL': '/protected-media/',
+    'MAX_AGE': 365 * 24 * 3600,
+    'PUBLIC': True,
+}
+
+# Resumable uploads (see sigma_files.views.UploadSessionViewSet)
+UPLOAD_SESSIONS = {
+    'DIRECTORY': None,
+    'MAX_SIZE': 20 * 1024 * 1024,
+    'EXPIRY': 24 * 3600,
+}
+
+# Sized copies of the uploaded images (see sigma_files.variants)
+IMAGE_VARIANTS = {
+    'SIZES': {'thumb': 128, 'medium': 512, 'large': 1600},
+    'WEBP': False,
+    'QUALITY': 85,
+    'WORKERS': 2,
+    'QUEUE_SIZE': 16,
+    'EAGER': False,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'sql_metrics_file': {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'sql_metrics.log'),
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'sigma.sql_metrics': {
+            'handlers': ['sql_metrics_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # OAuth2
 OAUTH2_PROVIDER = {
     'SCOPES': {'read': 'Read scope', 'write': 'Write scope', 'groups': 'Access to your groups'}
@@ -0,0 +1,207 @@
+"""
+Per-endpoint SQL instrumentation.
+
+SQLMetricsMiddleware records, for a sample of the requests, the number of SQL queries, the total database time and
+the slowest statement of the request, and aggregates them per view action (eg. "UserViewSet.retrieve") in
+in-process histograms. They can be read (and reset) by staff users on /sql-metrics/, and are periodically dumped to the
+"sigma.sql_metrics" logger.
+
+It relies on the debug cursor of the connections, which is only enabled for the sampled requests. Settings:
+
+    SQL_METRICS = {
+        'SAMPLE_RATE': 0.1,    # Fraction of the requests which are measured (0 disables the middleware)
+        'LOG_INTERVAL': 300,   # Seconds between two dumps to the logs (0 disables them)
+    }
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+logger = logging.getLogger('sigma.sql_metrics')
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.1,
+    'LOG_INTERVAL': 300,
+}
+
+def get_setting(name):
+    return getattr(settings, 'SQL_METRICS', {}).get(name, DEFAULTS[name])
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+def fingerprint(sql):
+    """
+    Normalize a SQL statement so that statements which only differ by their parameters are grouped together.
+    """
+    sql = _LITERALS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class Histogram(object):
+    """
+    Counts of values in fixed buckets: bucket i holds the values in ]bounds[i-1], bounds[i]].
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """
+        Upper bound of the bucket holding the p-th percentile (the max for the last bucket).
+        """
+        rank = p * sum(self.counts)
+        seen = 0
+        for (i, count) in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return 0
+
+    def as_dict(self):
+        n = sum(self.counts)
+        buckets = OrderedDict(('<=%s' % b, c) for (b, c) in zip(self.bounds, self.counts))
+        buckets['>%s' % self.bounds[-1]] = self.counts[-1]
+        return OrderedDict([
+            ('mean', round(self.total / n, 2) if n else 0),
+            ('p50', self.percentile(0.5)),
+            ('p95', self.percentile(0.95)),
+            ('max', round(self.max, 2)),
+            ('buckets', buckets),
+        ])
+
+
+class EndpointMetrics(object):
+    QUERIES_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+    TIME_BOUNDS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500) # ms
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = Histogram(self.QUERIES_BOUNDS)
+        self.db_time = Histogram(self.TIME_BOUNDS)
+        self.slowest_time = 0
+        self.slowest_sql = None
+
+    def add(self, queries):
+        self.requests += 1
+        self.queries.add(len(queries))
+        times = [float(q['time']) * 1000 for q in queries]
+        self.db_time.add(sum(times))
+        if times and max(times) >= self.slowest_time:
+            i = times.index(max(times))
+            self.slowest_time = times[i]
+            self.slowest_sql = queries[i]['sql']
+
+    def as_dict(self):
+        return OrderedDict([
+            ('requests', self.requests),
+            ('queries', self.queries.as_dict()),
+            ('db_time_ms', self.db_time.as_dict()),
+            ('slowest', {'time_ms': round(self.slowest_time, 2), 'sql': fingerprint(self.slowest_sql) if self.slowest_sql else None}),
+        ])
+
+
+class SQLMetrics(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.last_dump = time.time()
+
+    def record(self, endpoint, queries):
+        with self.lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = EndpointMetrics()
+            self.endpoints[endpoint].add(queries)
+
+    def snapshot(self):
+        with self.lock:
+            return OrderedDict((e, self.endpoints[e].as_dict()) for e in sorted(self.endpoints))
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def dump_if_due(self):
+        interval = get_setting('LOG_INTERVAL')
+        if not interval:
+            return
+        with self.lock:
+            if time.time() - self.last_dump < interval:
+                return
+            self.last_dump = time.time()
+        logger.info(json.dumps(self.snapshot()))
+
+metrics = SQLMetrics()
+
+
+def get_endpoint_name(request, response):
+    view = getattr(response, 'renderer_context', {}).get('view')
+    if view is not None:
+        action = getattr(view, 'action', None) or request.method.lower()
+        return '%s.%s' % (view.__class__.__name__, action)
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+class SQLMetricsMiddleware(object):
+    def process_request(self, request):
+        if random.random() >= get_setting('SAMPLE_RATE'):
+            return
+        # Connections which already log their queries (DEBUG, tests) are left as they are
+        request._sql_metrics = []
+        for connection in connections.all():
+            logged = connection.queries_logged
+            if not logged:
+                connection.force_debug_cursor = True
+            request._sql_metrics.append((connection, logged, len(connection.queries_log)))
+
+    def process_response(self, request, response):
+        sampled = getattr(request, '_sql_metrics', None)
+        if sampled is None:
+            return response
+        queries = []
+        for (connection, logged, start) in sampled:
+            queries += list(connection.queries_log)[start:]
+            if not logged:
+                connection.force_debug_cursor = False
+                connection.queries_log.clear()
+        metrics.record(get_endpoint_name(request, response), queries)
+        metrics.dump_if_due()
+        return response
+
+
+class SQLMetricsView(APIView):
+    """
+    Staff only: read (GET) or reset (DELETE) the SQL metrics of this process.
+    """
+    permission_classes = [IsAdminUser, ]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+    def delete(self, request):
+        metrics.reset()
+        return Response(status=204)
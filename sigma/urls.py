@@ -13,11 +13,12 @@ Including another URLconf
     1. Add an import:  from blog import urls as blog_urls
     2. Add a URL to urlpatterns:  url(r'^blog/', include(blog_urls))
 """
+import re
+
 from django.conf.urls import include, url
 from django.contrib import admin
 from rest_framework import routers
 from django.conf import settings
-from django.views import static
 
 router = routers.DefaultRouter()
 
@@ -39,21 +40,22 @@ router.register(r'user', UserViewSet)
 router.register(r'validator', ValidatorViewSet)
 router.register(r'chat_members', ChatMemberViewSet)
 
-from sigma_files.views import ImageViewSet
+from sigma_files.views import ImageViewSet, UploadSessionViewSet
 
 router.register(r'image', ImageViewSet)
+router.register(r'upload', UploadSessionViewSet)
+
+from sigma.batch import BatchView
+from sigma.sql_metrics import SQLMetricsView
+from sigma_files.media import serve_media
 
 urlpatterns = [
     url(r'^admin/', include(admin.site.urls)),
     url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     url(r'^docs/', include('rest_framework_swagger.urls')),
     url(r'^o/', include('oauth2_provider.urls', namespace='oauth2_provider')),
+    url(r'^sql-metrics/$', SQLMetricsView.as_view()),
+    url(r'^batch/$', BatchView.as_view()),
+    url(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
     url(r'^', include(router.urls)),
 ]
-
-if settings.DEBUG:
-    urlpatterns.append(
-        url(r'^media/(?P<path>.*)$',
-            static.serve,
-            {'document_root': settings.MEDIA_ROOT, }),
-    )
@@ -0,0 +1,268 @@
+"""
+Read-only serialization straight from values() rows, for the hot list routes.
+
+A ModelSerializer spends most of its time in its field machinery: for each row a model instance is built, then every
+field looks up its attribute and converts it. ValuesSerializer compiles the fields of a serializer once into getters
+on the dicts of a values() query, and renders to the same JSON as the serializer itself.
+
+Supported fields: model columns, primary keys of foreign keys, primary keys of many-to-many relations (either side) and
+nested model serializers (one query per relation for all the rows), serializer methods and model properties. The latter
+are given a record of the row which holds the properties of the model, instead of an instance, and only load the
+columns listed by the field_sources of the serializer's Meta (see sigma.fieldsets). Other many fields are serialized
+from instances, with their relation prefetched.
+"""
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework import fields
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from jsonfield.fields import JSONFieldBase
+
+
+# Fields whose to_representation() does not change the values given by the database
+IDENTITY_FIELDS = (fields.IntegerField, fields.CharField, fields.EmailField, fields.BooleanField)
+
+
+class Record(object):
+    """
+    Attribute access to a values() row.
+    """
+    __slots__ = ('_row', )
+
+    def __init__(self, row):
+        self._row = row
+
+    def __getattr__(self, name):
+        try:
+            return self._row[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def record_class(model):
+    """
+    Record of the rows of model, with its properties (pk, computed attributes...).
+    """
+    attrs = {name: value for klass in reversed(model.__mro__) for (name, value) in vars(klass).items() if isinstance(value, property)}
+    attrs.update(__slots__=(), _meta=model._meta)
+    return type('%sRecord' % model.__name__, (Record, ), attrs)
+
+
+def get_converter(field):
+    if type(field) in IDENTITY_FIELDS:
+        return None
+    return field.to_representation
+
+
+class ValuesSerializer(object):
+    """
+    Serialize the rows of a queryset as serializer_class(many=True) would (read-only). serializer_class may also be a
+    (nested) serializer instance.
+    """
+    def __init__(self, serializer_class, context=None):
+        self.context = context if context is not None else {}
+        if isinstance(serializer_class, BaseSerializer):
+            self.serializer = serializer_class
+        else:
+            self.serializer = serializer_class(context=self.context)
+        self.model = self.serializer.Meta.model
+        self.pk_column = self.model._meta.pk.attname
+        self.columns = [self.pk_column]
+        self.json_columns = []
+        self.needs_record = False
+        # Filled for all the rows at once: relation name => (column, fetch(keys) => {key: value})
+        self.relations = {}
+        self.getters = [(name, self.compile(name, field)) for (name, field) in self.serializer.fields.items() if not field.write_only]
+        self.record_class = record_class(self.model)
+
+    def add_column(self, model_field):
+        if model_field.attname not in self.columns:
+            self.columns.append(model_field.attname)
+            if isinstance(model_field, JSONFieldBase):
+                # values() does not decode them
+                self.json_columns.append((model_field.attname, model_field))
+
+    def use_record(self, name):
+        self.needs_record = True
+        sources = getattr(self.serializer.Meta, 'field_sources', {}).get(name)
+        if sources is None:
+            # It may need any column
+            model_fields = self.model._meta.concrete_fields
+        else:
+            model_fields = [self.model._meta.get_field(source) for source in sources]
+        for model_field in model_fields:
+            self.add_column(model_field)
+
+    def get_model_field(self, source):
+        try:
+            model_field = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+        return model_field if model_field.concrete else None
+
+    def get_many_relation(self, source):
+        """
+        The many-to-many field behind source, and whether source is its reverse side; None for other relations.
+        """
+        try:
+            model_field = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.many_to_many:
+            return None
+        if model_field.concrete:
+            return (model_field, False)
+        return (model_field.field, True)
+
+    def compile(self, name, field):
+        """
+        Return the getter of the value of field, given a row, its record and the values of the relations.
+        """
+        if isinstance(field, fields.SerializerMethodField):
+            self.use_record(name)
+            method = getattr(self.serializer, field.method_name)
+            return lambda row, record, related: method(record)
+
+        if isinstance(field, (ManyRelatedField, ListSerializer)):
+            relation = self.get_many_relation(field.source)
+            if relation is None:
+                fetch = self.instances_fetcher(field)
+            elif isinstance(field, ListSerializer):
+                nested = ValuesSerializer(field.child, context=self.context)
+                fetch = self.many_fetcher(relation, nested.serialize_by_pk)
+            else:
+                fetch = self.many_fetcher(relation)
+            self.relations[name] = (self.pk_column, fetch)
+            return lambda row, record, related: related[name].get(row[self.pk_column], [])
+
+        model_field = self.get_model_field(field.source)
+        if model_field is None:
+            # Property (or any attribute) of the model
+            self.use_record(name)
+            convert = get_converter(field)
+            def get_attribute(row, record, related):
+                value = fields.get_attribute(record, field.source_attrs)
+                return value if value is None or convert is None else convert(value)
+            return get_attribute
+
+        self.add_column(model_field)
+        column = model_field.attname
+        if isinstance(field, BaseSerializer):
+            nested = ValuesSerializer(field, context=self.context)
+            self.relations[name] = (column, nested.serialize_by_pk)
+            return lambda row, record, related: related[name].get(row[column])
+        if isinstance(field, RelatedField):
+            # Primary key of a foreign key: the column itself
+            return lambda row, record, related: row[column]
+        if isinstance(field, fields.FileField):
+            return self.file_getter(column, model_field.storage, field)
+
+        convert = get_converter(field)
+        if convert is None:
+            return lambda row, record, related: row[column]
+        return lambda row, record, related: None if row[column] is None else convert(row[column])
+
+    def file_getter(self, column, storage, field):
+        request = self.context.get('request')
+        use_url = getattr(field, 'use_url', True)
+        def get_file(row, record, related):
+            name = row[column]
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return get_file
+
+    def many_fetcher(self, relation, serialize_by_pk=None):
+        """
+        Fetch the primary keys of the objects related through a (model_field, reverse) relation, or their
+        serialize_by_pk() data.
+        """
+        (model_field, reverse) = relation
+        through = model_field.remote_field.through
+        (source, target) = (model_field.m2m_column_name(), model_field.m2m_reverse_name())
+        if reverse:
+            (source, target) = (target, source)
+        def fetch(keys):
+            pairs = list(through.objects.filter(**{source + '__in': keys}).order_by('pk').values_list(source, target))
+            if serialize_by_pk is not None:
+                objects = serialize_by_pk({value for (key, value) in pairs}) if pairs else {}
+                pairs = [(key, objects[value]) for (key, value) in pairs if value in objects]
+            values = {}
+            for (key, value) in pairs:
+                values.setdefault(key, []).append(value)
+            return values
+        return fetch
+
+    def instances_fetcher(self, field):
+        """
+        Fallback for the other relations (reverse foreign keys...): serialize field with the instances of the rows, the
+        relation prefetched for all of them.
+        """
+        def fetch(keys):
+            instances = self.model._default_manager.filter(pk__in=keys)
+            try:
+                self.model._meta.get_field(field.source)
+                instances = instances.prefetch_related(field.source)
+            except FieldDoesNotExist:
+                pass
+            return {instance.pk: field.to_representation(field.get_attribute(instance)) for instance in instances}
+        return fetch
+
+    def values(self, queryset, extra_columns=()):
+        """
+        The values() query of the rows of queryset, with extra_columns (eg. for the pagination).
+        """
+        columns = self.columns + [c for c in extra_columns if c not in self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize(self, rows):
+        """
+        Return the serialized data of rows, given by values().
+        """
+        rows = list(rows)
+        related = {}
+        for (name, (column, fetch)) in self.relations.items():
+            keys = {row[column] for row in rows if row[column] is not None}
+            related[name] = fetch(keys) if keys else {}
+
+        data = []
+        for row in rows:
+            for (column, model_field) in self.json_columns:
+                if isinstance(row[column], str):
+                    row[column] = json.loads(row[column], **model_field.load_kwargs)
+            record = self.record_class(row) if self.needs_record else None
+            data.append(OrderedDict((name, getter(row, record, related)) for (name, getter) in self.getters))
+        return data
+
+    def serialize_by_pk(self, pks):
+        rows = list(self.values(self.model._default_manager.filter(pk__in=pks)))
+        return {row[self.pk_column]: item for (row, item) in zip(rows, self.serialize(rows))}
+
+    def list_response(self, view, queryset):
+        """
+        What view.list() would answer for queryset, paginated by the pagination of the view.
+        """
+        ordering = getattr(view, 'pagination_ordering', ())
+        extra_columns = [self.pk_column if f.lstrip('-') == 'pk' else f.lstrip('-') for f in ordering]
+        rows = self.values(queryset, extra_columns)
+        page = view.paginate_queryset(rows)
+        if page is not None:
+            return view.get_paginated_response(self.serialize(page))
+        return Response(self.serialize(rows))
+
+
+class ValuesListMixin(object):
+    """
+    list() serialized by a ValuesSerializer of the serializer of the view.
+    """
+    def list(self, request, *args, **kwargs):
+        serializer = ValuesSerializer(self.get_serializer_class(), context=self.get_serializer_context())
+        return serializer.list_response(self, self.filter_queryset(self.get_queryset()))
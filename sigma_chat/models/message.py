@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 from django.db import models
 
-from chat_member import ChatMember
-from chat import Chat
+from sigma_chat.models.chat_member import ChatMember
+from sigma_chat.models.chat import Chat
+from sigma_files.storage import blob_storage
+
+
+def chat_directory_path(instance, filename):
+    # Only the extension is kept by the content-addressed storage
+    return 'uploads/chats/{0}/{1}'.format(instance.chat.id, filename)
 
 
 class Message(models.Model):
@@ -10,11 +16,7 @@ class Message(models.Model):
     chatmember = models.ForeignKey(ChatMember, related_name='chatmember_message')
     chat = models.ForeignKey(Chat, related_name='chat_message')
     date = models.DateTimeField(auto_now=True)
-    attachment = models.FileField(upload_to=chat_directory_path)
-
-    def chat_directory_path(self, filename):
-        # file will be uploaded to MEDIA_ROOT/user_<id>/<filename>
-        return 'uploads/chats/{0}/{1}'.format(self.chat.id, filename)
+    attachment = models.FileField(upload_to=chat_directory_path, storage=blob_storage)
 
     ################################################################
     # PERMISSIONS                                                  #
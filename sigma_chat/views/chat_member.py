@@ -11,31 +11,29 @@ from sigma_core.models.user import User
 from sigma_chat.models.chat_member import ChatMember
 from sigma_chat.serializers.chat_member import ChatMemberSerializer
 from sigma_chat.models.chat import Chat
+from sigma_core.visibility import VisibilityContext
 
 
 class ChatMemberFilterBackend(BaseFilterBackend):
     filter_q = {
         'user': lambda u: Q(user=u),
-        'chat': lambda g: Q(chat=c)
+        'chat': lambda c: Q(chat=c)
     }
 
     def filter_queryset(self, request, queryset, view):
         """
         Limits all list requests w.r.t the Normal Rules of Visibility.
         """
-        user_chat_ids = request.user.user_chatmember.filter(is_member=True).values_list('chat_id', flat=True)
+        visibility = VisibilityContext.for_user(request.user)
         # I can see a ChatMember if and only I am member of the chat
-        queryset = queryset.prefetch_related(
-            Prefetch('user_chatmember', queryset=ChatMember.objects.filter(is_member=True))
-        ).filter(Q(user_id=request.user.id) | Q(chat_id__in=user_chat_ids)
-        )
+        queryset = queryset.filter(Q(user_id=request.user.id) | Q(chat_id__in=visibility.chats_ids))
 
         for (param, q) in self.filter_q.items():
             x = request.query_params.get(param, None)
             if x is not None:
                 queryset = queryset.filter(q(x))
 
-        return queryset.distinct()
+        return queryset
 
 
 class ChatMemberViewSet(viewsets.ModelViewSet):
@@ -5,6 +5,7 @@ from sigma_core.models.user import User
 from sigma_core.models.group import Group, GroupAcknowledgment
 from sigma_core.models.cluster import Cluster
 from sigma_core.models.group_member import GroupMember
+from sigma_core.models.queued_mail import QueuedMail
 
 
 admin.site.unregister(AuthGroup)
@@ -13,3 +14,12 @@ admin.site.register(Group)
 admin.site.register(Cluster)
 admin.site.register(GroupAcknowledgment)
 admin.site.register(GroupMember)
+
+
+class QueuedMailAdmin(admin.ModelAdmin):
+    # Bodies may hold credentials (eg. the reset passwords)
+    exclude = ('body', )
+    list_display = ('subject', 'recipients', 'created', 'attempts', 'next_attempt')
+    readonly_fields = ('last_error', )
+
+admin.site.register(QueuedMail, QueuedMailAdmin)
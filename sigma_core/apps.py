@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SigmaCoreConfig(AppConfig):
     name = 'sigma_core'
+
+    def ready(self):
+        import sigma_core.signals
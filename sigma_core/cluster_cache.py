@@ -0,0 +1,65 @@
+"""
+Cache of the serialized clusters.
+
+Clusters are listed on every app launch and login screen, and almost never change: their serialized list and
+details are kept in the default cache, and dropped by the signals of sigma_core.signals whenever a cluster, its group
+row or its memberships change. Entries are keyed on a generation number which the invalidation bumps, so that every
+entry (list pages included) is dropped at once, in every process sharing the cache.
+
+The cache must be shared by all the processes of the server (the database cache of the default settings, memcached...):
+with a per-process cache (LocMemCache), the other processes would serve stale data until TIMEOUT, so nothing is cached.
+
+The detailed variant, holding the ids of the members, is cached under its own keys: it is never sent from the public
+entries.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+GENERATION_KEY = 'clusters:generation'
+
+# Safety net for changes which send no signal (eg. update() or loaded snapshots)
+TIMEOUT = 24 * 3600
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Never go back to a number which may still be used by old entries, should the key be evicted
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Not set: there is nothing to invalidate
+        pass
+
+
+def invalidate():
+    bump_generation()
+    # Concurrent requests may cache the old data again until the change is committed
+    transaction.on_commit(bump_generation)
+
+
+def get_or_compute(key, compute):
+    """
+    Return the cached value of key (a tuple), calling compute() to get it if it is not cached. Exceptions raised by
+    compute() (eg. Http404) are not cached.
+    """
+    if isinstance(caches['default'], LocMemCache):
+        return compute()
+    # Keys may hold URLs: keep them short and safe for memcached
+    full_key = 'clusters:%s:%s' % (get_generation(), hashlib.md5(repr(key).encode()).hexdigest())
+    value = cache.get(full_key)
+    if value is None:
+        value = compute()
+        cache.set(full_key, value, TIMEOUT)
+    return value
@@ -0,0 +1,147 @@
+import json
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from sigma.urls import router
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank method
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency (p50/p99) and the number of SQL queries of every GET route registered on the API router.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='User the requests are authenticated as (default: the member of the most groups).')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--host', default='localhost', help='Host header of the requests (must be in ALLOWED_HOSTS).')
+        parser.add_argument('--only', help='Only benchmark the routes whose name contains this string.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON file of a previous run to compare with.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user_id'])
+        self.client = APIClient(HTTP_HOST=options['host'])
+        self.client.force_authenticate(user=user)
+
+        results = OrderedDict()
+        for (name, url) in self.get_routes(options['only']):
+            if url is None:
+                results[name] = {'skipped': 'no object to retrieve'}
+                continue
+            try:
+                results[name] = self.measure(url, options['iterations'], options['warmup'])
+                self.stdout.write('%-40s %s' % (name, self.format(results[name])))
+            except Exception as err:
+                # A broken route must not prevent the others from being measured
+                results[name] = {'url': url, 'error': repr(err)}
+                self.stdout.write('%-40s %r' % (name, err))
+
+        report = OrderedDict([
+            ('date', timezone.now().isoformat()),
+            ('user', user.id),
+            ('iterations', options['iterations']),
+            ('dataset', OrderedDict([('users', User.objects.count()), ('memberships', GroupMember.objects.count())])),
+            ('routes', results),
+        ])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            try:
+                return User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                raise CommandError('No user %d.' % user_id)
+        member = GroupMember.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+        if member is None:
+            raise CommandError('No user to authenticate as: generate a dataset first (see generate_dataset).')
+        return User.objects.get(pk=member['user_id'])
+
+    def get_routes(self, only):
+        """
+        Yield (route name, url) for every GET route of the router. Detail routes use the first object of their list.
+        """
+        for (prefix, viewset, basename) in router.registry:
+            first_pk = None
+            for route in router.get_routes(viewset):
+                mapping = router.get_method_map(viewset, route.mapping)
+                if 'get' not in mapping:
+                    continue
+                name = route.name.format(basename=basename)
+                if only and only not in name:
+                    continue
+                url = '/' + route.url.format(prefix=prefix, lookup='{pk}', trailing_slash=router.trailing_slash).strip('^$')
+                if '{pk}' in url:
+                    if first_pk is None:
+                        first_pk = self.get_first_pk('/%s/' % prefix, viewset)
+                    url = url.format(pk=first_pk) if first_pk is not None else None
+                yield (name, url)
+
+    def get_first_pk(self, list_url, viewset):
+        try:
+            response = self.client.get(list_url, {'page_size': 1})
+        except Exception:
+            return None
+        if response.status_code != 200:
+            return None
+        data = response.data['results'] if isinstance(response.data, dict) else response.data
+        lookup_field = viewset.lookup_field if viewset.lookup_field != 'pk' else viewset.queryset.model._meta.pk.name
+        return data[0][lookup_field] if data else None
+
+    def measure(self, url, iterations, warmup):
+        for _ in range(warmup):
+            self.client.get(url)
+        timings = []
+        queries = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = self.client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+        timings.sort()
+        return OrderedDict([
+            ('url', url),
+            ('status', response.status_code),
+            ('p50_ms', round(percentile(timings, 0.5), 2)),
+            ('p99_ms', round(percentile(timings, 0.99), 2)),
+            ('mean_ms', round(sum(timings) / len(timings), 2)),
+            ('queries', max(queries)),
+        ])
+
+    @staticmethod
+    def format(result):
+        return 'HTTP %(status)d  p50 %(p50_ms)8.2f ms  p99 %(p99_ms)8.2f ms  %(queries)4d queries' % result
+
+    def compare(self, results, path):
+        with open(path) as f:
+            previous = json.load(f)['routes']
+        self.stdout.write('\nComparison with %s:' % path)
+        for (name, result) in results.items():
+            before = previous.get(name)
+            if 'p50_ms' not in result or not before or 'p50_ms' not in before:
+                continue
+            self.stdout.write('%-40s p50 %+7.1f%%  p99 %+7.1f%%  queries %+d' % (name,
+                100 * (result['p50_ms'] - before['p50_ms']) / (before['p50_ms'] or 1),
+                100 * (result['p99_ms'] - before['p99_ms']) / (before['p99_ms'] or 1),
+                result['queries'] - before['queries']))
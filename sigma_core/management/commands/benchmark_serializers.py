@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from sigma.values_serializer import ValuesSerializer
+from sigma_core.models.group import Group
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+from sigma_core.serializers.group import GroupSerializer
+from sigma_core.serializers.group_member import GroupMemberSerializer
+from sigma_core.serializers.user import UserSerializer, MinimalUserSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput (rows/s, queries and JSON rendering included) of the list serializers with their values() counterparts.'
+
+    CASES = [
+        ('user', UserSerializer, lambda: User.objects.select_related('photo')),
+        ('minimal-user', MinimalUserSerializer, lambda: User.objects.all()),
+        ('group', GroupSerializer, lambda: Group.objects.all()),
+        ('group-member', GroupMemberSerializer, lambda: GroupMember.objects.select_related('group', 'user')),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows serialized per iteration (a page).')
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def measure(self, render, rows, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            render()
+        return rows * iterations / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        context = {'request': Request(APIRequestFactory().get('/'))}
+        renderer = JSONRenderer()
+        for (name, serializer_class, get_queryset) in self.CASES:
+            queryset = get_queryset().order_by('pk')[:options['rows']]
+            rows = queryset.count()
+            if not rows:
+                self.stdout.write('%-14s no rows' % name)
+                continue
+            values_serializer = ValuesSerializer(serializer_class, context=context)
+            def render_model():
+                return renderer.render(serializer_class(queryset.all(), many=True, context=context).data)
+            def render_values():
+                return renderer.render(values_serializer.serialize(values_serializer.values(queryset.all())))
+            if render_model() != render_values():
+                raise CommandError('%s: the values() serialization differs from %s' % (name, serializer_class.__name__))
+
+            model = self.measure(render_model, rows, options['iterations'])
+            values = self.measure(render_values, rows, options['iterations'])
+            self.stdout.write('%-14s %5d rows   model: %9.0f rows/s   values: %9.0f rows/s   speedup: x%.1f' % (name, rows, model, values, values / model))
@@ -0,0 +1,56 @@
+import time
+
+# In the dev requirements only: the server itself no longer uses it
+import timeout_decorator
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.core.validators import RegexValidator
+
+from sigma_core.models.validator import Validator, is_validator_input_valid
+
+
+# Previous implementation: a process spawned per validated input
+@timeout_decorator.timeout(0.05, use_signals=False)
+def legacy_regex_check(regex, error_message, input):
+    RegexValidator(regex, error_message)(input)
+
+def legacy_is_input_valid(fields, input):
+    try:
+        legacy_regex_check(fields['regex'], fields['message'], input)
+        return True
+    except (ValidationError, timeout_decorator.TimeoutError):
+        return False
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the text validator with the former process-per-input implementation.'
+
+    CASES = [
+        ('simple', r"^[a-z0-9._-]+@[a-z0-9.-]+\.[a-z]{2,}$", 'john.doe@example.com'),
+        ('evil', r"^(([a-z])+.)+[A-Z]([a-z])+$", 'a' * 40 + '!'),
+        ('lookahead', r".*[.](?!bat$|exe$).*$", 'file.png'),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--skip-legacy', action='store_true', default=False)
+
+    def measure(self, check, fields, value, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            check(fields, value)
+        return iterations / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        for (name, regex, value) in self.CASES:
+            fields = {'regex': regex, 'message': 'Invalid'}
+            # Warm up the worker pool and the compiled patterns
+            is_validator_input_valid(Validator.VALIDATOR_TEXT, fields, value)
+            current = self.measure(lambda f, v: is_validator_input_valid(Validator.VALIDATOR_TEXT, f, v), fields, value, iterations)
+            line = '%-10s current: %10.1f validations/s' % (name, current)
+            if not options['skip_legacy']:
+                legacy = self.measure(legacy_is_input_valid, fields, value, iterations)
+                line += '   legacy: %8.1f validations/s   speedup: x%.0f' % (legacy, current / legacy)
+            self.stdout.write(line)
@@ -0,0 +1,202 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sigma_core.models.cluster import Cluster
+from sigma_core.models.group import Group, GroupAcknowledgment
+from sigma_core.models.group_closure import GroupClosure
+from sigma_core.models.group_field import GroupField
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.group_member_value import GroupMemberValue
+from sigma_core.models.user import User
+from sigma_core.models.validator import Validator
+
+
+SCALES = {
+    #            clusters, users, groups, memberships, invitations
+    'small':    (2, 1000, 100, 10000, 500),
+    'medium':   (5, 20000, 2000, 200000, 10000),
+    'large':    (10, 100000, 20000, 1000000, 50000),
+}
+
+
+class Command(BaseCommand):
+    help = 'Generate a realistic dataset with bulk inserts: clusters, users, groups and their hierarchy, memberships, custom fields and values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Preset sizes, refined by the options below.')
+        parser.add_argument('--clusters', type=int)
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--groups', type=int)
+        parser.add_argument('--memberships', type=int, help='Number of GroupMember rows.')
+        parser.add_argument('--invitations', type=int)
+        parser.add_argument('--depth', type=int, default=3, help='Depth of the GroupAcknowledgment hierarchy below the clusters.')
+        parser.add_argument('--fields-per-group', type=int, default=2)
+        parser.add_argument('--values-ratio', type=float, default=0.5, help='Fraction of the accepted memberships which fill the custom fields.')
+        parser.add_argument('--password', default='password', help='Password of every generated user.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # factory_boy is a development dependency
+        from sigma_core.tests.factories import faker, UserFactory, GroupFactory
+
+        (clusters, users, groups, memberships, invitations) = SCALES[options['scale']]
+        self.clusters_count = options['clusters'] if options['clusters'] is not None else clusters
+        self.users_count = options['users'] if options['users'] is not None else users
+        self.groups_count = options['groups'] if options['groups'] is not None else groups
+        self.memberships_count = options['memberships'] if options['memberships'] is not None else memberships
+        self.invitations_count = options['invitations'] if options['invitations'] is not None else invitations
+        if self.groups_count and self.memberships_count > self.users_count * self.groups_count:
+            raise CommandError('Too many memberships for the number of users and groups.')
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        faker.seed(options['seed'])
+
+        with transaction.atomic():
+            cluster_ids = self.create_clusters()
+            users_ids = self.create_users(UserFactory, make_password(options['password']), cluster_ids)
+            groups_ids = self.create_groups(GroupFactory)
+            self.create_hierarchy(cluster_ids, groups_ids, options['depth'])
+            self.create_memberships(users_ids, groups_ids)
+            self.create_invitations(users_ids, groups_ids)
+            self.create_fields_and_values(groups_ids, options['fields_per_group'], options['values_ratio'], faker)
+
+        # Bulk inserts bypass the signals: rebuild the denormalized data
+        self.log('Rebuilding the denormalized tables...')
+        GroupClosure.objects.rebuild()
+        call_command('reconcile_group_counters', stdout=self.stdout)
+        call_command('rebuild_user_visibility', stdout=self.stdout)
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def bulk_create(self, model, objects):
+        """
+        Insert the objects in batches and return the ids of the new rows (bulk_create does not set them on every backend).
+        """
+        last_id = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        return list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True))
+
+    def create_clusters(self):
+        self.log('Creating %d clusters...' % self.clusters_count)
+        # Multi-table inheritance: no bulk_create
+        return [Cluster.objects.create(name='Cluster %d' % i, design='default').id for i in range(self.clusters_count)]
+
+    def create_users(self, factory, password, cluster_ids):
+        self.log('Creating %d users...' % self.users_count)
+        first_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        def users():
+            for i in range(self.users_count):
+                user = factory.build(password=password)
+                # Fake names collide: make the emails unique
+                user.email = '%d.%s' % (first_id + i, user.email)
+                yield user
+        users_ids = self.bulk_create(User, users())
+
+        if cluster_ids:
+            # Every user belongs to one cluster
+            Membership = User.clusters.through
+            Membership.objects.bulk_create((Membership(user_id=uid, cluster_id=self.random.choice(cluster_ids)) for uid in users_ids))
+        return users_ids
+
+    def create_groups(self, factory):
+        self.log('Creating %d groups...' % self.groups_count)
+        def groups():
+            for _ in range(self.groups_count):
+                group = factory.build(is_private=self.random.random() < 0.3)
+                # Not a constructor argument: the field is shadowed by the can_anyone_join() method
+                group.can_anyone_join = self.random.random() < 0.3
+                group.need_validation_to_join = not group.can_anyone_join and self.random.random() < 0.5
+                yield group
+        return self.bulk_create(Group, groups())
+
+    def create_hierarchy(self, cluster_ids, groups_ids, depth):
+        """
+        Split the groups in `depth` levels: each group is acknowledged by a group of the level above, the first level
+        by the clusters.
+        """
+        self.log('Creating the acknowledgment hierarchy...')
+        parents = list(cluster_ids)
+        level_size = max(1, len(groups_ids) // max(depth, 1))
+        acknowledgments = []
+        for start in range(0, len(groups_ids), level_size):
+            level = groups_ids[start:start + level_size]
+            if parents:
+                for gid in level:
+                    acknowledgments.append(GroupAcknowledgment(subgroup_id=gid, parent_group_id=self.random.choice(parents),
+                        validated=self.random.random() < 0.9, delegate_admin=self.random.random() < 0.5))
+            parents = level
+        GroupAcknowledgment.objects.bulk_create(acknowledgments)
+
+    def create_memberships(self, users_ids, groups_ids):
+        self.log('Creating %d memberships...' % self.memberships_count)
+        if not users_ids or not groups_ids:
+            return
+        # Spread the memberships evenly over the users, in random groups
+        per_user = self.memberships_count // len(users_ids)
+        extra = self.memberships_count % len(users_ids)
+        admins = set()
+        def memberships():
+            for (i, uid) in enumerate(users_ids):
+                for gid in self.random.sample(groups_ids, per_user + (1 if i < extra else 0)):
+                    is_admin = gid not in admins
+                    admins.add(gid)
+                    yield GroupMember(user_id=uid, group_id=gid, is_accepted=is_admin or self.random.random() < 0.9,
+                        is_administrator=is_admin, can_invite=is_admin, can_modify_group_infos=is_admin, can_kick=is_admin)
+        self.bulk_create(GroupMember, memberships())
+
+    def create_invitations(self, users_ids, groups_ids):
+        self.log('Creating %d invitations...' % self.invitations_count)
+        if not users_ids or not groups_ids:
+            return
+        # Pairs drawn at random: duplicates are dropped, and so are the invitations of members
+        pairs = {(self.random.choice(users_ids), self.random.choice(groups_ids)) for _ in range(self.invitations_count)}
+        # New rows have the greatest ids: filter on ranges rather than on (long) lists of ids
+        members = set(GroupMember.objects.filter(user_id__gte=users_ids[0]).values_list('user_id', 'group_id'))
+        Invitation = User.invited_to_groups.through
+        Invitation.objects.bulk_create([Invitation(user_id=u, group_id=g) for (u, g) in pairs - members])
+
+    def create_fields_and_values(self, groups_ids, fields_per_group, values_ratio, faker):
+        self.log('Creating custom fields and values...')
+        Validator.objects.get_or_create(html_name=Validator.VALIDATOR_NONE, defaults={'display_name': 'None', 'values': {}})
+        Validator.objects.get_or_create(html_name=Validator.VALIDATOR_TEXT, defaults={'display_name': 'Text', 'values': {}})
+        phone = {'regex': r'^[0-9 +().]+$', 'message': 'Invalid phone number'}
+        def fields():
+            for gid in groups_ids:
+                for i in range(fields_per_group):
+                    if i % 2:
+                        yield GroupField(group_id=gid, name='Phone', validator_id=Validator.VALIDATOR_TEXT, validator_values=phone)
+                    else:
+                        yield GroupField(group_id=gid, name='Nickname', validator_id=Validator.VALIDATOR_NONE, validator_values={})
+        fields_ids = self.bulk_create(GroupField, fields())
+        if not fields_ids:
+            return
+        fields_by_group = {}
+        for (fid, gid, validator) in GroupField.objects.filter(id__gte=fields_ids[0]).values_list('id', 'group_id', 'validator_id'):
+            fields_by_group.setdefault(gid, []).append((fid, validator))
+
+        def values():
+            last_id = 0
+            while True:
+                batch = list(GroupMember.objects.filter(id__gt=last_id, is_accepted=True, group_id__gte=groups_ids[0]).order_by('id').values_list('id', 'group_id')[:self.batch_size])
+                if not batch:
+                    return
+                last_id = batch[-1][0]
+                for (mid, gid) in batch:
+                    if self.random.random() >= values_ratio:
+                        continue
+                    for (fid, validator) in fields_by_group.get(gid, []):
+                        value = faker.phone_number() if validator == Validator.VALIDATOR_TEXT else faker.first_name()
+                        yield GroupMemberValue(membership_id=mid, field_id=fid, value=value)
+        self.bulk_create(GroupMemberValue, values())
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sigma_core.models.cluster import Cluster
+from sigma_core.user_import import FORMATS, UserImport
+
+
+class Command(BaseCommand):
+    help = 'Create the users of CSV or JSON lines files (email, lastname, firstname, phone, password) in the given clusters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+')
+        parser.add_argument('--clusters', type=int, nargs='+', required=True, help='Clusters of the imported users.')
+        parser.add_argument('--file-format', choices=FORMATS, help='Guessed from the file names by default.')
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction.')
+        parser.add_argument('--processes', type=int, help='Processes hashing the passwords (0 to hash in-process).')
+
+    def handle(self, *args, **options):
+        clusters_ids = set(options['clusters'])
+        if Cluster.objects.filter(pk__in=clusters_ids).count() != len(clusters_ids):
+            raise CommandError('Unknown clusters.')
+
+        users_import = UserImport(clusters_ids, batch_size=options['batch_size'], processes=options['processes'])
+        for path in options['files']:
+            file_format = options['file_format'] or path.rpartition('.')[2].lower()
+            if file_format not in FORMATS:
+                raise CommandError('%s: unknown format, use --file-format.' % path)
+            errors_count = len(users_import.errors)
+            with open(path, 'rb') as stream:
+                users_import.run(stream, file_format)
+            for error in users_import.errors[errors_count:]:
+                self.stdout.write('%s:%s: %s' % (path, error['line'], '; '.join('%s: %s' % (field, ' '.join(messages)) for (field, messages) in sorted(error['errors'].items()))))
+        self.stdout.write('%d users created, %d rows rejected.' % (users_import.created, len(users_import.errors)))
@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models.base import ModelState
+
+from sigma_core.management import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Replace the content of the tables of a snapshot (see dump_snapshot) with the snapshot rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--no-check', action='store_false', dest='check', default=True,
+            help='Do not check the foreign keys once loaded (faster, for trusted snapshots).')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        try:
+            with open(os.path.join(directory, snapshot.MANIFEST)) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError) as err:
+            raise CommandError('Cannot read the snapshot manifest: %s' % err)
+        if manifest.get('version') != snapshot.VERSION:
+            raise CommandError('Unsupported snapshot version %s.' % manifest.get('version'))
+
+        tables = [(apps.get_model(t['model']), t) for t in manifest['tables']]
+        with transaction.atomic():
+            with connection.constraint_checks_disabled():
+                with connection.cursor() as cursor:
+                    for (model, _) in reversed(tables):
+                        cursor.execute('DELETE FROM %s' % connection.ops.quote_name(model._meta.db_table))
+                for (model, table) in tables:
+                    self.load_table(model, table, directory)
+            if options['check']:
+                connection.check_constraints(table_names=[model._meta.db_table for (model, _) in tables])
+
+            # Rows were inserted with their primary keys: move the sequences past them
+            statements = connection.ops.sequence_reset_sql(no_style(), [model for (model, _) in tables])
+            if statements:
+                with connection.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
+
+        self.stdout.write('%d rows of %d tables loaded.' % (sum(t['rows'] for (_, t) in tables), len(tables)))
+
+    def load_table(self, model, table, directory):
+        columns = {f.attname: f for f in snapshot.get_columns(model)}
+        if set(table['columns']) != set(columns):
+            raise CommandError('%s: the columns of the snapshot do not match the current schema.' % table['table'])
+        # Primary key first: descriptors may depend on it (eg. JSONField)
+        fields = sorted((columns[c] for c in table['columns']), key=lambda f: not f.primary_key)
+        positions = [table['columns'].index(f.attname) for f in fields]
+        parsers = [f.to_python if f.get_internal_type() in snapshot.PARSED_TYPES else None for f in fields]
+        attnames = [f.attname for f in fields]
+
+        rows_count = 0
+        with gzip.open(os.path.join(directory, table['file']), 'rt', encoding='utf-8') as f:
+            for line in f:
+                objs = []
+                for row in json.loads(line):
+                    # Bare instances: neither __init__() nor the pre_init/post_init signals. Values are set with
+                    # setattr() for the fields with a descriptor (eg. JSONField) to parse them.
+                    obj = model.__new__(model)
+                    obj._state = ModelState()
+                    for (attname, value, parser) in zip(attnames, (row[i] for i in positions), parsers):
+                        setattr(obj, attname, value if parser is None or value is None else parser(value))
+                    objs.append(obj)
+                self.insert(model, fields, objs)
+                rows_count += len(objs)
+
+        if rows_count != table['rows']:
+            raise CommandError('%s: %d rows loaded, %d expected.' % (table['table'], rows_count, table['rows']))
+        self.stdout.write('%-50s %d rows' % (table['table'], rows_count))
+
+    def insert(self, model, fields, objs):
+        # raw=True: values are inserted as they are, without pre_save() (auto_now fields would be overwritten)
+        batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+        for i in range(0, len(objs), batch_size):
+            model._base_manager._insert(objs[i:i + batch_size], fields=fields, raw=True, using=connection.alias)
@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sigma_core.models.user import User
+from sigma_core.models.user_visibility import UserVisibility
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized UserVisibility relation in batches, or check it against the Normal Rules of Visibility.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of viewers processed per transaction.')
+        parser.add_argument('--check', action='store_true', default=False, help='Only report the differences, do not write anything.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        check = options['check']
+        missing_count = stale_count = 0
+
+        last_id = 0
+        while True:
+            users_ids = list(User.objects.prefetch_related(None).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not users_ids:
+                break
+            last_id = users_ids[-1]
+
+            expected = UserVisibility.objects.compute_pairs(viewers_ids=users_ids)
+            current = set(UserVisibility.objects.filter(viewer_id__in=users_ids).values_list('viewer_id', 'target_id'))
+            missing = expected - current
+            stale = current - expected
+            missing_count += len(missing)
+            stale_count += len(stale)
+
+            if check:
+                for (v, t) in sorted(missing):
+                    self.stdout.write('Missing: user %d can see user %d' % (v, t))
+                for (v, t) in sorted(stale):
+                    self.stdout.write('Stale: user %d cannot see user %d' % (v, t))
+                continue
+
+            stale_by_viewer = defaultdict(list)
+            for (v, t) in stale:
+                stale_by_viewer[v].append(t)
+            with transaction.atomic():
+                for (v, targets_ids) in stale_by_viewer.items():
+                    UserVisibility.objects.filter(viewer_id=v, target_id__in=targets_ids).delete()
+                UserVisibility.objects.bulk_create([UserVisibility(viewer_id=v, target_id=t) for (v, t) in missing])
+
+        if check and (missing_count or stale_count):
+            raise CommandError('UserVisibility is out of date: %d missing and %d stale rows.' % (missing_count, stale_count))
+        self.stdout.write('%d missing and %d stale rows %s.' % (missing_count, stale_count, 'found' if check else 'fixed'))
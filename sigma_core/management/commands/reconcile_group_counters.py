@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sigma_core.models.group import Group
+
+
+class Command(BaseCommand):
+    help = 'Recount the accepted, pending and invited members of every group in batches, and fix the stored counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of groups processed per transaction.')
+        parser.add_argument('--check', action='store_true', default=False, help='Only report the differences, do not write anything.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        check = options['check']
+        drifted_count = 0
+
+        last_id = 0
+        while True:
+            groups_ids = list(Group.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not groups_ids:
+                break
+            last_id = groups_ids[-1]
+
+            if check:
+                expected = Group.objects.compute_counters(groups_ids)
+                for c in Group.objects.filter(pk__in=groups_ids).values_list('id', *Group.COUNTER_FIELDS):
+                    if tuple(c[1:]) != expected[c[0]]:
+                        drifted_count += 1
+                        self.stdout.write('Group %d: stored %s, counted %s' % (c[0], tuple(c[1:]), expected[c[0]]))
+            else:
+                drifted_count += len(Group.objects.reconcile_counters(groups_ids))
+
+        if check and drifted_count:
+            raise CommandError('%d groups have drifted counters.' % drifted_count)
+        self.stdout.write('%d drifted groups %s.' % (drifted_count, 'found' if check else 'fixed'))
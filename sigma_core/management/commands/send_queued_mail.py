@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sigma_core.outbox import deliver_queued_mail, get_setting
+
+
+class Command(BaseCommand):
+    help = 'Deliver the queued mails which are due (see sigma_core.outbox), or keep delivering them with --loop.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', default=False, help='Run as a worker: poll the outbox until interrupted.')
+        parser.add_argument('--batch-size', type=int, help='Mails sent through one connection.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or get_setting('BATCH_SIZE')
+        (delivered, failed) = (0, 0)
+        try:
+            while True:
+                (batch_delivered, batch_failed) = deliver_queued_mail(batch_size)
+                delivered += batch_delivered
+                failed += batch_failed
+                if batch_delivered + batch_failed < batch_size:
+                    # The outbox is empty (until the failed mails are due again)
+                    if not options['loop']:
+                        break
+                    time.sleep(get_setting('POLL_INTERVAL'))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('%d mails delivered, %d failed.' % (delivered, failed))
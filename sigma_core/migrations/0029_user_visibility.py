@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 04:13
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_user_visibility(apps, schema_editor):
+    GroupMember = apps.get_model("sigma_core", "GroupMember")
+    UserVisibility = apps.get_model("sigma_core", "UserVisibility")
+    pairs = GroupMember.objects.filter(group__cluster__isnull=True, group__memberships__is_accepted=True) \
+        .values_list('group__memberships__user_id', 'user_id').distinct()
+    UserVisibility.objects.bulk_create([UserVisibility(viewer_id=v, target_id=t) for (v, t) in pairs if v != t], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sigma_core', '0028_group_need_validation_to_join'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserVisibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visible_to', to=settings.AUTH_USER_MODEL)),
+                ('viewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='uservisibility',
+            unique_together=set([('viewer', 'target')]),
+        ),
+        migrations.RunPython(build_user_visibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 04:14
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sigma_core', '0029_user_visibility'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='group',
+            index_together=set([('name', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='user',
+            index_together=set([('lastname', 'id')]),
+        ),
+    ]
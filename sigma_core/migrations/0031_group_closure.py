@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 04:21
+from __future__ import unicode_literals
+
+from collections import defaultdict, deque
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_group_closure(apps, schema_editor):
+    # A frozen copy of sigma_core.models.group_closure.compute_closure: migrations must not depend on the current code
+    GroupAcknowledgment = apps.get_model("sigma_core", "GroupAcknowledgment")
+    GroupClosure = apps.get_model("sigma_core", "GroupClosure")
+    parents = defaultdict(list)
+    for (parent_id, subgroup_id, delegate_admin) in GroupAcknowledgment.objects.filter(validated=True).values_list('parent_group_id', 'subgroup_id', 'delegate_admin'):
+        parents[subgroup_id].append((parent_id, delegate_admin))
+
+    rows = []
+    for descendant_id in list(parents):
+        # Shortest paths (breadth-first), then the ancestors reached through delegating edges only
+        depths = {descendant_id: 0}
+        queue = deque([descendant_id])
+        while queue:
+            g = queue.popleft()
+            for (parent_id, _) in parents[g]:
+                if parent_id not in depths:
+                    depths[parent_id] = depths[g] + 1
+                    queue.append(parent_id)
+        delegating = {descendant_id}
+        stack = [descendant_id]
+        while stack:
+            g = stack.pop()
+            for (parent_id, delegate_admin) in parents[g]:
+                if delegate_admin and parent_id not in delegating:
+                    delegating.add(parent_id)
+                    stack.append(parent_id)
+        rows.extend(GroupClosure(ancestor_id=a, descendant_id=descendant_id, depth=depth, delegate_admin=a in delegating)
+            for (a, depth) in depths.items() if a != descendant_id)
+    GroupClosure.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sigma_core', '0030_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('delegate_admin', models.BooleanField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sigma_core.Group')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sigma_core.Group')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='groupclosure',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.RunPython(build_group_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 04:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_members(apps, schema_editor):
+    Group = apps.get_model("sigma_core", "Group")
+    GroupMember = apps.get_model("sigma_core", "GroupMember")
+    Invitation = apps.get_model("sigma_core", "User")._meta.get_field('invited_to_groups').remote_field.through
+    counters = {}
+    for row in GroupMember.objects.values('group_id', 'is_accepted').annotate(count=Count('id')).order_by():
+        counters.setdefault(row['group_id'], {})['accepted_members_count' if row['is_accepted'] else 'pending_members_count'] = row['count']
+    for row in Invitation.objects.values('group_id').annotate(count=Count('id')).order_by():
+        counters.setdefault(row['group_id'], {})['invited_users_count'] = row['count']
+    for (group_id, values) in counters.items():
+        Group.objects.filter(pk=group_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sigma_core', '0031_group_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='accepted_members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='invited_users_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='pending_members_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_members, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 
 from sigma_core.models.user import User
-from sigma_core.models.validator import Validator
+from sigma_core.models.validator import Validator, validate_validator_input
 from jsonfield import JSONField
 
 class CustomField(models.Model):
@@ -19,4 +19,8 @@ class CustomField(models.Model):
     validator_values    = JSONField()
 
     def __str__(self):
-        return "CustomField \"%s\" (validator \"%s\" with values=\"%s\")" % (self.name, self.validator.__str__(), self.validator_values)
+        return "CustomField \"%s\" (validator \"%s\" with values=\"%s\")" % (self.name, Validator.objects.get_cached(self.validator_id).__str__(), self.validator_values)
+
+    def validate_input(self, client_input):
+        # Does not need to fetch the Validator row
+        return validate_validator_input(self.validator_id, self.validator_values, client_input)
@@ -1,13 +1,86 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, CharField, Count, F, Value, When
+from django.db.models.signals import m2m_changed
+from django.utils import timezone
 
 from sigma_core.models.custom_field import CustomField
 from sigma_core.models.group_field import GroupField
 
 
+class GroupManager(models.Manager):
+    def update_counter(self, groups_ids, counter, delta):
+        """
+        Atomically add delta to a member counter of the given groups.
+        """
+        if groups_ids and delta:
+            self.filter(pk__in=groups_ids).update(updated=timezone.now(), **{counter: F(counter) + delta})
+
+    def compute_counters(self, groups_ids):
+        """
+        Count the members of the given groups. Return a dict group_id => (accepted, pending, invited).
+        """
+        from sigma_core.models.group_member import GroupMember
+        from sigma_core.models.user import User
+        counters = {gid: [0, 0, 0] for gid in groups_ids}
+        memberships = GroupMember.objects.filter(group_id__in=groups_ids).values('group_id', 'is_accepted').annotate(count=Count('id')).order_by()
+        for row in memberships:
+            counters[row['group_id']][0 if row['is_accepted'] else 1] = row['count']
+        invitations = User.invited_to_groups.through.objects.filter(group_id__in=groups_ids).values('group_id').annotate(count=Count('id')).order_by()
+        for row in invitations:
+            counters[row['group_id']][2] = row['count']
+        return {gid: tuple(c) for (gid, c) in counters.items()}
+
+    def reconcile_counters(self, groups_ids):
+        """
+        Recount the members of the given groups and fix the stored counters. Return the ids of the groups which drifted.
+        """
+        with transaction.atomic():
+            expected = self.compute_counters(groups_ids)
+            current = self.filter(pk__in=groups_ids).select_for_update().values_list('id', *Group.COUNTER_FIELDS)
+            drifted = [c[0] for c in current if tuple(c[1:]) != expected[c[0]]]
+            for gid in drifted:
+                self.filter(pk=gid).update(updated=timezone.now(), **dict(zip(Group.COUNTER_FIELDS, expected[gid])))
+        return drifted
+
+    def invite_users(self, group, users):
+        """
+        Invite the users of the given queryset to group, except its members and the users already invited, with a
+        single insert. Return a dict user_id => Group.INVITED, Group.ALREADY_MEMBER or Group.ALREADY_INVITED.
+        """
+        from sigma_core.models.group_member import GroupMember
+        from sigma_core.models.user import User
+        invitations = User.invited_to_groups.through
+        with transaction.atomic(using=self.db):
+            # Concurrent invitations to the same group wait for this one
+            list(self.select_for_update().filter(pk=group.pk).values_list('id'))
+            outcomes = dict(users.order_by().annotate(outcome=Case(
+                When(id__in=GroupMember.objects.filter(group_id=group.pk).values('user_id'), then=Value(Group.ALREADY_MEMBER)),
+                When(id__in=invitations.objects.filter(group_id=group.pk).values('user_id'), then=Value(Group.ALREADY_INVITED)),
+                default=Value(Group.INVITED),
+                output_field=CharField(),
+            )).values_list('id', 'outcome'))
+            invited = {user_id for (user_id, outcome) in outcomes.items() if outcome == Group.INVITED}
+            if invited:
+                # What group.invited_users.add() sends: counters, timestamps and caches are updated by the receivers
+                signal = dict(sender=invitations, instance=group, reverse=True, model=User, pk_set=invited, using=self.db)
+                m2m_changed.send(action='pre_add', **signal)
+                invitations.objects.using(self.db).bulk_create([invitations(user_id=user_id, group_id=group.pk) for user_id in sorted(invited)])
+                m2m_changed.send(action='post_add', **signal)
+        return outcomes
+
+
 class Group(models.Model):
+    class Meta:
+        # Groups are listed by name (see GroupViewSet.pagination_ordering)
+        index_together = (("name", "id"),)
+
     #########################
     # Constants and choices #
     #########################
+    # Outcomes of the invitations (see GroupManager.invite_users)
+    INVITED = 'invited'
+    ALREADY_MEMBER = 'already_member'
+    ALREADY_INVITED = 'already_invited'
 
     ##########
     # Fields #
@@ -18,6 +91,16 @@ class Group(models.Model):
     is_protected = models.BooleanField(default=False) # if True, the Group cannot be deleted
     can_anyone_join = models.BooleanField(default=False) #if True, people don't need invitation
     need_validation_to_join = models.BooleanField(default=False)
+    # Also bumped by the counters updates (see sigma.conditional)
+    updated = models.DateTimeField(auto_now=True)
+
+    # Denormalized counters, updated from GroupMember and invitations changes (see sigma_core.signals)
+    accepted_members_count = models.PositiveIntegerField(default=0)
+    pending_members_count = models.PositiveIntegerField(default=0)
+    invited_users_count = models.PositiveIntegerField(default=0)
+    COUNTER_FIELDS = ('accepted_members_count', 'pending_members_count', 'invited_users_count')
+
+    objects = GroupManager()
 
     # Related fields:
     #   - invited_users (model User)
@@ -36,9 +119,23 @@ class Group(models.Model):
     def group_parents_list(self):
         return [ga.parent_group for ga in self.group_parents.filter(validated=True).select_related('parent_group')]
 
+    def get_descendants(self):
+        """
+        Groups acknowledged by self, directly or transitively.
+        """
+        from sigma_core.models.group_closure import GroupClosure
+        return Group.objects.filter(id__in=GroupClosure.objects.filter(ancestor=self).values('descendant_id'))
+
+    def get_ancestors(self):
+        """
+        Groups which acknowledged self, directly or transitively.
+        """
+        from sigma_core.models.group_closure import GroupClosure
+        return Group.objects.filter(id__in=GroupClosure.objects.filter(descendant=self).values('ancestor_id'))
+
     @property
     def members_count(self):
-        return self.memberships.count()
+        return self.accepted_members_count + self.pending_members_count
 
     #################
     # Model methods #
@@ -49,6 +146,12 @@ class Group(models.Model):
     def __str__(self): # pragma: no cover
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Counters are only updated with F() expressions: never write back the (maybe stale) in-memory values
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.COUNTER_FIELDS]
+        return super().save(*args, **kwargs)
+
     ###############
     # Permissions #
     ###############
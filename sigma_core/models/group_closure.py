@@ -0,0 +1,113 @@
+from collections import defaultdict, deque
+
+from django.db import models, transaction
+
+
+def compute_closure(edges, descendants_ids=None):
+    """
+    Compute the closure of the acknowledgment graph, given as (parent_group_id, subgroup_id, delegate_admin) edges.
+    Return a dict (ancestor_id, descendant_id) => (depth, delegate_admin), optionally restricted to some descendants:
+    depth is the length of the shortest path, delegate_admin whether there is a path whose every edge delegates admin.
+    """
+    parents = defaultdict(list)
+    for (parent_id, subgroup_id, delegate_admin) in edges:
+        parents[subgroup_id].append((parent_id, delegate_admin))
+    if descendants_ids is None:
+        descendants_ids = set(parents)
+
+    closure = {}
+    for descendant_id in descendants_ids:
+        # Walk up the graph: breadth-first for the depths, then only through delegating edges
+        depths = {descendant_id: 0}
+        queue = deque([descendant_id])
+        while queue:
+            g = queue.popleft()
+            for (parent_id, _) in parents[g]:
+                if parent_id not in depths:
+                    depths[parent_id] = depths[g] + 1
+                    queue.append(parent_id)
+        delegating = {descendant_id}
+        stack = [descendant_id]
+        while stack:
+            g = stack.pop()
+            for (parent_id, delegate_admin) in parents[g]:
+                if delegate_admin and parent_id not in delegating:
+                    delegating.add(parent_id)
+                    stack.append(parent_id)
+        for (ancestor_id, depth) in depths.items():
+            if ancestor_id != descendant_id:
+                closure[(ancestor_id, descendant_id)] = (depth, ancestor_id in delegating)
+    return closure
+
+
+class GroupClosureManager(models.Manager):
+    def get_edges(self):
+        from sigma_core.models.group import GroupAcknowledgment
+        return GroupAcknowledgment.objects.filter(validated=True).values_list('parent_group_id', 'subgroup_id', 'delegate_admin')
+
+    def add_edge(self, parent_id, subgroup_id, delegate_admin):
+        """
+        Insert the paths created by a newly validated acknowledgment: every ancestor of the parent (itself included)
+        now reaches every descendant of the subgroup (itself included).
+        """
+        ancestors = [(parent_id, 0, True)] + list(self.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth', 'delegate_admin'))
+        descendants = [(subgroup_id, 0, True)] + list(self.filter(ancestor_id=subgroup_id).values_list('descendant_id', 'depth', 'delegate_admin'))
+        paths = {}
+        for (a, a_depth, a_delegate) in ancestors:
+            for (d, d_depth, d_delegate) in descendants:
+                if a != d:
+                    paths[(a, d)] = (a_depth + 1 + d_depth, a_delegate and delegate_admin and d_delegate)
+
+        with transaction.atomic():
+            existing = self.filter(ancestor_id__in=[a for (a, _, _) in ancestors], descendant_id__in=[d for (d, _, _) in descendants])
+            for row in existing.select_for_update():
+                (depth, delegate) = paths.pop((row.ancestor_id, row.descendant_id), (row.depth, row.delegate_admin))
+                depth = min(depth, row.depth)
+                delegate = delegate or row.delegate_admin
+                if (depth, delegate) != (row.depth, row.delegate_admin):
+                    self.filter(pk=row.pk).update(depth=depth, delegate_admin=delegate)
+            self.bulk_create([self.model(ancestor_id=a, descendant_id=d, depth=depth, delegate_admin=delegate) for ((a, d), (depth, delegate)) in paths.items()])
+
+    def rebuild_subtree(self, group_id):
+        """
+        Recompute the rows of the given group and of its descendants, after an acknowledgment has been removed or changed.
+        """
+        descendants_ids = {group_id} | set(self.filter(ancestor_id=group_id).values_list('descendant_id', flat=True))
+        self.rebuild(descendants_ids)
+
+    def rebuild(self, descendants_ids=None):
+        expected = compute_closure(self.get_edges(), descendants_ids)
+        with transaction.atomic():
+            existing = self.all() if descendants_ids is None else self.filter(descendant_id__in=descendants_ids)
+            stale = []
+            for row in existing.select_for_update():
+                key = (row.ancestor_id, row.descendant_id)
+                if expected.get(key) == (row.depth, row.delegate_admin):
+                    del expected[key]
+                else:
+                    # Missing or changed rows are (re)created below
+                    stale.append(row.pk)
+            self.filter(pk__in=stale).delete()
+            self.bulk_create([self.model(ancestor_id=a, descendant_id=d, depth=depth, delegate_admin=delegate) for ((a, d), (depth, delegate)) in expected.items()], batch_size=500)
+
+
+class GroupClosure(models.Model):
+    """
+    Transitive closure of the validated GroupAcknowledgments: one row per (ancestor, descendant) pair, with the length
+    of the shortest path between them and whether the admins of ancestor administrate descendant (there is a path
+    whose every acknowledgment delegates admin).
+
+    Kept up to date from GroupAcknowledgment changes (see sigma_core.signals).
+    """
+    class Meta:
+        unique_together = (("ancestor", "descendant"),)
+
+    ancestor = models.ForeignKey('Group', related_name='+')
+    descendant = models.ForeignKey('Group', related_name='+')
+    depth = models.PositiveIntegerField()
+    delegate_admin = models.BooleanField()
+
+    objects = GroupClosureManager()
+
+    def __str__(self):
+        return "Group \"%s\" is an ancestor of Group \"%s\" (depth %d)" % (self.ancestor_id, self.descendant_id, self.depth)
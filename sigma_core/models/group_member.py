@@ -14,6 +14,7 @@ class GroupMember(models.Model):
     user = models.ForeignKey('User', related_name='memberships')
     group = models.ForeignKey('Group', related_name='memberships')
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     join_date = models.DateField(blank=True, null=True)
     leave_date = models.DateField(blank=True, null=True)
 
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class QueuedMailManager(models.Manager):
+    def enqueue(self, subject, message, from_email, recipient_list):
+        """
+        Queue a mail, delivered by the send_queued_mail worker (see sigma_core.outbox). Same arguments as send_mail().
+        """
+        return self.create(subject=subject, body=message, from_email=from_email, recipients='\n'.join(recipient_list))
+
+    def claim_due(self, limit, lease):
+        """
+        Return up to limit mails due for delivery, and postpone them by lease seconds so that concurrent workers skip
+        them until they are delivered or rescheduled.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            mails = list(self.select_for_update().filter(next_attempt__lte=now).order_by('next_attempt', 'id')[:limit])
+            self.filter(pk__in=[m.pk for m in mails]).update(next_attempt=now + timedelta(seconds=lease))
+        return mails
+
+
+class QueuedMail(models.Model):
+    """
+    Outgoing mail, written in the request which sends it and delivered later by a worker. Delivered mails are deleted;
+    mails whose delivery failed too many times are kept for inspection, with no next_attempt and without their body
+    (which may hold credentials, eg. reset passwords).
+    """
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField() # One address per line
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=timezone.now, null=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    objects = QueuedMailManager()
+
+    @property
+    def recipient_list(self):
+        return self.recipients.splitlines()
+
+    def __str__(self):
+        return "Mail \"%s\" to %s" % (self.subject, ', '.join(self.recipient_list))
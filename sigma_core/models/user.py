@@ -46,6 +46,10 @@ class User(AbstractBaseUser):
     """
     User are identified by their email. Lastname and firstname are required.
     """
+    class Meta:
+        # Users are listed by lastname (see UserViewSet.pagination_ordering)
+        index_together = (("lastname", "id"),)
+
     email = models.EmailField(max_length=254, unique=True)
     lastname = models.CharField(max_length=255)
     firstname = models.CharField(max_length=128)
@@ -90,9 +94,8 @@ class User(AbstractBaseUser):
         return cluster in self.clusters.all()
 
     def is_cluster_admin(self, cluster):
-        from sigma_core.models.cluster import Cluster
-        ms = self.get_group_membership(cluster.group_ptr)
-        return (ms is not None and ms.perm_rank == Cluster.ADMINISTRATOR_RANK)
+        ms = self.get_group_membership(cluster.group_ptr_id)
+        return (ms is not None and ms.is_administrator)
 
     def is_admin_of_one_cluster(self, clusters):
         from functools import reduce
@@ -103,7 +106,8 @@ class User(AbstractBaseUser):
         """
         Return True iff self has a cluster in common with user.
         """
-        return len(set(self.clusters.all().values_list('id', flat=True)).intersection(user.clusters.all().values_list('id', flat=True))) > 0
+        from sigma_core.visibility import VisibilityContext
+        return VisibilityContext.for_user(self).has_common_cluster(user)
 
     def has_common_group(self, user):
         """
@@ -112,46 +116,85 @@ class User(AbstractBaseUser):
         """
         # We filter on is_accepted : we are really in the same group if you ARE really in the group.
         # But, on the other hand, you can "see" pending request of other members.
-        return len(set(self.memberships.filter(is_accepted=True).values_list('group', flat=True)).intersection(user.memberships.all().values_list('group', flat=True))) > 0
+        from sigma_core.visibility import VisibilityContext
+        return VisibilityContext.for_user(self).has_common_group(user)
+
+    def get_group_memberships(self):
+        """
+        Return the memberships of self keyed by group id.
+        They are loaded once and memoized on the instance, so every permission helper called while handling a
+        request shares the same query. Use clear_memberships_cache() after modifying them.
+        """
+        memberships = getattr(self, '_group_memberships', None)
+        if memberships is None:
+            memberships = {m.group_id: m for m in self.memberships.all()}
+            self._group_memberships = memberships
+        return memberships
+
+    def get_chat_memberships(self):
+        """
+        Return the chat memberships of self keyed by chat id (memoized, see get_group_memberships).
+        """
+        memberships = getattr(self, '_chat_memberships', None)
+        if memberships is None:
+            memberships = {m.chat_id: m for m in self.user_chatmember.all()}
+            self._chat_memberships = memberships
+        return memberships
+
+    def clear_memberships_cache(self):
+        self.__dict__.pop('_group_memberships', None)
+        self.__dict__.pop('_chat_memberships', None)
+        self.__dict__.pop('_delegated_admin_groups_ids', None)
 
     def get_group_membership(self, group):
-        from sigma_core.models.group_member import GroupMember
-        from sigma_core.models.group import Group
-        try:
-            return self.memberships.get(group=group)
-        except GroupMember.DoesNotExist:
-            return None
+        return self.get_group_memberships().get(getattr(group, 'pk', group))
 
     def is_group_member(self, g):
-        from sigma_core.models.group_member import GroupMember
         mem = self.get_group_membership(g)
-        return mem is not None and mem.is_accepted()
+        return mem is not None and mem.is_accepted
 
     def can_invite(self, group):
-        from sigma_core.models.group_member import GroupMember
         mem = self.get_group_membership(group)
         return mem is not None and mem.can_invite
 
     def can_accept_join_requests(self, group):
         # Considered that someone who can invite can also accept join requests
-        from sigma_core.models.group_member import GroupMember
         if self.is_sigma_admin():
             return True
         mem = self.get_group_membership(group)
         return mem is not None and mem.can_invite
 
     def can_modify_group_infos(self, group):
-        from sigma_core.models.group_member import GroupMember
         mem = self.get_group_membership(group)
         return mem is not None and mem.can_modify_group_infos
 
     def has_group_admin_perm(self, group):
-        from sigma_core.models.group_member import GroupMember
-        from sigma_core.models.group import Group
         if self.is_sigma_admin():
             return True
         mem = self.get_group_membership(group)
-        return mem is not None and (mem.is_administrator or mem.is_superadministrator)
+        if mem is not None and (mem.is_administrator or mem.is_super_administrator):
+            return True
+        return self.has_delegated_admin_perm(group)
+
+    def get_delegated_admin_groups_ids(self):
+        """
+        Return the ids of the groups self administrates through a delegating ancestor (memoized, see get_group_memberships).
+        """
+        delegated = getattr(self, '_delegated_admin_groups_ids', None)
+        if delegated is None:
+            from sigma_core.models.group_closure import GroupClosure
+            administrated_groups_ids = [gid for (gid, m) in self.get_group_memberships().items() if m.is_administrator or m.is_super_administrator]
+            delegated = set()
+            if administrated_groups_ids:
+                delegated = set(GroupClosure.objects.filter(ancestor_id__in=administrated_groups_ids, delegate_admin=True).values_list('descendant_id', flat=True))
+            self._delegated_admin_groups_ids = delegated
+        return delegated
+
+    def has_delegated_admin_perm(self, group):
+        """
+        Whether self administrates an ancestor of group which delegates its admin rights down to group.
+        """
+        return getattr(group, 'pk', group) in self.get_delegated_admin_groups_ids()
 
     def is_invited_to_group_id(self, groupId):
         return self.invited_to_groups.filter(pk=groupId).exists()
@@ -161,10 +204,7 @@ class User(AbstractBaseUser):
         return GroupMember.objects.filter(Q(user=self) & Q(is_accepted=True)).values_list('group', flat=True)
 
     def get_chat_membership(self, chat):
-        try:
-            return self.user_chatmember.get(chat=chat)
-        except ChatMember.DoesNotExist:
-            return None
+        return self.get_chat_memberships().get(getattr(chat, 'pk', chat))
 
     def is_chat_member(self, chat):
         mem = self.get_chat_membership(chat)
@@ -177,7 +217,7 @@ class User(AbstractBaseUser):
     def is_chat_creator(self, chat):
         mem = self.get_chat_membership(chat)
         return mem is not None and mem.is_creator
-        
+
 
     ###############
     # Permissions #
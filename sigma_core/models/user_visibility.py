@@ -0,0 +1,59 @@
+from django.db import IntegrityError, models, transaction
+
+
+class UserVisibilityManager(models.Manager):
+    def compute_pairs(self, viewers_ids=None, targets_ids=None):
+        """
+        Compute the (viewer_id, target_id) pairs w.r.t. the live rules, optionally restricted to some viewers or targets:
+        viewer is an accepted member of a group (which is not a cluster) target belongs to.
+        """
+        from sigma_core.models.group_member import GroupMember
+        # Conditions on the viewer's membership must be given in a single filter() call to share the same join
+        lookups = {'group__cluster__isnull': True, 'group__memberships__is_accepted': True}
+        if viewers_ids is not None:
+            lookups['group__memberships__user_id__in'] = viewers_ids
+        if targets_ids is not None:
+            lookups['user_id__in'] = targets_ids
+        qs = GroupMember.objects.filter(**lookups)
+        return {(v, t) for (v, t) in qs.values_list('group__memberships__user_id', 'user_id').distinct() if v != t}
+
+    def rebuild_for_user(self, user_id, attempts=3):
+        """
+        Recompute the rows involving the given user, as a viewer or as a target.
+        A change of the memberships of an user only affects the pairs he is part of.
+        """
+        for attempt in range(attempts):
+            expected = self.compute_pairs(viewers_ids=[user_id]) | self.compute_pairs(targets_ids=[user_id])
+            try:
+                with transaction.atomic():
+                    existing = self.filter(models.Q(viewer_id=user_id) | models.Q(target_id=user_id))
+                    current = set(existing.values_list('viewer_id', 'target_id'))
+                    stale = current - expected
+                    self.filter(viewer_id=user_id, target_id__in=[t for (v, t) in stale if v == user_id]).delete()
+                    self.filter(target_id=user_id, viewer_id__in=[v for (v, t) in stale if t == user_id]).delete()
+                    self.bulk_create([self.model(viewer_id=v, target_id=t) for (v, t) in expected - current])
+                return
+            except IntegrityError:
+                # Pairs inserted by the concurrent rebuild of the other user: recompute w.r.t. the committed rows
+                if attempt == attempts - 1:
+                    raise
+
+
+class UserVisibility(models.Model):
+    """
+    Materialized "viewer can see the detailed profile of target" relation, w.r.t. the Normal Rules of Visibility.
+
+    It holds the pairs of users who share a group (viewer being an accepted member of it), and is kept up to date
+    from GroupMember changes (see sigma_core.signals). Clusters are left out: they can hold tens of thousands of
+    members, and common clusters are checked from User.clusters instead.
+    """
+    class Meta:
+        unique_together = (("viewer", "target"),)
+
+    viewer = models.ForeignKey('User', related_name='+')
+    target = models.ForeignKey('User', related_name='visible_to')
+
+    objects = UserVisibilityManager()
+
+    def __str__(self):
+        return "User \"%s\" can see User \"%s\"" % (self.viewer_id, self.target_id)
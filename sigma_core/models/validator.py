@@ -1,75 +1,118 @@
-import timeout_decorator
+import json
+import threading
+import time
+from collections import OrderedDict
 
 from django.db import models
 
 from django.core.exceptions import ValidationError
-from django.core.validators import RegexValidator
 from jsonfield import JSONField
 
 import re # regex
 
+from sigma_core import safe_regex
+
 from django.core.validators import validate_email
 
 
-def get_validator_by_name(name):
+class ValidatorType(object):
     """
-    For given validator name, returns associated functions array:
-    validator = { validate_fields: vf, validate_input: vi }
-    Where:
-        - vf(fields)
-            Raises a ValidationError if given fields are not valid for this validator
-        - vi(fields, user_input)
-            Throws a ValidationError if given input is not valid for this validator
-
-    Returns None if there is no validator matching that name.
+    Base class of the validator types, registered with register_validator_type().
+
+    validate_fields(fields) raises a ValidationError if given fields are not valid for this validator. compile(fields)
+    returns a rule: a callable rule(user_input) which raises a ValidationError if given input is not valid. Rules are
+    cached, so compile() should do every work that does not depend on the input.
     """
+    def validate_fields(self, fields):
+        pass
+
+    def compile(self, fields):
+        return lambda user_input: None
 
-    # Validators functions
-    def text_validate_fields(fields):
-        # TODO: Is it safe to call re.compile with user input ? Possible infinite loops ... ?
+
+class TextValidatorType(ValidatorType):
+    def validate_fields(self, fields):
         try:
             re.compile(fields['regex'])
         except re.error:
             raise ValidationError(fields['message'] + " (invalid Regex syntax)")
 
-    # Protection against Evil Regex. Only 50ms to evaluate regex - should be enough.
-    @timeout_decorator.timeout(0.05, use_signals=False)
-    def regex_check_timeout(regex, error_message, input):
-        try:
-            RegexValidator(regex, error_message)(input)
-        except re.error: # Should not happen ...
-            raise ValidationError("Invalid validator for this field.")
+    def compile(self, fields):
+        regex = fields['regex']
+        message = fields['message']
+        if not regex:
+            return lambda user_input: None
+
+        # Protection against Evil Regex: patterns are matched in linear time, or given 50ms on the worker pool.
+        matcher = safe_regex.get_matcher(regex)
+        search = matcher.search if matcher is not None else lambda text: safe_regex.get_pool().search(regex, text)
 
-    def text_validate_input(fields, input):
-        if (fields['regex']):
+        def rule(user_input):
             try:
-                regex_check_timeout(fields['regex'], fields['message'], input)
-            except timeout_decorator.TimeoutError:
-                raise ValidationError(fields['message'])
-
-    # Validators map
-    validators_map = {
-        Validator.VALIDATOR_NONE: {
-            'validate_fields':    lambda f: True,
-            'validate_input':     lambda f,i: True,
-        },
-        Validator.VALIDATOR_TEXT: {
-            'validate_fields':    text_validate_fields,
-            'validate_input':     text_validate_input
-        },
-        # TODO: Register validators here
-    }
-
-    # Find matching validator
-    try:
-        return validators_map[name]
-    except KeyError:
-        return None
+                if not search(str(user_input)):
+                    raise ValidationError(message, code='invalid')
+            except safe_regex.RegexTimeout:
+                raise ValidationError(message)
+            except re.error: # Should not happen ...
+                raise ValidationError("Invalid validator for this field.")
+        return rule
+
+
+_validator_types = {}
+
+def register_validator_type(name, validator_type):
+    _validator_types[name] = validator_type
+
+def get_validator_by_name(name):
+    """
+    Return the ValidatorType registered for given validator name, or None if there is no validator matching that name.
+    """
+    return _validator_types.get(name)
+
+
+class CompiledRulesCache(object):
+    """
+    Bounded LRU cache of the rules compiled for (validator name, validator values) pairs.
+    Keys hold the values themselves, so an entry can never be stale; entries of edited or deleted GroupFields are
+    evicted to save room (see sigma_core.signals).
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.rules = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(name, fields):
+        return (name, json.dumps(fields, sort_keys=True))
+
+    def get(self, name, fields):
+        key = self.key(name, fields)
+        with self.lock:
+            rule = self.rules.get(key)
+            if rule is not None:
+                self.rules.move_to_end(key)
+                return rule
+        rule = get_validator_by_name(name).compile(fields)
+        with self.lock:
+            self.rules[key] = rule
+            if len(self.rules) > self.max_size:
+                self.rules.popitem(last=False)
+        return rule
+
+    def evict(self, name, fields):
+        with self.lock:
+            self.rules.pop(self.key(name, fields), None)
+
+    def clear(self):
+        with self.lock:
+            self.rules.clear()
+
+compiled_rules = CompiledRulesCache()
 
 
 def validate_validator_fields(validator, fields):
     v = get_validator_by_name(validator)
-    v['validate_fields'](fields)
+    v.validate_fields(fields)
 
 def are_validator_fields_valid(validator, fields):
     try:
@@ -79,8 +122,7 @@ def are_validator_fields_valid(validator, fields):
         return False
 
 def validate_validator_input(validator, validator_values, value):
-    v = get_validator_by_name(validator)
-    v['validate_input'](validator_values, value)
+    compiled_rules.get(validator, validator_values)(value)
 
 def is_validator_input_valid(validator, validator_values, value):
     try:
@@ -89,6 +131,30 @@ def is_validator_input_valid(validator, validator_values, value):
     except ValidationError:
         return False
 
+class ValidatorManager(models.Manager):
+    """
+    Validator rows are tiny and almost never change: they are cached per process for cache_timeout seconds. The cache
+    of the process which saves or deletes a validator is dropped (see sigma_core.signals); the other processes, and a
+    process which loaded rows later rolled back, may use stale rows until the timeout.
+    """
+    cache_timeout = 60
+    # (expiry time, {html_name: validator})
+    _cache = None
+
+    def get_cached(self, html_name):
+        cache = ValidatorManager._cache
+        if cache is None or cache[0] < time.monotonic() or html_name not in cache[1]:
+            # Reload on misses: the validator may have been created by another process
+            cache = ValidatorManager._cache = (time.monotonic() + self.cache_timeout, {v.html_name: v for v in self.all()})
+        if html_name not in cache[1]:
+            raise self.model.DoesNotExist()
+        return cache[1][html_name]
+
+    @staticmethod
+    def clear_cache():
+        ValidatorManager._cache = None
+
+
 class Validator(models.Model):
     class Meta:
         pass
@@ -110,6 +176,8 @@ class Validator(models.Model):
     # Serialized JSON array (fieldName => fieldDescription)
     values          = JSONField()
 
+    objects = ValidatorManager()
+
     def __str__(self):
         return "Validator \"%s\" (\"%s\" with values=\"%s\")" % (self.display_name, self.html_name, self.values)
 
@@ -118,3 +186,7 @@ class Validator(models.Model):
 
     def validate_input(self, validator_values, client_input):
         return validate_validator_input(self.html_name, validator_values, client_input)
+
+
+register_validator_type(Validator.VALIDATOR_NONE, ValidatorType())
+register_validator_type(Validator.VALIDATOR_TEXT, TextValidatorType())
@@ -0,0 +1,88 @@
+"""
+Delivery of the queued mails.
+
+Requests never talk to the mail server: they write their mails to the QueuedMail table, in their transaction, and
+return once it is committed. The send_queued_mail worker delivers them through a single connection of the mail
+backend (EMAIL_BACKEND: SMTP in production), and reschedules the failed ones with an exponential backoff. Settings:
+
+    OUTBOX = {
+        'BATCH_SIZE': 100,         # Mails claimed (and sent through one connection) at once
+        'LEASE': 300,              # Seconds a claimed mail is hidden from the other workers
+        'MAX_ATTEMPTS': 8,         # Deliveries tried before giving up
+        'RETRY_DELAY': 60,         # Seconds before the first retry, doubled by each failure...
+        'MAX_RETRY_DELAY': 3600,   # ...up to this one
+        'POLL_INTERVAL': 5,        # Seconds between two polls of the worker, when the outbox is empty
+    }
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from sigma_core.models.queued_mail import QueuedMail
+
+
+logger = logging.getLogger('sigma_core.outbox')
+
+DEFAULTS = {
+    'BATCH_SIZE': 100,
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 8,
+    'RETRY_DELAY': 60,
+    'MAX_RETRY_DELAY': 3600,
+    'POLL_INTERVAL': 5,
+}
+
+def get_setting(name):
+    return getattr(settings, 'OUTBOX', {}).get(name, DEFAULTS[name])
+
+
+def retry_delay(attempts):
+    return min(get_setting('RETRY_DELAY') * 2 ** (attempts - 1), get_setting('MAX_RETRY_DELAY'))
+
+
+def reschedule(mail, err):
+    mail.attempts += 1
+    mail.last_error = '%s: %s' % (err.__class__.__name__, err)
+    if mail.attempts >= get_setting('MAX_ATTEMPTS'):
+        # The body may hold credentials: only the envelope is kept for inspection
+        mail.next_attempt = None
+        mail.body = ''
+        logger.error('Giving up %s after %d attempts: %s', mail, mail.attempts, mail.last_error)
+    else:
+        mail.next_attempt = timezone.now() + timedelta(seconds=retry_delay(mail.attempts))
+        logger.warning('Failed to deliver %s (attempt %d): %s', mail, mail.attempts, mail.last_error)
+    mail.save(update_fields=['attempts', 'last_error', 'next_attempt', 'body'])
+
+
+def deliver_queued_mail(limit=None):
+    """
+    Deliver a batch of the due mails through one connection. Return the (delivered, failed) counts.
+    """
+    mails = QueuedMail.objects.claim_due(limit or get_setting('BATCH_SIZE'), get_setting('LEASE'))
+    if not mails:
+        return (0, 0)
+
+    (delivered, failed) = (0, 0)
+    connection = get_connection()
+    try:
+        for mail in mails:
+            message = EmailMessage(mail.subject, mail.body, mail.from_email, mail.recipient_list, connection=connection)
+            try:
+                # Only connects the first time, or after a failure
+                connection.open()
+                connection.send_messages([message])
+            except (smtplib.SMTPException, OSError) as err:
+                # The connection may be broken: the next mail reconnects
+                connection.close()
+                reschedule(mail, err)
+                failed += 1
+            else:
+                mail.delete()
+                delivered += 1
+    finally:
+        connection.close()
+    return (delivered, failed)
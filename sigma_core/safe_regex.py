@@ -0,0 +1,491 @@
+"""
+Regex matching protected against catastrophic backtracking.
+
+Patterns written with the common subset of the re syntax (literals, classes, groups, alternation, quantifiers and
+anchors) are compiled to a Thompson NFA and searched in linear time, in-process. Other patterns (backreferences,
+lookarounds, inline flags...) are evaluated by `re` on a pool of warm worker processes, which are killed and replaced
+when they exceed their time budget.
+
+This module must stay free of Django imports: it is imported by the worker processes.
+"""
+import multiprocessing
+import re
+import threading
+from functools import lru_cache
+
+
+# Maximal number of NFA states of a compiled pattern (counted repetitions are unrolled)
+MAX_STATES = 2000
+# Time budget of a regex evaluated on the worker pool, in seconds
+TIMEOUT = 0.05
+# Number of worker processes
+POOL_SIZE = 2
+
+
+class UnsupportedRegex(Exception):
+    """
+    The pattern uses a construct the linear matcher does not support.
+    """
+    pass
+
+
+class RegexTimeout(Exception):
+    pass
+
+
+###############
+# Char tests  #
+###############
+
+def _is_word(c):
+    return c.isalnum() or c == '_'
+
+_CLASS_ESCAPES = {
+    'd': lambda c: c.isdecimal(),
+    'D': lambda c: not c.isdecimal(),
+    'w': _is_word,
+    'W': lambda c: not _is_word(c),
+    's': lambda c: c.isspace(),
+    'S': lambda c: not c.isspace(),
+}
+
+_CHAR_ESCAPES = {'a': '\a', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+_HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+
+# As for re, '{}' is a literal but '{,}' means '*'
+_QUANTIFIER = re.compile(r'\{(?!\})(\d*)(,(\d*))?\}')
+
+
+##########
+# Parser #
+##########
+
+# AST nodes:
+#   ('char', test)              one char for which test(c) is True
+#   ('cat', [nodes])
+#   ('alt', [nodes])
+#   ('rep', node, min, max)     max is None for unbounded repetitions
+#   ('assert', kind)            kind is one of '^', '$', 'A', 'Z', 'b', 'B'
+
+class _Parser(object):
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def next(self):
+        c = self.peek()
+        if c is None:
+            raise UnsupportedRegex("Unexpected end of pattern")
+        self.pos += 1
+        return c
+
+    def parse(self):
+        node = self.alternation()
+        if self.pos != len(self.pattern):
+            raise UnsupportedRegex("Unbalanced parenthesis")
+        return node
+
+    def alternation(self):
+        branches = [self.concatenation()]
+        while self.peek() == '|':
+            self.pos += 1
+            branches.append(self.concatenation())
+        return branches[0] if len(branches) == 1 else ('alt', branches)
+
+    def concatenation(self):
+        items = []
+        while self.peek() is not None and self.peek() not in '|)':
+            items.append(self.quantified(self.atom()))
+        return ('cat', items)
+
+    def quantified(self, atom):
+        c = self.peek()
+        if c in ('*', '+', '?'):
+            self.pos += 1
+            (low, high) = {'*': (0, None), '+': (1, None), '?': (0, 1)}[c]
+        elif c == '{':
+            m = _QUANTIFIER.match(self.pattern, self.pos)
+            if m is None:
+                return atom # A literal '{', parsed by the next atom() call
+            self.pos = m.end()
+            low = int(m.group(1) or 0)
+            if m.group(2) is None:
+                high = low
+            else:
+                high = int(m.group(3)) if m.group(3) else None
+        else:
+            return atom
+
+        if atom[0] == 'assert':
+            raise UnsupportedRegex("Nothing to repeat")
+        # Lazy quantifiers match the same strings: we only look for the existence of a match
+        if self.peek() == '?':
+            self.pos += 1
+        if self.peek() in ('*', '+', '?') or _QUANTIFIER.match(self.pattern, self.pos):
+            raise UnsupportedRegex("Multiple repeat")
+        return ('rep', atom, low, high)
+
+    def atom(self):
+        c = self.next()
+        if c == '(':
+            if self.peek() == '?':
+                if self.pattern.startswith('?:', self.pos):
+                    self.pos += 2
+                elif self.pattern.startswith('?P<', self.pos):
+                    end = self.pattern.find('>', self.pos)
+                    if end < 0:
+                        raise UnsupportedRegex("Bad group name")
+                    self.pos = end + 1
+                else:
+                    raise UnsupportedRegex("Unsupported group extension")
+            node = self.alternation()
+            if self.next() != ')':
+                raise UnsupportedRegex("Unbalanced parenthesis")
+            return node
+        if c == '[':
+            return ('char', self.char_class())
+        if c == '.':
+            return ('char', lambda ch: ch != '\n')
+        if c in '^$':
+            return ('assert', c)
+        if c == '\\':
+            return self.escape()
+        if c in '*+?':
+            raise UnsupportedRegex("Nothing to repeat")
+        return ('char', c.__eq__)
+
+    def escape(self):
+        c = self.next()
+        if c in _CLASS_ESCAPES:
+            return ('char', _CLASS_ESCAPES[c])
+        if c in 'AZbB':
+            return ('assert', c)
+        return ('char', self.char_escape(c).__eq__)
+
+    def char_escape(self, c):
+        """
+        Return the char matched by the escape sequence \\c (the backslash and c have already been consumed).
+        """
+        if c in _CHAR_ESCAPES:
+            return _CHAR_ESCAPES[c]
+        if c in _HEX_ESCAPES:
+            digits = self.pattern[self.pos:self.pos + _HEX_ESCAPES[c]]
+            if len(digits) != _HEX_ESCAPES[c]:
+                raise UnsupportedRegex("Bad escape")
+            self.pos += len(digits)
+            return chr(int(digits, 16))
+        if c == '0':
+            digits = ''
+            while len(digits) < 2 and self.peek() is not None and self.peek() in '01234567':
+                digits += self.next()
+            return chr(int('0' + digits, 8))
+        if c.isalnum():
+            # Backreferences and unknown escapes
+            raise UnsupportedRegex("Unsupported escape \\%s" % c)
+        return c
+
+    def char_class(self):
+        negated = self.peek() == '^'
+        if negated:
+            self.pos += 1
+        chars = set()
+        ranges = []
+        tests = []
+        first = True
+        while True:
+            c = self.next()
+            if c == ']' and not first:
+                break
+            first = False
+            if c == '\\':
+                e = self.next()
+                if e in _CLASS_ESCAPES:
+                    tests.append(_CLASS_ESCAPES[e])
+                    continue
+                c = '\b' if e == 'b' else self.char_escape(e)
+            if self.peek() == '-' and self.pattern[self.pos + 1:self.pos + 2] not in (']', ''):
+                self.pos += 1
+                end = self.next()
+                if end == '\\':
+                    e = self.next()
+                    if e in _CLASS_ESCAPES:
+                        raise UnsupportedRegex("Bad character range")
+                    end = '\b' if e == 'b' else self.char_escape(e)
+                ranges.append((c, end))
+            else:
+                chars.add(c)
+
+        def test(ch):
+            found = ch in chars or any(low <= ch <= high for (low, high) in ranges) or any(t(ch) for t in tests)
+            return found != negated
+        return test
+
+
+##########
+#  NFA   #
+##########
+
+_CHAR, _SPLIT, _ASSERT, _MATCH = range(4)
+
+
+class _Compiler(object):
+    """
+    Thompson construction. States are lists [op, arg, out1, out2] stored in self.states,
+    out1/out2 being indexes of the following states.
+    """
+    def __init__(self):
+        self.states = []
+
+    def state(self, op, arg=None):
+        if len(self.states) >= MAX_STATES:
+            raise UnsupportedRegex("Pattern too large")
+        self.states.append([op, arg, None, None])
+        return len(self.states) - 1
+
+    def patch(self, dangling, target):
+        for (s, slot) in dangling:
+            self.states[s][slot] = target
+
+    def compile(self, node):
+        """
+        Return (start, dangling): the entry state of the fragment and the list of (state, slot) left to patch.
+        """
+        kind = node[0]
+        if kind == 'char':
+            s = self.state(_CHAR, node[1])
+            return (s, [(s, 2)])
+        if kind == 'assert':
+            s = self.state(_ASSERT, node[1])
+            return (s, [(s, 2)])
+        if kind == 'cat':
+            if not node[1]:
+                s = self.state(_SPLIT)
+                return (s, [(s, 2), (s, 3)])
+            (start, dangling) = self.compile(node[1][0])
+            for item in node[1][1:]:
+                (s, d) = self.compile(item)
+                self.patch(dangling, s)
+                dangling = d
+            return (start, dangling)
+        if kind == 'alt':
+            (start, dangling) = self.compile(node[1][0])
+            for branch in node[1][1:]:
+                (s, d) = self.compile(branch)
+                split = self.state(_SPLIT)
+                self.states[split][2] = start
+                self.states[split][3] = s
+                start = split
+                dangling = dangling + d
+            return (start, dangling)
+        if kind == 'rep':
+            (_, child, low, high) = node
+            items = [child] * low
+            if high is None:
+                items.append(('star', child))
+            else:
+                items += [('opt', child)] * (high - low)
+            return self.compile(('cat', items))
+        if kind == 'star':
+            split = self.state(_SPLIT)
+            (s, d) = self.compile(node[1])
+            self.states[split][2] = s
+            self.patch(d, split)
+            return (split, [(split, 3)])
+        if kind == 'opt':
+            split = self.state(_SPLIT)
+            (s, d) = self.compile(node[1])
+            self.states[split][2] = s
+            return (split, d + [(split, 3)])
+        raise UnsupportedRegex("Unknown node %s" % kind)
+
+
+class LinearMatcher(object):
+    """
+    Search a pattern with a simulation of its NFA: O(len(pattern) * len(text)), whatever the pattern.
+    """
+    def __init__(self, pattern):
+        compiler = _Compiler()
+        (start, dangling) = compiler.compile(_Parser(pattern).parse())
+        compiler.patch(dangling, compiler.state(_MATCH))
+        self.states = compiler.states
+        self.start = start
+
+    @staticmethod
+    def check_assertion(kind, text, pos):
+        n = len(text)
+        if kind in ('^', 'A'):
+            return pos == 0
+        if kind == 'Z':
+            return pos == n
+        if kind == '$':
+            return pos == n or (pos == n - 1 and text[pos] == '\n')
+        boundary = (pos > 0 and _is_word(text[pos - 1])) != (pos < n and _is_word(text[pos]))
+        return boundary if kind == 'b' else not boundary
+
+    def add_thread(self, threads, seen, state, text, pos):
+        stack = [state]
+        while stack:
+            s = stack.pop()
+            if s in seen:
+                continue
+            seen.add(s)
+            (op, arg, out1, out2) = self.states[s]
+            if op == _SPLIT:
+                stack.append(out2)
+                stack.append(out1)
+            elif op == _ASSERT:
+                if self.check_assertion(arg, text, pos):
+                    stack.append(out1)
+            else:
+                threads.append(s)
+
+    def search(self, text):
+        """
+        Return True iff the pattern matches somewhere in text (same as re.search(pattern, text) is not None).
+        """
+        threads = []
+        seen = set()
+        for pos in range(len(text) + 1):
+            # A new match attempt starts at every position
+            self.add_thread(threads, seen, self.start, text, pos)
+            if any(self.states[s][0] == _MATCH for s in threads):
+                return True
+            if pos == len(text):
+                break
+            c = text[pos]
+            following = []
+            seen = set()
+            for s in threads:
+                (op, test, out1, _) = self.states[s]
+                if op == _CHAR and test(c):
+                    self.add_thread(following, seen, out1, text, pos + 1)
+            threads = following
+        return False
+
+
+###############
+# Worker pool #
+###############
+
+def _worker_loop(conn):
+    compiled = {}
+    while True:
+        try:
+            (pattern, text) = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            if pattern not in compiled:
+                compiled[pattern] = re.compile(pattern)
+            conn.send(compiled[pattern].search(text) is not None)
+        except re.error as err:
+            conn.send(err)
+
+
+class _Worker(object):
+    def __init__(self, context):
+        (self.conn, child_conn) = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_conn, ), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+class RegexWorkerPool(object):
+    """
+    Pool of warm processes evaluating the patterns the linear matcher cannot handle.
+    A worker exceeding its time budget is killed and lazily replaced.
+    """
+    def __init__(self, size=POOL_SIZE, timeout=TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.idle = []
+        self.started = 0
+        # Notified when a worker becomes idle, or when a slot is freed by a killed one
+        self.available = threading.Condition()
+        methods = multiprocessing.get_all_start_methods()
+        # Do not fork a possibly multi-threaded server when we can avoid it
+        self.context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+
+    def acquire(self):
+        with self.available:
+            while not self.idle and self.started >= self.size:
+                self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.started += 1
+        try:
+            return _Worker(self.context)
+        except Exception:
+            self.discard()
+            raise
+
+    def release(self, worker):
+        with self.available:
+            self.idle.append(worker)
+            self.available.notify()
+
+    def discard(self):
+        """
+        Free the slot of a worker which has been killed (or could not be started).
+        """
+        with self.available:
+            self.started -= 1
+            self.available.notify()
+
+    def search(self, pattern, text):
+        worker = self.acquire()
+        try:
+            worker.conn.send((pattern, text))
+            if not worker.conn.poll(self.timeout):
+                raise RegexTimeout()
+            result = worker.conn.recv()
+        except BaseException:
+            worker.kill()
+            self.discard()
+            raise
+        self.release(worker)
+        if isinstance(result, re.error):
+            raise result
+        return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RegexWorkerPool()
+        return _pool
+
+
+@lru_cache(maxsize=256)
+def get_matcher(pattern):
+    """
+    Return the LinearMatcher of pattern, or None if it uses unsupported constructs.
+    """
+    try:
+        return LinearMatcher(pattern)
+    except UnsupportedRegex:
+        return None
+
+
+def search(pattern, text):
+    """
+    Return True iff pattern matches somewhere in text, like re.search.
+    Raise RegexTimeout if the pattern had to be evaluated by `re` and took too long.
+    """
+    matcher = get_matcher(pattern)
+    if matcher is not None:
+        return matcher.search(text)
+    return get_pool().search(pattern, text)
@@ -1,16 +1,18 @@
 from rest_framework import serializers
 
+from sigma.fieldsets import SparseFieldsMixin
 from sigma_core.models.cluster import Cluster
+from sigma_core.models.group import Group
 from sigma_core.serializers.group import GroupSerializer
 
-class BasicClusterSerializer(serializers.ModelSerializer):
+class BasicClusterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serialize Cluster model without memberships.
     """
     class Meta:
         model = Cluster
+        read_only_fields = Group.COUNTER_FIELDS
         exclude = (
-            'can_anyone_join',
             'is_protected',
             'is_private',
         )
@@ -1,13 +1,16 @@
 from rest_framework import serializers
 
+from sigma.fieldsets import SparseFieldsMixin
 from sigma_core.models.group import Group
 
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serialize a Group without its relations with users.
     """
     class Meta:
         model = Group
+        read_only_fields = Group.COUNTER_FIELDS
+        field_sources = {'members_count': ('accepted_members_count', 'pending_members_count')}
 
     members_count = serializers.IntegerField(read_only=True)
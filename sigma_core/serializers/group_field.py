@@ -4,12 +4,14 @@ from sigma_core.models.user import User
 from sigma_core.models.group_field import GroupField
 from sigma_core.models.group import Group
 from sigma_core.models.validator import Validator
+from sigma_core.serializers.validator import CachedValidatorField
 
 class GroupFieldSerializer(serializers.ModelSerializer):
     class Meta:
         model = GroupField
 
     group = serializers.PrimaryKeyRelatedField(queryset=Group.objects.all())
+    validator = CachedValidatorField()
     validator_values = serializers.JSONField(binary=False)
 
     def validate(self, fields):
@@ -1,14 +1,19 @@
 from rest_framework import serializers
 
+from sigma.fieldsets import SparseFieldsMixin
 from sigma_core.models.user import User
 from sigma_core.models.group import Group
 from sigma_core.models.group_member import GroupMember
+from sigma_core.serializers.group import GroupSerializer
+from sigma_core.serializers.user import MinimalUserSerializer
 
 
-class GroupMemberSerializer(serializers.ModelSerializer):
+class GroupMemberSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = GroupMember
         exclude = ('user', 'group', )
+        # Only the public data of the members
+        expandable = {'user': (MinimalUserSerializer, {}), 'group': (GroupSerializer, {})}
         #read_only_fields = ('perm_rank', )
 
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user')
@@ -18,5 +18,5 @@ class GroupMemberValueSerializer(serializers.ModelSerializer):
         mship = fields.get('membership')
         if group_field.group != mship.group:
             raise serializers.ValidationError("Condition (field.group == membership.group) is not verified.")
-        group_field.validator.validate_input(group_field.validator_values, fields.get('value'))
+        group_field.validate_input(fields.get('value'))
         return super().validate(fields)
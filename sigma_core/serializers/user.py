@@ -1,7 +1,10 @@
 from rest_framework import serializers
 
+from sigma.fieldsets import SparseFieldsMixin
 from sigma_core.models.user import User
 from sigma_core.models.cluster import Cluster
+from sigma_core.serializers.cluster import BasicClusterSerializer
+from sigma_core.serializers.group import GroupSerializer
 from sigma_files.models import Image
 from sigma_files.serializers import ImageSerializer
 
@@ -11,9 +14,10 @@ class UserSerializerMeta():
     exclude = ('is_staff', 'is_superuser', 'invited_to_groups', 'clusters', 'groups', )
     read_only_fields = ('last_login', 'is_active', 'photo', )
     extra_kwargs = {'password': {'write_only': True, 'required': False}}
+    expandable = {'clusters': (BasicClusterSerializer, {'many': True})}
 
 
-class MinimalUserSerializer(serializers.ModelSerializer):
+class MinimalUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serialize an User with minimal data.
     """
@@ -21,11 +25,12 @@ class MinimalUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'lastname', 'firstname', 'is_active', 'clusters_ids', )
         read_only_fields = ('is_active', )
+        expandable = UserSerializerMeta.expandable
 
     clusters_ids = serializers.PrimaryKeyRelatedField(queryset=Cluster.objects.all(), many=True, source='clusters')
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serialize an User with related keys.
     """
@@ -56,6 +61,6 @@ class MyUserSerializer(UserSerializer):
     Serialize current User with related keys.
     """
     class Meta(UserSerializerMeta):
-        pass
+        expandable = dict(UserSerializerMeta.expandable, invited_to_groups=(GroupSerializer, {'many': True}))
 
     invited_to_groups_ids = serializers.PrimaryKeyRelatedField(read_only=True, many=True, source='invited_to_groups')
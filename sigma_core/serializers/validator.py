@@ -2,6 +2,21 @@ from rest_framework import serializers
 
 from sigma_core.models.validator import Validator
 
+class CachedValidatorField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolve validators from the per-process cache instead of querying them.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Validator.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return Validator.objects.get_cached(data)
+        except Validator.DoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+
+
 class ValidatorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Validator
@@ -0,0 +1,167 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from sigma_core import cluster_cache
+from sigma_core.models.cluster import Cluster
+from sigma_core.models.group import Group, GroupAcknowledgment
+from sigma_core.models.group_closure import GroupClosure
+from sigma_core.models.group_field import GroupField
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+from sigma_core.models.user_visibility import UserVisibility
+from sigma_core.models.validator import Validator, compiled_rules
+
+
+@receiver(post_init, sender=GroupMember)
+def track_group_member_acceptance(sender, instance, **kwargs):
+    # Deferred fields are not in __dict__: do not load them
+    instance._initial_is_accepted = instance.__dict__.get('is_accepted')
+
+
+def members_counter(is_accepted):
+    return 'accepted_members_count' if is_accepted else 'pending_members_count'
+
+
+@receiver(post_save, sender=GroupMember)
+def update_group_member_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.is_accepted != instance._initial_is_accepted:
+        UserVisibility.objects.rebuild_for_user(instance.user_id)
+        if not created:
+            Group.objects.update_counter([instance.group_id], members_counter(instance._initial_is_accepted), -1)
+        Group.objects.update_counter([instance.group_id], members_counter(instance.is_accepted), 1)
+    instance._initial_is_accepted = instance.is_accepted
+
+
+@receiver(post_delete, sender=GroupMember)
+def update_group_member_on_delete(sender, instance, **kwargs):
+    UserVisibility.objects.rebuild_for_user(instance.user_id)
+    Group.objects.update_counter([instance.group_id], members_counter(instance.is_accepted), -1)
+
+
+@receiver(m2m_changed, sender=User.invited_to_groups.through)
+def update_invited_users_count(sender, instance, action, reverse, pk_set, **kwargs):
+    groups_ids = [instance.pk] if reverse else pk_set
+    if action == 'post_add':
+        # pk_set only holds the rows actually added
+        if reverse:
+            Group.objects.update_counter(groups_ids, 'invited_users_count', len(pk_set))
+        else:
+            Group.objects.update_counter(groups_ids, 'invited_users_count', 1)
+    elif action == 'pre_clear' and not reverse:
+        instance._cleared_invitations = list(instance.invited_to_groups.values_list('id', flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        # pk_set may hold rows which did not exist: recount
+        if action == 'post_clear' and not reverse:
+            groups_ids = instance.__dict__.pop('_cleared_invitations', [])
+        Group.objects.reconcile_counters(groups_ids)
+
+
+# The clusters and invitations of an user are part of his representation: they date it (see sigma.conditional)
+USER_RELATIONS = {
+    User.clusters.through: 'clusters',
+    User.invited_to_groups.through: 'invited_to_groups',
+}
+
+@receiver(m2m_changed, sender=User.clusters.through)
+@receiver(m2m_changed, sender=User.invited_to_groups.through)
+def touch_users_on_relations_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        users = User.objects.filter(pk=instance.pk)
+    elif reverse and action in ('post_add', 'post_remove'):
+        users = User.objects.filter(pk__in=pk_set)
+    elif reverse and action == 'pre_clear':
+        # Afterwards they cannot be found any more (the clear is done in the same transaction)
+        users = User.objects.filter(**{USER_RELATIONS[sender]: instance})
+    else:
+        return
+    users.update(last_modified=timezone.now())
+
+
+def invalidate_clusters_cache(groups_ids):
+    if groups_ids and Cluster.objects.filter(pk__in=groups_ids).exists():
+        cluster_cache.invalidate()
+
+
+@receiver(post_save, sender=Cluster)
+@receiver(post_delete, sender=Cluster)
+def invalidate_clusters_cache_on_cluster_change(sender, raw=False, **kwargs):
+    if not raw:
+        cluster_cache.invalidate()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=GroupMember)
+@receiver(post_delete, sender=GroupMember)
+def invalidate_clusters_cache_on_group_change(sender, instance, raw=False, **kwargs):
+    # Counters and members are part of the clusters representations
+    if not raw:
+        invalidate_clusters_cache([instance.pk if sender is Group else instance.group_id])
+
+
+@receiver(m2m_changed, sender=User.invited_to_groups.through)
+def invalidate_clusters_cache_on_invitations_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        invalidate_clusters_cache([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear':
+        invalidate_clusters_cache([instance.pk] if reverse else instance.invited_to_groups.values('id'))
+
+
+@receiver(post_init, sender=GroupField)
+def track_group_field_validator(sender, instance, **kwargs):
+    instance._initial_validator = (instance.__dict__.get('validator_id'), instance.__dict__.get('validator_values'))
+
+
+@receiver(post_save, sender=GroupField)
+def evict_compiled_rule_on_save(sender, instance, created, **kwargs):
+    (validator_id, validator_values) = instance._initial_validator
+    if not created and (validator_id, validator_values) != (instance.validator_id, instance.validator_values):
+        compiled_rules.evict(validator_id, validator_values)
+    instance._initial_validator = (instance.validator_id, instance.validator_values)
+
+
+@receiver(post_delete, sender=GroupField)
+def evict_compiled_rule_on_delete(sender, instance, **kwargs):
+    compiled_rules.evict(instance.validator_id, instance.validator_values)
+
+
+@receiver(post_save, sender=Validator)
+@receiver(post_delete, sender=Validator)
+def clear_validators_cache(sender, **kwargs):
+    Validator.objects.clear_cache()
+    # Concurrent requests may load the old rows again until the change is committed
+    transaction.on_commit(Validator.objects.clear_cache)
+
+
+@receiver(post_init, sender=GroupAcknowledgment)
+def track_group_acknowledgment(sender, instance, **kwargs):
+    instance._initial_edge = (instance.__dict__.get('parent_group_id'), instance.__dict__.get('subgroup_id'),
+        instance.__dict__.get('validated'), instance.__dict__.get('delegate_admin'))
+
+
+@receiver(post_save, sender=GroupAcknowledgment)
+def update_group_closure_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    (parent_group_id, subgroup_id, validated, delegate_admin) = instance._initial_edge
+    same_edge = not created and (parent_group_id, subgroup_id) == (instance.parent_group_id, instance.subgroup_id)
+    if same_edge and (validated, delegate_admin) == (instance.validated, instance.delegate_admin):
+        pass
+    elif instance.validated and (created or (same_edge and (not validated or instance.delegate_admin))):
+        # New paths, or paths which now delegate admin: incremental insert
+        GroupClosure.objects.add_edge(instance.parent_group_id, instance.subgroup_id, instance.delegate_admin)
+    else:
+        if validated and subgroup_id is not None:
+            GroupClosure.objects.rebuild_subtree(subgroup_id)
+        if instance.validated and instance.subgroup_id != subgroup_id:
+            GroupClosure.objects.rebuild_subtree(instance.subgroup_id)
+    instance._initial_edge = (instance.parent_group_id, instance.subgroup_id, instance.validated, instance.delegate_admin)
+
+
+@receiver(post_delete, sender=GroupAcknowledgment)
+def update_group_closure_on_delete(sender, instance, **kwargs):
+    if instance.validated:
+        GroupClosure.objects.rebuild_subtree(instance.subgroup_id)
@@ -0,0 +1,113 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.validator import Validator
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupFieldFactory, GroupMemberFactory
+from sigma_core.visibility import VisibilityContext
+
+
+class BatchTests(APITestCase):
+    fixtures = ['fixtures_prod.json']
+
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 1 user, 2 groups, 1 field in the group #2
+        # User #1 is accepted in group #1, anyone can join group #2
+        super().setUpTestData()
+        self.user = UserFactory()
+        self.group = GroupFactory()
+        self.open_group = GroupFactory(need_validation_to_join=False)
+        self.mship = GroupMemberFactory(user=self.user, group=self.group, is_accepted=True)
+        GroupFieldFactory(group=self.open_group, validator=Validator.objects.get(html_name=Validator.VALIDATOR_NONE), validator_values={})
+        self.batch_url = '/batch/'
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def batch(self, sub_requests, expected_status=status.HTTP_200_OK):
+        response = self.client.post(self.batch_url, sub_requests, format='json')
+        self.assertEqual(response.status_code, expected_status)
+        return response.data
+
+    def test_unauthed(self):
+        self.client.force_authenticate(user=None)
+        self.batch([{'url': '/group/'}], status.HTTP_401_UNAUTHORIZED)
+
+    def test_results_in_order(self):
+        results = self.batch([
+            {'method': 'GET', 'url': '/group/%d/' % self.group.id},
+            {'method': 'GET', 'url': '/group-member/?group=%d' % self.group.id},
+            {'method': 'GET', 'url': '/user/me/'},
+            {'method': 'GET', 'url': '/group/0/'},
+        ])
+        self.assertEqual([r['status'] for r in results], [200, 200, 200, 404])
+        self.assertEqual(results[0]['body']['name'], self.group.name)
+        self.assertIn('ETag', results[0]['headers'])
+        self.assertEqual([m['id'] for m in results[1]['body']['results']], [self.mship.id])
+        self.assertEqual(results[2]['body']['id'], self.user.id)
+
+    def test_same_results_as_requests(self):
+        url = '/group-member/?group=%d&fields=id,user' % self.group.id
+        self.assertEqual(self.batch([{'url': url}])[0]['body'], self.client.get(url).data)
+
+    def test_conditional(self):
+        url = '/group/%d/' % self.group.id
+        etag = self.client.get(url)['ETag']
+        results = self.batch([{'url': url, 'headers': {'If-None-Match': etag}}])
+        self.assertEqual(results[0]['status'], status.HTTP_304_NOT_MODIFIED)
+        self.assertIsNone(results[0]['body'])
+
+    def test_shared_visibility_context(self):
+        urls = ['/group-member/?group=%d' % self.group.id, '/group-field/?group=%d' % self.group.id]
+        # The context of the user is loaded once for all the sub-requests
+        VisibilityContext.invalidate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.batch([{'url': url} for url in urls * 2])
+        self.assertEqual(len([q for q in queries.captured_queries if 'UNION ALL' in q['sql']]), 1)
+
+    def test_writes_are_seen_by_next_sub_requests(self):
+        fields_url = '/group-field/?group=%d' % self.open_group.id
+        results = self.batch([
+            {'url': fields_url},
+            {'method': 'POST', 'url': '/group-member/', 'body': {'user_id': self.user.id, 'group_id': self.open_group.id}},
+            {'url': fields_url},
+        ])
+        self.assertEqual([r['status'] for r in results], [200, 201, 200])
+        self.assertTrue(GroupMember.objects.filter(user=self.user, group=self.open_group).exists())
+        self.assertEqual(len(results[0]['body']['results']), 0)
+        self.assertEqual(len(results[2]['body']['results']), 1)
+
+    def test_rights_changes_are_seen_by_next_sub_requests(self):
+        # A fresh user: the memberships are memoized on the instance
+        (admin, invited) = UserFactory.create_batch(2)
+        mship = GroupMemberFactory(user=admin, group=self.group, is_accepted=True, is_administrator=True)
+        self.client.force_authenticate(user=admin)
+        invite = {'method': 'PUT', 'url': '/group/%d/invite/' % self.group.id, 'body': {'user_id': invited.id}}
+        results = self.batch([
+            invite,
+            {'method': 'PUT', 'url': '/group-member/%d/' % mship.id, 'body': {'user_id': admin.id, 'group_id': self.group.id, 'is_accepted': True, 'is_administrator': True, 'can_invite': True}},
+            invite,
+        ])
+        self.assertEqual([r['status'] for r in results], [403, 200, 200])
+        self.assertTrue(self.group.invited_users.filter(pk=invited.pk).exists())
+
+    def test_only_router_routes(self):
+        results = self.batch([{'url': '/batch/'}, {'url': '/sql-metrics/'}, {'url': '/nothing/'}])
+        self.assertEqual([r['status'] for r in results], [404, 404, 404])
+
+    def test_invalid(self):
+        self.batch({'url': '/group/'}, status.HTTP_400_BAD_REQUEST)
+        self.batch(['/group/'], status.HTTP_400_BAD_REQUEST)
+        self.batch([{'url': 'group/'}], status.HTTP_400_BAD_REQUEST)
+        self.batch([{'method': 'DELETE', 'url': '/group/%d/' % self.group.id}], status.HTTP_400_BAD_REQUEST)
+        self.batch([{'url': '/group/', 'headers': {'Authorization': 'Bearer x'}}], status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH={'MAX_REQUESTS': 2})
+    def test_max_requests(self):
+        self.batch([{'url': '/group/'}] * 2)
+        self.batch([{'url': '/group/'}] * 3, status.HTTP_400_BAD_REQUEST)
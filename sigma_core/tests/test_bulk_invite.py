@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.group import Group
+from sigma_core.models.user import User
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory
+
+
+def counters(group):
+    return Group.objects.filter(pk=group.pk).values_list(*Group.COUNTER_FIELDS).get()
+
+
+class BulkInviteTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 6 users, 2 groups
+        # User #1 can invite in group #1, user #2 is a member of group #1, user #3 is invited to group #1
+        # Users #1, #4 and #5 are accepted in group #2 (the promotion), user #6 is pending in group #2
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(6)
+        self.group = GroupFactory()
+        self.promotion = GroupFactory()
+        GroupMemberFactory(user=self.users[0], group=self.group, is_accepted=True, can_invite=True)
+        GroupMemberFactory(user=self.users[1], group=self.group, is_accepted=True)
+        self.users[2].invited_to_groups.add(self.group)
+        for user in (self.users[0], self.users[3], self.users[4]):
+            GroupMemberFactory(user=user, group=self.promotion, is_accepted=True)
+        GroupMemberFactory(user=self.users[5], group=self.promotion, is_accepted=False)
+        self.url = '/group/%d/bulk_invite/' % self.group.id
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.users[0])
+
+    def invite(self, data, expected_status=status.HTTP_200_OK):
+        response = self.client.put(self.url, data, format='json')
+        self.assertEqual(response.status_code, expected_status)
+        return response.data
+
+    def test_forbidden(self):
+        self.client.force_authenticate(user=self.users[1])
+        self.invite({'user_ids': [self.users[3].id]}, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+        self.invite({'user_ids': [self.users[3].id]}, status.HTTP_401_UNAUTHORIZED)
+
+    def test_group_not_found(self):
+        response = self.client.put('/group/%d/bulk_invite/' % (self.promotion.id + 100), {'user_ids': [self.users[3].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid(self):
+        self.invite({}, status.HTTP_400_BAD_REQUEST)
+        self.invite({'user_ids': [self.users[3].id], 'members_of': self.promotion.id}, status.HTTP_400_BAD_REQUEST)
+        self.invite({'user_ids': 'all'}, status.HTTP_400_BAD_REQUEST)
+        self.invite({'user_ids': ['1']}, status.HTTP_400_BAD_REQUEST)
+        self.invite({'members_of': 'promotion'}, status.HTTP_400_BAD_REQUEST)
+        self.invite({'user_ids': list(range(1, 502))}, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_ids(self):
+        user_ids = [self.users[3].id, self.users[1].id, self.users[2].id, 0, self.users[4].id, self.users[3].id]
+        data = self.invite({'user_ids': user_ids})
+        self.assertEqual(data['results'], [
+            {'user_id': self.users[3].id, 'status': Group.INVITED},
+            {'user_id': self.users[1].id, 'status': Group.ALREADY_MEMBER},
+            {'user_id': self.users[2].id, 'status': Group.ALREADY_INVITED},
+            {'user_id': 0, 'status': 'not_found'},
+            {'user_id': self.users[4].id, 'status': Group.INVITED},
+        ])
+        self.assertEqual(set(User.objects.filter(invited_to_groups=self.group).values_list('id', flat=True)), {u.id for u in self.users[2:5]})
+        self.assertEqual(counters(self.group), (2, 0, 3))
+
+    def test_members_of(self):
+        data = self.invite({'members_of': self.promotion.id})
+        self.assertEqual(data['results'], [
+            {'user_id': self.users[0].id, 'status': Group.ALREADY_MEMBER},
+            {'user_id': self.users[3].id, 'status': Group.INVITED},
+            {'user_id': self.users[4].id, 'status': Group.INVITED},
+        ])
+        self.assertEqual(counters(self.group), (2, 0, 3))
+        # Again: nothing left to invite
+        data = self.invite({'members_of': self.promotion.id})
+        self.assertEqual([r['status'] for r in data['results']], [Group.ALREADY_MEMBER, Group.ALREADY_INVITED, Group.ALREADY_INVITED])
+        self.assertEqual(counters(self.group), (2, 0, 3))
+
+    def test_members_of_hidden_group(self):
+        hidden = GroupFactory(is_private=True)
+        self.invite({'members_of': hidden.id}, status.HTTP_403_FORBIDDEN)
+
+    def test_touches_invited_users(self):
+        before = User.objects.get(pk=self.users[3].pk).last_modified
+        self.invite({'user_ids': [self.users[3].id]})
+        self.assertGreater(User.objects.get(pk=self.users[3].pk).last_modified, before)
+
+    def test_queries_do_not_depend_on_users_count(self):
+        def count_queries(users):
+            with CaptureQueriesContext(connection) as queries:
+                self.invite({'user_ids': [u.id for u in users]})
+            return len(queries)
+        self.assertEqual(count_queries(UserFactory.create_batch(2)), count_queries(UserFactory.create_batch(40)))
@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core import cluster_cache
+from sigma_core.models.group import Group
+from sigma_core.tests.factories import UserFactory, GroupMemberFactory, ClusterFactory
+
+
+class ClusterCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 2 clusters, 2 users
+        # User #1 is member of cluster #1
+        super().setUpTestData()
+        self.clusters = ClusterFactory.create_batch(2)
+        self.users = UserFactory.create_batch(2)
+        self.users[0].clusters.add(self.clusters[0])
+        GroupMemberFactory(user=self.users[0], group=self.clusters[0], is_accepted=True)
+        self.cluster_url = '/cluster/%d/' % self.clusters[0].id
+
+    def setUp(self):
+        # The cache outlives the test transactions
+        cluster_cache.invalidate()
+
+    @contextmanager
+    def assertOnlyCacheQueries(self):
+        # The database cache of the default settings
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        self.assertEqual([q['sql'] for q in queries.captured_queries if 'sigma_cache' not in q['sql']], [])
+
+    def test_list_cached(self):
+        response = self.client.get('/cluster/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertOnlyCacheQueries():
+            cached = self.client.get('/cluster/')
+        self.assertEqual(cached.data, response.data)
+
+    def test_detail_cached(self):
+        response = self.client.get(self.cluster_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertOnlyCacheQueries():
+            cached = self.client.get(self.cluster_url)
+        self.assertEqual(cached.data, response.data)
+
+    def test_keys_ignore_other_parameters(self):
+        response = self.client.get('/cluster/?fields=name,id&page_size=1')
+        self.assertEqual([set(c) for c in response.data['results']], [{'id', 'name'}])
+        self.client.get(self.cluster_url + '?expand=&fields=name')
+        with self.assertOnlyCacheQueries():
+            cached = self.client.get('/cluster/?page_size=1&fields=id,,name&unknown=1')
+            self.client.get(self.cluster_url + '?fields=name&whatever=2')
+        self.assertEqual(cached.data, response.data)
+        # The links to the next pages are canonical too
+        self.assertNotIn('unknown', response.data['next'])
+        self.assertIn('page_size=1', response.data['next'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_not_cached_per_process(self):
+        self.client.get(self.cluster_url)
+        # Changed by another process (no signal)
+        Group.objects.filter(pk=self.clusters[0].pk).update(name="Renamed")
+        self.assertEqual(self.client.get(self.cluster_url).data['name'], "Renamed")
+
+    def test_not_found_not_cached(self):
+        response = self.client.get('/cluster/%d/' % (self.clusters[1].id + 100))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalidated_on_cluster_change(self):
+        self.client.get('/cluster/')
+        self.client.get(self.cluster_url)
+        self.clusters[0].name = "Renamed"
+        self.clusters[0].save()
+        self.assertIn("Renamed", [c['name'] for c in self.client.get('/cluster/').data['results']])
+        self.assertEqual(self.client.get(self.cluster_url).data['name'], "Renamed")
+
+    def test_members_not_leaked(self):
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.get(self.cluster_url)
+        self.assertEqual(response.data['users_ids'], [self.users[0].id])
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.cluster_url)
+        self.assertNotIn('users_ids', response.data)
+
+    def test_invalidated_on_membership_change(self):
+        self.client.force_authenticate(user=self.users[0])
+        self.client.get(self.cluster_url)
+        GroupMemberFactory(user=self.users[1], group=self.clusters[0], is_accepted=True)
+        response = self.client.get(self.cluster_url)
+        self.assertEqual(set(response.data['users_ids']), {self.users[0].id, self.users[1].id})
+        self.assertEqual(response.data['accepted_members_count'], 2)
@@ -0,0 +1,124 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.group_member import GroupMember
+from sigma_core.serializers.group import GroupSerializer
+from sigma_core.serializers.user import MyUserSerializer
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 3 users, 1 group, 1 cluster
+        # Users #1 and #2 are accepted in the group, user #1 and #3 are in the cluster
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(3)
+        self.group = GroupFactory()
+        self.cluster = ClusterFactory()
+        self.mship = GroupMemberFactory(user=self.users[0], group=self.group, is_accepted=True)
+        GroupMemberFactory(user=self.users[1], group=self.group, is_accepted=True)
+        self.users[0].clusters.add(self.cluster)
+        self.users[2].clusters.add(self.cluster)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.users[0])
+
+    def assertNotModified(self, url, response):
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(again.content, b'')
+
+    def assertModified(self, url, response):
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(again['ETag'], response['ETag'])
+        return again
+
+    def test_group(self):
+        url = '/group/%d/' % self.group.id
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        with mock.patch.object(GroupSerializer, 'to_representation', side_effect=AssertionError):
+            self.assertNotModified(url, response)
+
+        again = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # The counters are part of the representation
+        GroupMemberFactory(user=self.users[2], group=self.group, is_accepted=False)
+        response = self.assertModified(url, response)
+        self.group.name = "Renamed"
+        self.group.save()
+        self.assertModified(url, response)
+
+    def test_group_not_visible(self):
+        private = GroupFactory(is_private=True)
+        response = self.client.get('/group/%d/' % private.id, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_group_member(self):
+        url = '/group-member/%d/' % self.mship.id
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotModified(url, response)
+        mship = GroupMember.objects.get(pk=self.mship.pk)
+        mship.can_invite = True
+        mship.save()
+        self.assertModified(url, response)
+
+    def test_cluster_depends_on_membership(self):
+        url = '/cluster/%d/' % self.cluster.id
+        response = self.client.get(url)
+        self.assertNotModified(url, response)
+        # The members are not shown to outsiders: same cluster, other representation
+        self.client.force_authenticate(user=self.users[1])
+        self.assertModified(url, response)
+
+    def test_user_depends_on_visibility(self):
+        url = '/user/%d/' % self.users[1].id
+        response = self.client.get(url)
+        self.assertIn('email', response.data)
+        self.assertNotModified(url, response)
+        self.client.force_authenticate(user=self.users[2])
+        minimal = self.assertModified(url, response)
+        self.assertNotIn('email', minimal.data)
+
+    def test_user_loaded_once(self):
+        url = '/user/%d/' % self.users[1].id
+        response = self.client.get(url)
+        user_table = self.users[1]._meta.db_table
+        for headers in ({}, {'HTTP_IF_NONE_MATCH': response['ETag']}):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, **headers)
+            loads = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and ' FROM "%s"' % user_table in q['sql']]
+            self.assertEqual(len(loads), 1, headers)
+
+    def test_user_clusters(self):
+        url = '/user/%d/' % self.users[1].id
+        response = self.client.get(url)
+        self.users[1].clusters.add(self.cluster)
+        response = self.assertModified(url, response)
+        self.cluster.cluster_users.clear()
+        self.assertModified(url, response)
+
+    def test_me(self):
+        url = '/user/me/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with mock.patch.object(MyUserSerializer, 'to_representation', side_effect=AssertionError):
+            self.assertNotModified(url, response)
+        self.users[0].invited_to_groups.add(GroupFactory())
+        response = self.assertModified(url, response)
+        self.assertEqual(len(response.data['invited_to_groups_ids']), 1)
+
+    def test_unknown(self):
+        response = self.client.get('/user/0/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
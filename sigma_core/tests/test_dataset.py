@@ -0,0 +1,43 @@
+import json
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from sigma_core.models.group import Group, GroupAcknowledgment
+from sigma_core.models.group_closure import GroupClosure
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.group_member_value import GroupMemberValue
+from sigma_core.models.user import User
+from sigma_core.models.user_visibility import UserVisibility
+
+
+class DatasetCommandsTests(TestCase):
+    def test_generate_dataset(self):
+        call_command('generate_dataset', clusters=2, users=30, groups=10, memberships=90, invitations=20, depth=2, batch_size=7, stdout=open('/dev/null', 'w'))
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 12)
+        self.assertEqual(GroupMember.objects.count(), 90)
+        self.assertEqual(GroupAcknowledgment.objects.count(), 10)
+        self.assertTrue(GroupMemberValue.objects.exists())
+        # Denormalized data is up to date
+        self.assertEqual(sum(Group.objects.values_list('accepted_members_count', flat=True)), GroupMember.objects.filter(is_accepted=True).count())
+        self.assertEqual(GroupClosure.objects.count(), len(GroupClosure.objects.get_edges()) + GroupClosure.objects.filter(depth=2).count())
+        self.assertEqual(set(UserVisibility.objects.values_list('viewer_id', 'target_id')), UserVisibility.objects.compute_pairs())
+        call_command('reconcile_group_counters', '--check', stdout=open('/dev/null', 'w'))
+
+    def test_benchmark_routes(self):
+        call_command('generate_dataset', clusters=1, users=5, groups=3, memberships=10, invitations=2, stdout=open('/dev/null', 'w'))
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('benchmark_routes', iterations=2, warmup=0, output=output.name, only='group', stdout=open('/dev/null', 'w'))
+            report = json.load(output)
+        self.assertEqual(report['routes']['group-list']['status'], 200)
+        self.assertIn('p99_ms', report['routes']['group-detail'])
+        self.assertNotIn('user-list', report['routes'])
+
+    def test_benchmark_serializers(self):
+        call_command('generate_dataset', clusters=1, users=20, groups=3, memberships=30, invitations=5, stdout=open('/dev/null', 'w'))
+        with tempfile.TemporaryFile('w+') as output:
+            call_command('benchmark_serializers', rows=10, iterations=1, stdout=output)
+            output.seek(0)
+            self.assertEqual(output.read().count('rows/s'), 8)
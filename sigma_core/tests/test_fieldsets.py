@@ -0,0 +1,92 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.user import User
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+from sigma_files.models import Image
+
+
+class FieldsetsTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 2 users, 1 group, 1 cluster
+        # Users #1 and #2 are in the cluster and accepted in the group, user #1 has a photo, is a member of the cluster
+        # group and is invited to the group
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(2)
+        self.cluster = ClusterFactory()
+        self.group = GroupFactory()
+        for user in self.users:
+            user.clusters.add(self.cluster)
+        self.mship = GroupMemberFactory(user=self.users[0], group=self.group, is_accepted=True)
+        GroupMemberFactory(user=self.users[1], group=self.group, is_accepted=True)
+        GroupMemberFactory(user=self.users[0], group=self.cluster, is_accepted=True)
+        self.users[0].invited_to_groups.add(self.group)
+        photo = Image.objects.create(file=SimpleUploadedFile('photo.png', b'not an image'), owner=self.users[0])
+        User.objects.filter(pk=self.users[0].pk).update(photo=photo)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.users[0])
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return (response.data, ' '.join(q['sql'] for q in queries.captured_queries))
+
+    def test_users_list(self):
+        # Users, photos
+        (data, sql) = self.get('/user/?fields=id,firstname,lastname,photo.variants')
+        self.assertEqual(sql.count('SELECT "sigma_files_image"'), 1)
+        self.assertEqual(list(data['results'][0].keys()), ['id', 'photo', 'lastname', 'firstname'])
+        photos = [u['photo'] for u in data['results'] if u['photo'] is not None]
+        self.assertEqual(photos, [{'variants': {}}])
+        self.assertNotIn('"phone"', sql)
+        self.assertNotIn('"sigma_files_image"."file"', sql)
+        self.assertNotIn('"sigma_core_user_clusters"."user_id"', sql)
+
+    def test_user_retrieve(self):
+        (data, sql) = self.get('/user/%d/?fields=id,email' % self.users[1].id)
+        self.assertEqual(set(data.keys()), {'id', 'email'})
+        self.assertIn('SELECT "sigma_core_user"."id", "sigma_core_user"."email" FROM', sql)
+        self.assertNotIn('"phone"', sql)
+
+    def test_me_expand(self):
+        (data, sql) = self.get('/user/me/?fields=id&expand=invited_to_groups')
+        self.assertEqual(set(data.keys()), {'id', 'invited_to_groups'})
+        self.assertEqual(data['invited_to_groups'][0]['name'], self.group.name)
+
+    def test_groups_list(self):
+        (data, sql) = self.get('/group/?fields=id,name')
+        self.assertEqual({tuple(g.keys()) for g in data['results']}, {('id', 'name')})
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('members_count', sql)
+        (data, sql) = self.get('/group/?fields=id,members_count')
+        self.assertIn({'id': self.group.id, 'members_count': 2}, data['results'])
+        self.assertNotIn('"description"', sql)
+
+    def test_group_retrieve(self):
+        (data, sql) = self.get('/group/%d/?fields=name' % self.group.id)
+        self.assertEqual(data, {'name': self.group.name})
+        self.assertNotIn('"description"', sql)
+
+    def test_group_members_expand(self):
+        (data, sql) = self.get('/group-member/?group=%d&fields=id,user.lastname,group.name&expand=user,group' % self.group.id)
+        self.assertEqual(data['results'][0], {'id': self.mship.id, 'user': {'lastname': self.users[0].lastname}, 'group': {'name': self.group.name}})
+        (data, sql) = self.get('/group-member/%d/?expand=user' % self.mship.id)
+        self.assertEqual(data['user']['id'], self.users[0].id)
+        self.assertNotIn('email', data['user'])
+
+    def test_unknown_names_ignored(self):
+        (data, sql) = self.get('/group/%d/?fields=name,nothing&expand=nothing' % self.group.id)
+        self.assertEqual(data, {'name': self.group.name})
+
+    def test_cluster(self):
+        (data, sql) = self.get('/cluster/?fields=id,name')
+        self.assertEqual(data['results'][0], {'id': self.cluster.id, 'name': self.cluster.name})
+        (data, sql) = self.get('/cluster/%d/?fields=users_ids' % self.cluster.id)
+        self.assertEqual(data, {'users_ids': [self.users[0].id]})
@@ -0,0 +1,77 @@
+from django.test import TestCase
+
+from sigma_core.models.group import GroupAcknowledgment
+from sigma_core.models.group_closure import GroupClosure, compute_closure
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, GroupAcknowledgmentFactory
+
+
+def reload(obj):
+    return obj.__class__.objects.get(pk=obj.pk)
+
+
+class GroupClosureTests(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 5 groups
+        # Group #1 acknowledges group #2, which acknowledges group #3 (both delegate admin)
+        # Group #4 acknowledges group #3 without delegating admin
+        # Group #5 asked group #1 for acknowledgment (not validated yet)
+        # User #1 administrates group #1, user #2 administrates group #4
+        super().setUpTestData()
+        self.groups = GroupFactory.create_batch(5)
+        self.users = UserFactory.create_batch(2)
+        GroupAcknowledgmentFactory(parent_group=self.groups[0], subgroup=self.groups[1], validated=True)
+        GroupAcknowledgmentFactory(parent_group=self.groups[1], subgroup=self.groups[2], validated=True)
+        GroupAcknowledgmentFactory(parent_group=self.groups[3], subgroup=self.groups[2], validated=True, delegate_admin=False)
+        self.pending = GroupAcknowledgmentFactory(parent_group=self.groups[0], subgroup=self.groups[4])
+        GroupMemberFactory(user=self.users[0], group=self.groups[0], is_accepted=True, is_administrator=True)
+        GroupMemberFactory(user=self.users[1], group=self.groups[3], is_accepted=True, is_administrator=True)
+
+    def assertClosureUpToDate(self):
+        rows = {(r.ancestor_id, r.descendant_id): (r.depth, r.delegate_admin) for r in GroupClosure.objects.all()}
+        self.assertEqual(rows, compute_closure(GroupClosure.objects.get_edges()))
+
+    def test_closure(self):
+        self.assertClosureUpToDate()
+        row = GroupClosure.objects.get(ancestor=self.groups[0], descendant=self.groups[2])
+        self.assertEqual((row.depth, row.delegate_admin), (2, True))
+        self.assertFalse(GroupClosure.objects.get(ancestor=self.groups[3], descendant=self.groups[2]).delegate_admin)
+
+    def test_transitive_queries(self):
+        self.assertSetEqual(set(self.groups[0].get_descendants()), {self.groups[1], self.groups[2]})
+        self.assertSetEqual(set(self.groups[2].get_ancestors()), {self.groups[0], self.groups[1], self.groups[3]})
+
+    def test_validate(self):
+        self.pending.validated = True
+        self.pending.save()
+        self.assertIn(self.groups[4], self.groups[0].get_descendants())
+        self.assertClosureUpToDate()
+
+    def test_unvalidate_and_delete(self):
+        ga = GroupAcknowledgment.objects.get(parent_group=self.groups[1], subgroup=self.groups[2])
+        ga.validated = False
+        ga.save()
+        self.assertClosureUpToDate()
+        self.assertSetEqual(set(self.groups[0].get_descendants()), {self.groups[1]})
+        GroupAcknowledgment.objects.get(parent_group=self.groups[0], subgroup=self.groups[1]).delete()
+        self.assertClosureUpToDate()
+        self.assertFalse(GroupClosure.objects.filter(ancestor=self.groups[0]).exists())
+
+    def test_delegate_admin_change(self):
+        ga = GroupAcknowledgment.objects.get(parent_group=self.groups[3], subgroup=self.groups[2])
+        ga.delegate_admin = True
+        ga.save()
+        self.assertClosureUpToDate()
+        ga.delegate_admin = False
+        ga.save()
+        self.assertClosureUpToDate()
+
+    def test_delegated_admin_perm(self):
+        user = reload(self.users[0])
+        self.assertTrue(user.has_group_admin_perm(self.groups[0]))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.has_group_admin_perm(self.groups[2]))
+            self.assertTrue(user.has_group_admin_perm(self.groups[1]))
+        self.assertFalse(user.has_group_admin_perm(self.groups[3]))
+        # Group #4 does not delegate admin to group #3
+        self.assertFalse(reload(self.users[1]).has_group_admin_perm(self.groups[2]))
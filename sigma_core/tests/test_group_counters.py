@@ -0,0 +1,92 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.group import Group
+from sigma_core.models.group_member import GroupMember
+from sigma_core.tests.factories import UserFactory, AdminUserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+
+
+def counters(group):
+    return Group.objects.filter(pk=group.pk).values_list(*Group.COUNTER_FIELDS).get()
+
+
+class GroupCountersTests(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 4 users, 2 groups
+        # Users #1 and #2 are accepted in group #1, user #3 is pending in group #1
+        # User #4 is invited to group #1
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(4)
+        self.groups = GroupFactory.create_batch(2)
+        GroupMemberFactory(user=self.users[0], group=self.groups[0], is_accepted=True)
+        GroupMemberFactory(user=self.users[1], group=self.groups[0], is_accepted=True)
+        GroupMemberFactory(user=self.users[2], group=self.groups[0], is_accepted=False)
+        self.users[3].invited_to_groups.add(self.groups[0])
+
+    def test_counters(self):
+        self.assertEqual(counters(self.groups[0]), (2, 1, 1))
+        self.assertEqual(Group.objects.get(pk=self.groups[0].pk).members_count, 3)
+        self.assertEqual(counters(self.groups[1]), (0, 0, 0))
+
+    def test_acceptance_and_deletion(self):
+        mship = GroupMember.objects.get(user=self.users[2], group=self.groups[0])
+        mship.is_accepted = True
+        mship.save()
+        self.assertEqual(counters(self.groups[0]), (3, 0, 1))
+        mship.delete()
+        self.assertEqual(counters(self.groups[0]), (2, 0, 1))
+
+    def test_invitations(self):
+        self.users[3].invited_to_groups.add(self.groups[0], self.groups[1])
+        self.assertEqual(counters(self.groups[0])[2], 1)
+        self.assertEqual(counters(self.groups[1])[2], 1)
+        self.groups[1].invited_users.add(self.users[0], self.users[1])
+        self.assertEqual(counters(self.groups[1])[2], 3)
+        self.users[3].invited_to_groups.clear()
+        self.assertEqual((counters(self.groups[0])[2], counters(self.groups[1])[2]), (0, 2))
+        self.groups[1].invited_users.remove(self.users[0], self.users[2])
+        self.assertEqual(counters(self.groups[1])[2], 1)
+
+    def test_save_does_not_overwrite_counters(self):
+        group = Group.objects.get(pk=self.groups[0].pk)
+        GroupMemberFactory(user=self.users[3], group=self.groups[0], is_accepted=True)
+        group.name = "Renamed"
+        group.save()
+        self.assertEqual(counters(self.groups[0]), (3, 1, 1))
+
+    def test_members_count_without_queries(self):
+        groups = list(Group.objects.all())
+        with self.assertNumQueries(0):
+            [g.members_count for g in groups]
+
+    def test_reconcile_command(self):
+        Group.objects.filter(pk=self.groups[0].pk).update(accepted_members_count=42)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_group_counters', '--check', stdout=open('/dev/null', 'w'))
+        call_command('reconcile_group_counters', '--batch-size=1', stdout=open('/dev/null', 'w'))
+        self.assertEqual(counters(self.groups[0]), (2, 1, 1))
+        call_command('reconcile_group_counters', '--check', stdout=open('/dev/null', 'w'))
+
+
+class UserCreationCountersTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 1 sigma admin, 1 cluster
+        super().setUpTestData()
+        self.admin = AdminUserFactory()
+        self.cluster = ClusterFactory()
+
+    def test_create_user(self):
+        self.client.force_authenticate(user=self.admin)
+        # Fill the clusters cache
+        self.assertEqual(self.client.get('/cluster/%d/' % self.cluster.id).data['users_ids'], [])
+        data = {'lastname': 'Doe', 'firstname': 'John', 'email': 'john.doe@newschool.edu', 'password': 'password', 'clusters_ids': [self.cluster.id]}
+        response = self.client.post('/user/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(counters(self.cluster), (0, 1, 0))
+        self.assertEqual(self.client.get('/cluster/%d/' % self.cluster.id).data['users_ids'], [response.data['id']])
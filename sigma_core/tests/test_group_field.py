@@ -55,6 +55,9 @@ class GroupFieldTests(APITestCase):
             "validator": Validator.VALIDATOR_TEXT,
             "validator_values": {"regex": "[^@]+@[^@]+\.[^@]+", "message": "Invalid email"}}
 
+    def setUp(self):
+        Validator.objects.clear_cache()
+
     def test_imported_validators(self):
         self.assertTrue(Validator.objects.all().filter(html_name=Validator.VALIDATOR_NONE).exists())
 
@@ -215,6 +218,9 @@ class GroupFieldValidatorTests(APITestCase):
                 validator=self.validator_text,
                 validator_values={"regex": "[a-z0-9]*@[a-z0-9]*.[a-z]{2,3}", "message": "Invalid email"})
 
+    def setUp(self):
+        Validator.objects.clear_cache()
+
     #################### ../{pk}/validate ########################
     def _test_validate_input(self, user, validatorId, input, expectHttp, isInputValid):
         self.client.force_authenticate(user=user)
@@ -246,3 +252,61 @@ class GroupFieldValidatorTests(APITestCase):
 
     def test_validate_route_bad_validator(self):
         self._test_validate_input(self.users[3], -1, "input@lol.fr", status.HTTP_404_NOT_FOUND, True)
+
+
+class GroupFieldBulkValidationTests(APITestCase):
+    fixtures = ['fixtures_prod.json']
+    @classmethod
+    def setUpTestData(self):
+        super(APITestCase, self).setUpTestData()
+
+        self.validate_url = "/group-field/validate_all/"
+        self.group = GroupFactory()
+        self.other_group = GroupFactory()
+
+        # User[0]: Not in Group
+        # User[1]: Requested join, not accepted
+        self.users = [UserFactory(), UserFactory()]
+        GroupMemberFactory(user=self.users[1], group=self.group, is_accepted=False)
+
+        validator_text = Validator.objects.all().get(html_name=Validator.VALIDATOR_TEXT)
+        validator_none = Validator.objects.all().get(html_name=Validator.VALIDATOR_NONE)
+        email = {"regex": "[a-z0-9]*@[a-z0-9]*.[a-z]{2,3}", "message": "Invalid email"}
+        self.fields = [
+            GroupFieldFactory(group=self.group, validator=validator_text, validator_values=email),
+            GroupFieldFactory(group=self.group, validator=validator_text, validator_values=email),
+            GroupFieldFactory(group=self.group, validator=validator_none, validator_values={}),
+        ]
+        self.other_field = GroupFieldFactory(group=self.other_group, validator=validator_none, validator_values={})
+
+    def setUp(self):
+        Validator.objects.clear_cache()
+
+    def _validate(self, user, values, group=None):
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.validate_url, {"group": (group or self.group).id, "values": values}, format='json')
+
+    def test_not_authed(self):
+        self.assertEqual(self._validate(None, {}).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_not_group_member(self):
+        self.assertEqual(self._validate(self.users[0], {self.fields[0].id: "input@lol.fr"}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bad_request(self):
+        self.assertEqual(self._validate(self.users[1], "input@lol.fr").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_validate_all(self):
+        values = {
+            self.fields[0].id: "input@lol.fr",
+            self.fields[1].id: "ThisIsNoAnEmail",
+            self.fields[2].id: "anything",
+            self.other_field.id: "anything",
+        }
+        resp = self._validate(self.users[1], values)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data[self.fields[0].id]['status'], "ok")
+        self.assertEqual(resp.data[self.fields[1].id]['status'], "ko")
+        self.assertEqual(resp.data[self.fields[1].id]['message'], ["Invalid email"])
+        self.assertEqual(resp.data[self.fields[2].id]['status'], "ok")
+        # Fields of other groups are not validated
+        self.assertEqual(resp.data[self.other_field.id]['status'], "ko")
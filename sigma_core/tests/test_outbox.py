@@ -0,0 +1,140 @@
+import asyncore
+import smtpd
+import socket
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.queued_mail import QueuedMail
+from sigma_core.outbox import deliver_queued_mail
+from sigma_core.tests.factories import UserFactory
+from sigma_core.views.user import reset_mail
+
+
+class DebuggingSMTPServer(smtpd.SMTPServer):
+    """
+    Local SMTP stand-in, recording the connections and the messages it receives.
+    """
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), None, decode_data=True)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+
+    def handle_accepted(self, conn, addr):
+        self.connections += 1
+        super().handle_accepted(conn, addr)
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.server = DebuggingSMTPServer()
+        self.thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        asyncore.close_all()
+        self.thread.join(5)
+
+    def smtp_settings(self, port=None):
+        return override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=port or self.server.port)
+
+    def enqueue(self, n):
+        for i in range(n):
+            QueuedMail.objects.enqueue('Subject %d' % i, 'Body %d' % i, 'support@sigma.fr', ['user%d@example.com' % i, 'other@example.com'])
+
+    def test_delivery_through_one_connection(self):
+        self.enqueue(5)
+        with self.smtp_settings():
+            self.assertEqual(deliver_queued_mail(), (5, 0))
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 5)
+        (mailfrom, rcpttos, data) = self.server.messages[2]
+        self.assertEqual((mailfrom, rcpttos), ('support@sigma.fr', ['user2@example.com', 'other@example.com']))
+        self.assertIn('Subject: Subject 2', data)
+        self.assertFalse(QueuedMail.objects.exists())
+
+    def test_batches(self):
+        self.enqueue(5)
+        with self.smtp_settings():
+            self.assertEqual(deliver_queued_mail(2), (2, 0))
+            out = StringIO()
+            call_command('send_queued_mail', '--batch-size', '2', stdout=out)
+        self.assertIn('3 mails delivered, 0 failed.', out.getvalue())
+        self.assertEqual([m[2].split('Subject: ')[1].split('\n')[0] for m in self.server.messages], ['Subject %d' % i for i in range(5)])
+
+    @override_settings(OUTBOX={'RETRY_DELAY': 10, 'MAX_RETRY_DELAY': 15, 'MAX_ATTEMPTS': 3})
+    def test_retry_with_backoff(self):
+        self.enqueue(2)
+        with self.smtp_settings(port=free_port()):
+            self.assertEqual(deliver_queued_mail(), (0, 2))
+            # Not due yet
+            self.assertEqual(deliver_queued_mail(), (0, 0))
+        queued = QueuedMail.objects.order_by('id').first()
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('ConnectionRefusedError', queued.last_error)
+        self.assertAlmostEqual((queued.next_attempt - timezone.now()).total_seconds(), 10, delta=2)
+
+        delays = []
+        with self.smtp_settings(port=free_port()):
+            for attempt in (2, 3):
+                QueuedMail.objects.update(next_attempt=timezone.now())
+                deliver_queued_mail()
+                queued = QueuedMail.objects.get(pk=queued.pk)
+                delays.append(queued.next_attempt and round((queued.next_attempt - timezone.now()).total_seconds()))
+        # Doubled up to the maximum, then given up
+        self.assertEqual(delays, [15, None])
+        self.assertEqual(QueuedMail.objects.filter(next_attempt__isnull=True, body='').count(), 2)
+
+        # Delivered once the server answers
+        QueuedMail.objects.filter(pk=queued.pk).update(next_attempt=timezone.now(), body='Body')
+        with self.smtp_settings():
+            self.assertEqual(deliver_queued_mail(), (1, 0))
+
+    def test_claimed_mails_are_hidden(self):
+        self.enqueue(3)
+        claimed = QueuedMail.objects.claim_due(2, 60)
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual([m.pk for m in QueuedMail.objects.claim_due(10, 60)], [QueuedMail.objects.order_by('id').last().pk])
+        self.assertEqual(QueuedMail.objects.claim_due(10, 60), [])
+        QueuedMail.objects.update(next_attempt=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(QueuedMail.objects.claim_due(10, 60)), 3)
+
+
+class ResetPasswordTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.user = UserFactory()
+
+    def test_reset_password_is_queued(self):
+        old_password = self.user.password
+        response = self.client.post('/user/reset_password/', {'email': self.user.email})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.recipient_list, [self.user.email])
+        self.assertNotEqual(self.user.__class__.objects.get(pk=self.user.pk).password, old_password)
+
+        self.assertEqual(deliver_queued_mail(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(mail.outbox[0].subject, reset_mail['subject'])
@@ -0,0 +1,57 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory
+
+
+class KeysetPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 1 user, 7 public groups with duplicated names, 5 members in the first group
+        super().setUpTestData()
+        self.user = UserFactory()
+        self.groups = [GroupFactory(name='Group %d' % (i // 2)) for i in range(7)]
+        GroupMemberFactory(user=self.user, group=self.groups[0], is_accepted=True)
+        for u in UserFactory.create_batch(4):
+            GroupMemberFactory(user=u, group=self.groups[0], is_accepted=True)
+
+    def walk(self, url):
+        self.client.force_authenticate(user=self.user)
+        ids = []
+        while url is not None:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # No COUNT query: neither for the pagination nor for the members counts
+            self.assertFalse([q for q in queries.captured_queries if q['sql'].upper().startswith('SELECT COUNT(')])
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids += [x['id'] for x in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_groups_pages(self):
+        ids = self.walk('/group/?page_size=2')
+        self.assertEqual(ids, [g.id for g in sorted(self.groups, key=lambda g: (g.name, g.id))])
+
+    def test_users_pages(self):
+        ids = self.walk('/user/?page_size=2')
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/group/?cursor=notacursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_not_matching_the_ordering(self):
+        self.client.force_authenticate(user=self.user)
+        for position in (['Group 1'], ['Group 1', 1, 2], ['Group 1', 'one'], ['Group 1', {'in': [1]}], [['Group 1'], 1], ['Group 1', None]):
+            cursor = urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            response = self.client.get('/group/?cursor=' + cursor)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
@@ -0,0 +1,65 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase
+
+from sigma_core import safe_regex
+
+
+class LinearMatcherTests(SimpleTestCase):
+    PATTERNS = [
+        r"^[a-z]+$", r"\d{3}-\d{2,4}", r"^\s*(?P<header>[^:]+)\s*:(?P<value>.*?)\s*$", r"colou?r", r"^(ab|cd)*e$",
+        r"a{2,}b", r"a{,2}b$", r"x{2}", r"\bcat\b", r"\Bcat", r"^$", r"\Aab\Z", r"[^\w\s]", r"[-a-c]+", r"[a\-z]",
+        r"[]a]", r"a.c", r"\.", r"\x41", r"é", r"\0", r"(a*)*b", r"(?:a|)+$", r"a{1,3}?c", r"{", r"a{b",
+        r"a{}", r"^a{}$", r"a{,}b", r"x{}{2}", r"^[\d.]+$", r"[\b]", r"\$\^", r"\n$", r"^(([a-z])+.)+[A-Z]([a-z])+$",
+    ]
+    INPUTS = [
+        "", "a", "abc", "ABC", "123-45", "123-4567", "color", "colour", "ababcde", "cde", "e", "aab", "ab", "b",
+        "xx", "the cat sat", "concatenate", "a\n", "\n", "ab\n", "a-b", "]", "a.c", "abc.", "A", "été",
+        "\x00", "aaab", "12.5", "\b", "$^", "Header : value  ", "{", "a{b", "a{}", "x{}}", "٣٤", "aaaaaaaaaaaaaaaaaaaaaaaaa!",
+    ]
+
+    def test_same_results_as_re(self):
+        for pattern in self.PATTERNS:
+            matcher = safe_regex.LinearMatcher(pattern)
+            for text in self.INPUTS:
+                self.assertEqual(matcher.search(text), re.search(pattern, text) is not None, (pattern, text))
+
+    def test_unsupported(self):
+        for pattern in [r"(a)\1", r".*[.](?!bat$|exe$).*$", r"(?<=a)b", r"(?i)abc", r"(?P=name)", r"a{1000}{1000}"]:
+            self.assertIsNone(safe_regex.get_matcher(pattern), pattern)
+
+    def test_evil_regex_is_linear(self):
+        # Would backtrack for ages with re
+        matcher = safe_regex.get_matcher(r"^(([a-z])+.)+[A-Z]([a-z])+$")
+        self.assertIsNotNone(matcher)
+        self.assertFalse(matcher.search('a' * 5000 + '!'))
+
+
+class RegexWorkerPoolTests(SimpleTestCase):
+    def test_fallback(self):
+        self.assertTrue(safe_regex.search(r".*[.](?!bat$|exe$).*$", 'file.png'))
+        self.assertFalse(safe_regex.search(r".*[.](?!bat$|exe$).*$", 'file.exe'))
+
+    def test_timeout(self):
+        pool = safe_regex.RegexWorkerPool(size=1, timeout=0.05)
+        with self.assertRaises(safe_regex.RegexTimeout):
+            pool.search(r"(?=(a+)+b)", 'a' * 40)
+        # The killed worker has been replaced
+        self.assertTrue(pool.search(r"(?=a)", 'a'))
+
+    def test_saturated_by_timeouts(self):
+        pool = safe_regex.RegexWorkerPool(size=2, timeout=0.05)
+
+        def search(i):
+            try:
+                return pool.search(r"(?=(a+)+b)", 'a' * 40)
+            except safe_regex.RegexTimeout:
+                return 'timeout'
+
+        # The threads waiting for a worker get the slots freed by the killed ones
+        with ThreadPoolExecutor(6) as executor:
+            results = list(executor.map(search, range(12), timeout=60))
+        self.assertEqual(results, ['timeout'] * 12)
+        self.assertEqual(pool.started, 0)
+        self.assertTrue(pool.search(r"(?=a)", 'a'))
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase
+
+from sigma_core.models.cluster import Cluster
+from sigma_core.models.group import Group
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+from sigma_core.models.user_visibility import UserVisibility
+from sigma_core.models.validator import Validator
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+
+
+class SnapshotTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'snapshot')
+        self.users = UserFactory.create_batch(3)
+        self.group = GroupFactory()
+        self.cluster = ClusterFactory()
+        self.cluster.cluster_users.add(self.users[0])
+        GroupMemberFactory(user=self.users[0], group=self.group, is_accepted=True)
+        GroupMemberFactory(user=self.users[1], group=self.group, is_accepted=True)
+        self.users[2].invited_to_groups.add(self.group)
+        Validator.objects.create(html_name=Validator.VALIDATOR_TEXT, display_name='Text', values={'regex': 'Regex'})
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def state(self):
+        return {
+            'users': list(User.objects.order_by('id').values_list('id', 'email', 'last_modified', 'join_date')),
+            'groups': list(Group.objects.order_by('id').values()),
+            'clusters': list(Cluster.objects.order_by('id').values_list('id', 'design')),
+            'memberships': list(GroupMember.objects.order_by('id').values()),
+            'visibility': list(UserVisibility.objects.order_by('id').values_list('viewer_id', 'target_id')),
+            'invitations': list(User.invited_to_groups.through.objects.values_list('user_id', 'group_id')),
+            'validators': list(Validator.objects.values_list('html_name', 'values')),
+        }
+
+    def test_round_trip(self):
+        expected = self.state()
+        call_command('dump_snapshot', self.directory, chunk_size=2, stdout=open('/dev/null', 'w'))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        Validator.objects.all().delete()
+        # Django 1.9 cannot introspect the foreign keys of tables rebuilt by SQLite >= 3.26 migrations
+        call_command('load_snapshot', self.directory, '--no-check', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.state(), expected)
+        # Sequences have been reset past the loaded rows
+        self.assertGreater(UserFactory().id, max(u.id for u in self.users))
+
+    def test_existing_snapshot(self):
+        call_command('dump_snapshot', self.directory, 'sigma_core.validator', stdout=open('/dev/null', 'w'))
+        with self.assertRaises(CommandError):
+            call_command('dump_snapshot', self.directory, stdout=open('/dev/null', 'w'))
@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.user import User
+from sigma.sql_metrics import metrics, fingerprint, Histogram
+from sigma_core.tests.factories import UserFactory, AdminUserFactory
+
+
+@override_settings(SQL_METRICS={'SAMPLE_RATE': 1, 'LOG_INTERVAL': 0})
+class SQLMetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(APITestCase, self).setUpTestData()
+        self.user = UserFactory()
+        self.admin = AdminUserFactory()
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 2,3) AND c2 = 4.5"), "SELECT * FROM t WHERE a = ? AND b IN (...) AND c2 = ?")
+
+    def test_histogram(self):
+        h = Histogram((1, 10, 100))
+        for v in (0, 1, 5, 50, 500):
+            h.add(v)
+        self.assertEqual(h.counts, [2, 1, 1, 1])
+        self.assertEqual(h.percentile(0.5), 10)
+        self.assertEqual(h.percentile(1), 500)
+
+    def test_record_per_action(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/user/%d/' % self.user.id)
+        self.client.get('/user/%d/' % self.user.id)
+        self.client.get('/group/')
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['UserViewSet.retrieve']['requests'], 2)
+        self.assertEqual(snapshot['GroupViewSet.list']['requests'], 1)
+        self.assertGreater(snapshot['GroupViewSet.list']['queries']['max'], 0)
+        self.assertIsNotNone(snapshot['GroupViewSet.list']['slowest']['sql'])
+
+    def test_does_not_disturb_query_logging(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/group/')
+            requests_queries = len(queries)
+            User.objects.filter(pk=self.user.pk).exists()
+        self.assertGreater(requests_queries, 0)
+        self.assertEqual(len(queries), requests_queries + 1)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/sql-metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get('/sql-metrics/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete('/sql-metrics/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(metrics.snapshot()), ['SQLMetricsView.delete'])
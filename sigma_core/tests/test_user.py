@@ -1,6 +1,7 @@
 import json
 
 from django.core import mail
+from django.test import override_settings
 
 from rest_framework import status
 from rest_framework.test import APITestCase, force_authenticate
@@ -10,6 +11,7 @@ from sigma_core.serializers.user import MinimalUserSerializer, UserSerializer, M
 from sigma_core.models.user import User
 from sigma_core.models.group import Group
 from sigma_core.models.group_member import GroupMember
+from sigma_files.tests import run_on_commit_callbacks
 
 
 def reload(obj):
@@ -446,9 +448,7 @@ class UserTests(APITestCase):
         # Client successfully resets his password
         response = self.client.post(self.user_url + 'reset_password/', {'email': self.users[0].email})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(mail.outbox), 1)
-        from sigma_core.views.user import reset_mail
-        self.assertEqual(mail.outbox[0].subject, reset_mail['subject'])
+        # The mail is checked in test_outbox.ResetPasswordTests
 
 #### "Add photo" requests
     def test_addphoto_ok(self):
@@ -493,3 +493,70 @@ class UserTests(APITestCase):
     #     response = self.client.delete(self.user_url + "%d/" % self.users[3].id)
     #     self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
     #     # Guarantee independance of tests
+
+
+class UserPermissionHelpersTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 1 user, 5 groups
+        # User is administrator of group #1, member of groups #2 to #4 and not a member of group #5
+        super(UserPermissionHelpersTests, self).setUpTestData()
+        self.user = UserFactory()
+        self.groups = GroupFactory.create_batch(5)
+        GroupMemberFactory(user=self.user, group=self.groups[0], is_accepted=True, is_administrator=True, can_invite=True)
+        for g in self.groups[1:4]:
+            GroupMemberFactory(user=self.user, group=g, is_accepted=True)
+
+    def check_rights(self, user, groups):
+        for g in groups:
+            user.can_invite(g)
+            user.can_modify_group_infos(g)
+            user.has_group_admin_perm(g)
+            user.is_group_member(g)
+            user.can_accept_join_requests(g)
+
+    def test_memberships_loaded_once(self):
+        user = reload(self.user)
+        with self.assertNumQueries(1):
+            self.check_rights(user, self.groups[:1])
+        # Admin rights delegated by group #1 to its subgroups are loaded once
+        with self.assertNumQueries(1):
+            self.check_rights(user, self.groups)
+        with self.assertNumQueries(0):
+            self.check_rights(user, self.groups)
+
+    def test_rights(self):
+        user = reload(self.user)
+        self.assertTrue(user.has_group_admin_perm(self.groups[0]))
+        self.assertTrue(user.can_invite(self.groups[0]))
+        self.assertFalse(user.has_group_admin_perm(self.groups[1]))
+        self.assertTrue(user.is_group_member(self.groups[1]))
+        self.assertFalse(user.is_group_member(self.groups[4]))
+        self.assertIsNone(user.get_group_membership(self.groups[4]))
+
+    def test_clear_memberships_cache(self):
+        user = reload(self.user)
+        self.assertFalse(user.is_group_member(self.groups[4]))
+        GroupMemberFactory(user=user, group=self.groups[4], is_accepted=True)
+        self.assertFalse(user.is_group_member(self.groups[4]))
+        user.clear_memberships_cache()
+        self.assertTrue(user.is_group_member(self.groups[4]))
+
+
+@override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16}})
+class UserPhotoTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(UserPhotoTests, self).setUpTestData()
+        self.user = UserFactory()
+
+    def test_addphoto_renders_variants(self):
+        self.client.force_authenticate(user=self.user)
+        with open("sigma_files/test_img.png", "rb") as img:
+            response = self.client.post("/user/addphoto/", {'file': img}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_on_commit_callbacks()
+        photo = User.objects.get(pk=self.user.id).photo
+        self.addCleanup(photo.delete)
+        self.assertEqual(photo.owner_id, self.user.id)
+        self.assertEqual(photo.variants_status, 'ready')
@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from sigma_core.models.group import Group
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+from sigma_core.tests.factories import UserFactory, AdminUserFactory, ClusterFactory, GroupMemberFactory
+from sigma_core.user_import import UserImport
+
+
+CSV = '\n'.join([
+    'email,lastname,firstname,password,unknown',
+    'john.doe@example.com,Doe,John,password1,x',
+    'not an email,Doe,Jane,,',
+    'jane.doe@example.com,,Jane,,',
+    'john.doe@example.com,Doe,Johnny,,',
+    '%s,Taken,Email,,',
+    'ann.doe@EXAMPLE.com,Doe,Ann,short,',
+    'bob.doe@example.com,Doe,Bob,,',
+])
+
+
+def counters(group):
+    return Group.objects.filter(pk=group.pk).values_list(*Group.COUNTER_FIELDS).get()
+
+
+class UserImportTests(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 1 user, 2 clusters
+        super().setUpTestData()
+        self.user = UserFactory()
+        self.clusters = [ClusterFactory(), ClusterFactory()]
+
+    def run_import(self, content, file_format='csv', **kwargs):
+        users_import = UserImport([c.id for c in self.clusters], **kwargs)
+        users_import.run(BytesIO(content.encode()), file_format)
+        return users_import
+
+    def test_csv(self):
+        users_import = self.run_import(CSV % self.user.email, batch_size=3, processes=0)
+        self.assertEqual(users_import.created, 2)
+        self.assertEqual([(e['line'], sorted(e['errors'])) for e in users_import.errors], [
+            (3, ['email']), (4, ['lastname']), (5, ['email']), (6, ['email']), (7, ['password'])])
+
+        john = User.objects.get(email='john.doe@example.com')
+        self.assertEqual((john.lastname, john.firstname), ('Doe', 'John'))
+        self.assertTrue(john.check_password('password1'))
+        self.assertFalse(User.objects.get(email='bob.doe@example.com').has_usable_password())
+        self.assertEqual(set(john.clusters.values_list('id', flat=True)), {c.id for c in self.clusters})
+        self.assertEqual(GroupMember.objects.filter(user=john, is_accepted=False).count(), 2)
+        self.assertEqual(counters(self.clusters[0]), (0, 2, 0))
+
+    def test_jsonl(self):
+        content = '\n'.join([
+            json.dumps({'email': 'john.doe@example.com', 'lastname': 'Doe', 'firstname': 'John', 'phone': 612345678}),
+            '',
+            '{"email": ',
+            '["not", "an", "object"]',
+        ])
+        users_import = self.run_import(content, 'jsonl', processes=0)
+        self.assertEqual(users_import.created, 1)
+        self.assertEqual([e['line'] for e in users_import.errors], [3, 4])
+        self.assertEqual(User.objects.get(email='john.doe@example.com').phone, '612345678')
+
+    def test_hashing_processes(self):
+        rows = ['email,lastname,firstname,password'] + ['user%d@example.com,Doe,User %d,password%d' % (i, i, i) for i in range(5)]
+        users_import = self.run_import('\n'.join(rows), batch_size=2, processes=2)
+        self.assertEqual(users_import.created, 5)
+        self.assertTrue(User.objects.get(email='user3@example.com').check_password('password3'))
+
+    def test_insert_failures(self):
+        # Bob's email is taken by a concurrent import after the validation, Ann's row fails for another reason
+        insert = UserImport.insert
+        def concurrent_insert(users_import, users):
+            if not User.objects.filter(email='bob.doe@example.com').exists():
+                UserFactory(email='bob.doe@example.com')
+            if any(user.email == 'ann.doe@example.com' for user in users):
+                raise IntegrityError('Simulated failure')
+            return insert(users_import, users)
+        content = '\n'.join(['email,lastname,firstname'] + ['%s.doe@example.com,Doe,%s' % (name.lower(), name) for name in ('John', 'Ann', 'Bob', 'Jane')])
+        with mock.patch.object(UserImport, 'insert', autospec=True, side_effect=concurrent_insert):
+            users_import = self.run_import(content, processes=0)
+        self.assertEqual(users_import.created, 2)
+        self.assertEqual([(e['line'], list(e['errors'])) for e in users_import.errors], [(3, ['non_field_errors']), (4, ['email'])])
+        self.assertEqual(set(User.objects.filter(email__endswith='.doe@example.com').values_list('email', flat=True)),
+            {'john.doe@example.com', 'jane.doe@example.com', 'bob.doe@example.com'})
+        self.assertEqual(counters(self.clusters[0]), (0, 2, 0))
+
+    def test_unreadable(self):
+        users_import = UserImport([self.clusters[0].id], processes=0)
+        users_import.run(BytesIO(b'email,lastname,firstname\n\xff\xfe,x,y\n'), 'csv')
+        self.assertEqual(users_import.created, 0)
+        self.assertEqual(users_import.errors[0]['line'], None)
+
+    def test_command(self):
+        (fd, path) = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write(CSV % self.user.email)
+        try:
+            out = StringIO()
+            call_command('import_users', path, '--clusters', str(self.clusters[0].id), '--processes', '0', stdout=out)
+        finally:
+            os.remove(path)
+        self.assertIn('%s:4: lastname: ' % path, out.getvalue())
+        self.assertIn('2 users created, 5 rows rejected.', out.getvalue())
+
+
+class UserImportViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 3 users, 2 clusters
+        # User #1 is a sigma admin, user #2 is an administrator of cluster #1
+        super().setUpTestData()
+        self.admin = AdminUserFactory()
+        self.cluster_admin = UserFactory()
+        self.user = UserFactory()
+        self.clusters = [ClusterFactory(), ClusterFactory()]
+        GroupMemberFactory(user=self.cluster_admin, group=self.clusters[0], is_accepted=True, is_administrator=True)
+        self.url = '/user/bulk_import/'
+
+    def upload(self, clusters, content=None, name='users.csv', **data):
+        content = content if content is not None else CSV % self.user.email
+        data.update(file=SimpleUploadedFile(name, content.encode()), clusters=[c.id for c in clusters])
+        return self.client.post(self.url, data, format='multipart')
+
+    def test_unauthed(self):
+        self.assertEqual(self.upload(self.clusters[:1]).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_forbidden(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.upload(self.clusters[:1]).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.cluster_admin)
+        self.assertEqual(self.upload(self.clusters).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.upload([]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.upload(self.clusters, name='users.xls').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'clusters': [self.clusters[0].id]}, format='multipart').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import(self):
+        self.client.force_authenticate(user=self.cluster_admin)
+        response = self.upload(self.clusters[:1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(len(response.data['errors']), 5)
+        self.assertTrue(User.objects.filter(email='bob.doe@example.com', clusters=self.clusters[0]).exists())
+
+    def test_max_rows(self):
+        self.client.force_authenticate(user=self.admin)
+        with self.settings(USER_IMPORT={'API_MAX_ROWS': 6}):
+            response = self.upload(self.clusters[:1])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(User.objects.filter(email='bob.doe@example.com').exists())
+        with self.settings(USER_IMPORT={'API_MAX_ROWS': 7}):
+            response = self.upload(self.clusters[:1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+
+    def test_hashed_in_process(self):
+        self.client.force_authenticate(user=self.admin)
+        with mock.patch('sigma_core.user_import.ProcessPoolExecutor', side_effect=AssertionError('Forked')):
+            response = self.upload(self.clusters[:1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get(email='john.doe@example.com').check_password('password1'))
+
+    def test_file_format(self):
+        self.client.force_authenticate(user=self.admin)
+        content = json.dumps({'email': 'john.doe@example.com', 'lastname': 'Doe', 'firstname': 'John'})
+        response = self.upload(self.clusters, content=content, name='users.txt', file_format='jsonl')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from sigma_core.models.user_visibility import UserVisibility
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+
+
+class UserVisibilityTests(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 3 users, 1 group, 1 cluster
+        # User #1 is accepted in the group, user #2 is pending in the group
+        # Users #1 and #3 are accepted in the cluster
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(3)
+        self.group = GroupFactory()
+        self.cluster = ClusterFactory()
+        self.mships = [
+            GroupMemberFactory(user=self.users[0], group=self.group, is_accepted=True),
+            GroupMemberFactory(user=self.users[1], group=self.group, is_accepted=False),
+            GroupMemberFactory(user=self.users[0], group=self.cluster.group_ptr, is_accepted=True),
+            GroupMemberFactory(user=self.users[2], group=self.cluster.group_ptr, is_accepted=True),
+        ]
+
+    def pairs(self):
+        return set(UserVisibility.objects.values_list('viewer_id', 'target_id'))
+
+    def test_membership_creation(self):
+        # Clusters are not materialized
+        self.assertEqual(self.pairs(), {(self.users[0].id, self.users[1].id)})
+
+    def test_membership_acceptance(self):
+        self.mships[1].is_accepted = True
+        self.mships[1].save()
+        self.assertEqual(self.pairs(), {(self.users[0].id, self.users[1].id), (self.users[1].id, self.users[0].id)})
+
+    def test_membership_deletion(self):
+        self.mships[0].delete()
+        self.assertEqual(self.pairs(), set())
+
+    def test_concurrent_rebuild(self):
+        # The pair is inserted by the rebuild for the other user, between the read and the insert of this one
+        UserVisibility.objects.all().delete()
+        bulk_create = UserVisibility.objects.bulk_create
+        calls = []
+        def concurrent_bulk_create(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 1:
+                bulk_create([UserVisibility(viewer=self.users[0], target=self.users[1])])
+            return bulk_create(objs, *args, **kwargs)
+        with mock.patch.object(UserVisibility.objects, 'bulk_create', side_effect=concurrent_bulk_create) as patched:
+            UserVisibility.objects.rebuild_for_user(self.users[0].id)
+        self.assertEqual(patched.call_count, 2)
+        self.assertEqual(self.pairs(), {(self.users[0].id, self.users[1].id)})
+
+    def test_rebuild_command(self):
+        UserVisibility.objects.all().delete()
+        UserVisibility.objects.create(viewer=self.users[2], target=self.users[0])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_user_visibility', '--check', stdout=open('/dev/null', 'w'))
+        call_command('rebuild_user_visibility', '--batch-size=1', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.pairs(), {(self.users[0].id, self.users[1].id)})
+        call_command('rebuild_user_visibility', '--check', stdout=open('/dev/null', 'w'))
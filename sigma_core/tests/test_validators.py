@@ -1,9 +1,14 @@
+import time
+from unittest import mock
+
 from django.test import TestCase
 
 from django.core.exceptions import ValidationError
 
 from sigma_core.models.validator import get_validator_by_name, are_validator_fields_valid, is_validator_input_valid
-from sigma_core.models.validator import Validator
+from sigma_core.models.validator import Validator, CompiledRulesCache, compiled_rules
+from sigma_core.models.group_field import GroupField
+from sigma_core.tests.factories import GroupFactory
 
 class ValidatorTests(TestCase):
     @classmethod
@@ -35,3 +40,50 @@ class TextValidatorTests(TestCase):
         value = 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa!'
         self.assertTrue(are_validator_fields_valid(Validator.VALIDATOR_TEXT, fields))
         self.assertFalse(is_validator_input_valid(Validator.VALIDATOR_TEXT, fields, value))
+
+class CompiledRulesCacheTests(TestCase):
+    def setUp(self):
+        # The cached validator rows may come from the rolled back transactions of the previous tests
+        Validator.objects.clear_cache()
+
+    def test_rule_compiled_once(self):
+        fields = {'regex': "^[a-z]+$", 'message': 'Err msg'}
+        rule = compiled_rules.get(Validator.VALIDATOR_TEXT, fields)
+        self.assertIs(compiled_rules.get(Validator.VALIDATOR_TEXT, {'message': 'Err msg', 'regex': "^[a-z]+$"}), rule)
+        self.assertTrue(is_validator_input_valid(Validator.VALIDATOR_TEXT, fields, 'abc'))
+        self.assertFalse(is_validator_input_valid(Validator.VALIDATOR_TEXT, fields, 'ABC'))
+
+    def test_lru_eviction(self):
+        cache = CompiledRulesCache(max_size=2)
+        rules = [cache.get(Validator.VALIDATOR_TEXT, {'regex': r, 'message': ''}) for r in ('a', 'b')]
+        self.assertIs(cache.get(Validator.VALIDATOR_TEXT, {'regex': 'a', 'message': ''}), rules[0])
+        cache.get(Validator.VALIDATOR_TEXT, {'regex': 'c', 'message': ''})
+        self.assertIs(cache.get(Validator.VALIDATOR_TEXT, {'regex': 'a', 'message': ''}), rules[0])
+        self.assertIsNot(cache.get(Validator.VALIDATOR_TEXT, {'regex': 'b', 'message': ''}), rules[1])
+
+    def test_evicted_on_group_field_edit(self):
+        Validator.objects.create(html_name=Validator.VALIDATOR_TEXT, display_name='Text', values={})
+        fields = {'regex': "^[0-9]+$", 'message': 'Err msg'}
+        gf = GroupField.objects.create(group=GroupFactory(), name='Phone', validator_id=Validator.VALIDATOR_TEXT, validator_values=fields)
+        gf.validate_input('0123')
+        key = compiled_rules.key(Validator.VALIDATOR_TEXT, fields)
+        self.assertIn(key, compiled_rules.rules)
+        gf.validator_values = {'regex': "^[0-9 ]+$", 'message': 'Err msg'}
+        gf.save()
+        self.assertNotIn(key, compiled_rules.rules)
+
+    def test_validator_rows_cached(self):
+        Validator.objects.create(html_name=Validator.VALIDATOR_TEXT, display_name='Text', values={})
+        Validator.objects.create(html_name=Validator.VALIDATOR_NONE, display_name='None', values={})
+        Validator.objects.get_cached(Validator.VALIDATOR_TEXT)
+        with self.assertNumQueries(0):
+            self.assertEqual(Validator.objects.get_cached(Validator.VALIDATOR_NONE).html_name, Validator.VALIDATOR_NONE)
+
+    def test_validator_rows_expire(self):
+        Validator.objects.create(html_name=Validator.VALIDATOR_NONE, display_name='None', values={})
+        Validator.objects.get_cached(Validator.VALIDATOR_NONE)
+        # Changed by another process
+        Validator.objects.filter(pk=Validator.VALIDATOR_NONE).update(display_name='Nothing')
+        self.assertEqual(Validator.objects.get_cached(Validator.VALIDATOR_NONE).display_name, 'None')
+        with mock.patch('sigma_core.models.validator.time.monotonic', return_value=time.monotonic() + Validator.objects.cache_timeout + 1):
+            self.assertEqual(Validator.objects.get_cached(Validator.VALIDATOR_NONE).display_name, 'Nothing')
@@ -0,0 +1,94 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from sigma.values_serializer import ValuesSerializer
+from sigma_core.models.cluster import Cluster
+from sigma_core.models.group import Group
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+from sigma_core.serializers.cluster import BasicClusterSerializer, ClusterSerializer
+from sigma_core.serializers.group import GroupSerializer
+from sigma_core.serializers.group_member import GroupMemberSerializer
+from sigma_core.serializers.user import UserSerializer, MinimalUserSerializer, MyUserSerializer
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+from sigma_files.models import Image
+
+
+class GroupWithMembershipsSerializer(GroupSerializer):
+    class Meta(GroupSerializer.Meta):
+        pass
+
+    memberships_ids = serializers.PrimaryKeyRelatedField(read_only=True, many=True, source='memberships')
+
+
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 4 users, 3 groups (1 cluster), 1 photo
+        # Users #1 and #2 are in the cluster, user #1 has a photo with variants
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(4)
+        self.cluster = ClusterFactory()
+        self.groups = GroupFactory.create_batch(2)
+        for user in self.users[:2]:
+            user.clusters.add(self.cluster)
+        GroupMemberFactory(user=self.users[0], group=self.groups[0], is_accepted=True, join_date='2016-09-01')
+        GroupMemberFactory(user=self.users[1], group=self.groups[0], is_accepted=False)
+        GroupMemberFactory(user=self.users[2], group=self.groups[1], is_accepted=True, can_invite=True)
+        self.users[3].invited_to_groups.add(*self.groups)
+
+        photo = Image.objects.create(file=SimpleUploadedFile('photo.png', b'not an image'), owner=self.users[0])
+        Image.objects.filter(pk=photo.pk).update(variants={'thumb': {'width': 1, 'height': 1, 'files': {'jpeg': 'blobs/00/thumb.jpg'}}})
+        User.objects.filter(pk=self.users[0].pk).update(photo=photo, phone='0123456789')
+
+    def setUp(self):
+        self.context = {'request': Request(APIRequestFactory().get('/user/'))}
+
+    def assertSameJSON(self, serializer_class, queryset):
+        queryset = queryset.order_by('pk')
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=self.context).data)
+        serializer = ValuesSerializer(serializer_class, context=self.context)
+        self.assertEqual(JSONRenderer().render(serializer.serialize(serializer.values(queryset))), expected)
+        return expected
+
+    def test_users(self):
+        data = self.assertSameJSON(UserSerializer, User.objects.all())
+        self.assertIn(b'http://testserver/media/blobs/00/thumb.jpg', data)
+        self.assertSameJSON(MinimalUserSerializer, User.objects.all())
+        data = self.assertSameJSON(MyUserSerializer, User.objects.all())
+        self.assertIn(('"invited_to_groups_ids":[%d,%d]' % tuple(g.id for g in self.groups)).encode(), data)
+
+    def test_groups(self):
+        self.assertSameJSON(GroupSerializer, Group.objects.all())
+
+    def test_clusters(self):
+        self.assertSameJSON(BasicClusterSerializer, Cluster.objects.all())
+
+    def test_reverse_many_to_many(self):
+        for user in self.users[:2]:
+            GroupMemberFactory(user=user, group=self.cluster, is_accepted=True)
+        data = self.assertSameJSON(ClusterSerializer, Cluster.objects.all())
+        self.assertIn(('"users_ids":[%d,%d]' % (self.users[0].id, self.users[1].id)).encode(), data)
+
+    def test_other_many_relations(self):
+        # Reverse foreign key: serialized from the instances
+        data = self.assertSameJSON(GroupWithMembershipsSerializer, Group.objects.filter(pk__in=[g.pk for g in self.groups]))
+        self.assertIn(b'"memberships_ids":[', data)
+
+    def test_group_members(self):
+        self.assertSameJSON(GroupMemberSerializer, GroupMember.objects.all())
+
+    def test_queries(self):
+        serializer = ValuesSerializer(UserSerializer, context=self.context)
+        # Users, clusters, photos
+        with self.assertNumQueries(3):
+            serializer.serialize(serializer.values(User.objects.all()))
+
+    def test_empty(self):
+        serializer = ValuesSerializer(GroupSerializer)
+        self.assertEqual(serializer.serialize(serializer.values(Group.objects.none())), [])
@@ -0,0 +1,54 @@
+from django.test import TestCase
+
+from sigma_core.tests.factories import UserFactory, GroupFactory, GroupMemberFactory, ClusterFactory
+from sigma_core.visibility import VisibilityContext
+
+
+def reload(obj):
+    return obj.__class__.objects.get(pk=obj.pk)
+
+
+class VisibilityContextTests(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        # Summary: 3 users, 3 groups, 1 cluster
+        # User #1 is accepted in group #1, pending in group #2, invited to group #3 and in the cluster
+        # User #2 is pending in group #1
+        # User #3 is in the cluster
+        super().setUpTestData()
+        self.users = UserFactory.create_batch(3)
+        self.groups = GroupFactory.create_batch(3)
+        self.cluster = ClusterFactory()
+
+        GroupMemberFactory(user=self.users[0], group=self.groups[0], is_accepted=True)
+        GroupMemberFactory(user=self.users[0], group=self.groups[1], is_accepted=False)
+        GroupMemberFactory(user=self.users[1], group=self.groups[0], is_accepted=False)
+        self.users[0].invited_to_groups.add(self.groups[2])
+        self.cluster.cluster_users.add(self.users[0], self.users[2])
+
+    def test_single_query(self):
+        user = reload(self.users[0])
+        with self.assertNumQueries(1):
+            context = VisibilityContext.for_user(user)
+            VisibilityContext.for_user(user)
+        self.assertEqual(context.accepted_groups_ids, {self.groups[0].id})
+        self.assertEqual(context.pending_groups_ids, {self.groups[1].id})
+        self.assertEqual(context.invited_groups_ids, {self.groups[2].id})
+        self.assertEqual(context.clusters_ids, {self.cluster.id})
+        self.assertEqual(context.groups_ids, {self.groups[0].id, self.groups[1].id})
+
+    def test_invalidate(self):
+        user = reload(self.users[1])
+        context = VisibilityContext.for_user(user)
+        GroupMemberFactory(user=user, group=self.groups[2], is_accepted=True)
+        self.assertIs(VisibilityContext.for_user(user), context)
+        VisibilityContext.invalidate(user)
+        self.assertIn(self.groups[2].id, VisibilityContext.for_user(user).accepted_groups_ids)
+
+    def test_can_see_details(self):
+        users = [reload(u) for u in self.users]
+        context = VisibilityContext.for_user(users[0])
+        self.assertTrue(context.can_see_details(users[0]))
+        self.assertTrue(context.can_see_details(users[1])) # Pending member of one of my groups
+        self.assertTrue(context.can_see_details(users[2])) # Common cluster
+        self.assertFalse(VisibilityContext.for_user(users[1]).can_see_details(users[0]))
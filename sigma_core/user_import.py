@@ -0,0 +1,233 @@
+"""
+Bulk import of users into clusters, for the accounts created at the start of the school year.
+
+The file (CSV with a header line, or JSON lines) is read as a stream and handled in batches: each batch is validated
+with one query (emails already taken), its passwords are hashed on a pool of processes (the import_users command) or
+in-process (the API, which must not fork its server), and its users, their clusters and their cluster memberships (the
+rows UserViewSet.create adds) are inserted with one bulk statement each, in a transaction. Memory use only depends on
+the batch size, and on the number of rejected rows. Columns:
+
+    email, lastname, firstname     required
+    phone                          optional
+    password                       optional: users without one get an unusable password, until they reset it
+
+Settings:
+
+    USER_IMPORT = {
+        'BATCH_SIZE': 500,             # Rows per transaction (keep the email IN (...) lists below the backend limits)
+        'HASHING_PROCESSES': None,     # Processes hashing the passwords: None for one per CPU, 0 to hash in-process
+        'API_MAX_ROWS': 2000,          # Larger files are refused by the API (its hashing holds a server process)
+    }
+"""
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from sigma_core import cluster_cache
+from sigma_core.models.group import Group
+from sigma_core.models.group_member import GroupMember
+from sigma_core.models.user import User
+from sigma_core.signals import members_counter
+
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'HASHING_PROCESSES': None,
+    'API_MAX_ROWS': 2000,
+}
+
+def get_setting(name):
+    return getattr(settings, 'USER_IMPORT', {}).get(name, DEFAULTS[name])
+
+
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ('email', 'lastname', 'firstname', 'phone', 'password')
+PASSWORD_MIN_LENGTH = 8
+
+
+def read_rows(stream, file_format):
+    """
+    Yield the (line number, row) of a binary stream, row being a dict, or a ValidationError for unreadable lines.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if file_format == 'csv' else None)
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield (reader.line_num, row)
+            return
+        for (line, content) in enumerate(text, start=1):
+            if not content.strip():
+                continue
+            try:
+                row = json.loads(content)
+            except ValueError:
+                row = ValidationError('Invalid JSON.')
+            if not isinstance(row, (dict, ValidationError)):
+                row = ValidationError('Expected a JSON object.')
+            yield (line, row)
+    finally:
+        # Leave the stream open to the caller
+        text.detach()
+
+
+def count_rows(stream, file_format, limit):
+    """
+    Return the number of rows of a binary stream, counted up to limit + 1, and rewind it.
+    """
+    rows = read_rows(stream, file_format)
+    try:
+        return sum(1 for _ in islice(rows, limit + 1))
+    except (UnicodeDecodeError, csv.Error):
+        # Reported by UserImport.run()
+        return 0
+    finally:
+        rows.close()
+        stream.seek(0)
+
+
+def clean_row(row):
+    """
+    Return an unsaved User (its password not hashed yet) built from row, or raise a ValidationError.
+    """
+    if isinstance(row, ValidationError):
+        raise row
+    values = {name: '' if row.get(name) is None else str(row.get(name)).strip() for name in COLUMNS}
+    user = User(
+        email=User.objects.normalize_email(values['email']),
+        lastname=values['lastname'],
+        firstname=values['firstname'],
+        phone=values['phone'],
+        password=values['password'] or None,
+    )
+    errors = {}
+    try:
+        user.full_clean(exclude=('password', 'photo', 'last_login'), validate_unique=False)
+    except ValidationError as err:
+        errors = err.message_dict
+    if user.password is not None and len(user.password) < PASSWORD_MIN_LENGTH:
+        errors['password'] = ['Ensure this field has at least %d characters.' % PASSWORD_MIN_LENGTH]
+    if errors:
+        raise ValidationError(errors)
+    return user
+
+
+def error_messages(err):
+    return err.message_dict if hasattr(err, 'error_dict') else {'non_field_errors': err.messages}
+
+
+class UserImport(object):
+    """
+    Import users into the given clusters. Call run() for each file, then read created and errors (a list of
+    {"line": ..., "errors": {field: [messages]}}).
+    """
+    def __init__(self, clusters_ids, batch_size=None, processes=None):
+        self.clusters_ids = list(clusters_ids)
+        self.batch_size = batch_size or get_setting('BATCH_SIZE')
+        self.processes = processes if processes is not None else get_setting('HASHING_PROCESSES')
+        self.created = 0
+        self.errors = []
+        self.pool = None
+
+    def add_error(self, line, err):
+        self.errors.append({'line': line, 'errors': error_messages(err)})
+
+    def run(self, stream, file_format):
+        rows = read_rows(stream, file_format)
+        # The pool is forked on the first passwords to hash, once for the whole file
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+        except (UnicodeDecodeError, csv.Error) as err:
+            # The rest of the file cannot be read
+            self.add_error(None, ValidationError('Unreadable file: %s' % err))
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+        cluster_cache.invalidate()
+
+    def validate(self, batch):
+        """
+        Return the [(line, user)] of the valid rows of batch, the others being reported.
+        """
+        users = []
+        for (line, row) in batch:
+            try:
+                users.append((line, clean_row(row)))
+            except ValidationError as err:
+                self.add_error(line, err)
+        return self.exclude_taken_emails(users)
+
+    def exclude_taken_emails(self, users):
+        taken = set(User.objects.filter(email__in=[user.email for (line, user) in users]).values_list('email', flat=True))
+        valid = []
+        for (line, user) in users:
+            if user.email in taken:
+                self.add_error(line, ValidationError({'email': ['A user with this email already exists.']}))
+            else:
+                # The next rows with the same email are duplicates
+                taken.add(user.email)
+                valid.append((line, user))
+        return valid
+
+    def hash_passwords(self, users):
+        to_hash = []
+        for user in users:
+            if user.password is None:
+                # Unusable passwords cost nothing
+                user.set_unusable_password()
+            else:
+                to_hash.append(user)
+        passwords = [user.password for user in to_hash]
+        if self.processes != 0 and passwords:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(self.processes)
+            hashes = self.pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32))
+        else:
+            hashes = map(make_password, passwords)
+        for (user, password) in zip(to_hash, hashes):
+            user.password = password
+
+    def import_batch(self, batch):
+        errors_count = len(self.errors)
+        valid = self.validate(batch)
+        self.hash_passwords([user for (line, user) in valid])
+        try:
+            self.insert([user for (line, user) in valid])
+        except IntegrityError:
+            # Emails taken by a concurrent import since the validation
+            valid = self.exclude_taken_emails(valid)
+            try:
+                self.insert([user for (line, user) in valid])
+            except IntegrityError:
+                # Another failure: insert the rows one by one to report the failing ones
+                for (line, user) in valid:
+                    try:
+                        self.insert([user])
+                    except IntegrityError as err:
+                        self.add_error(line, ValidationError('This user could not be created: %s' % err))
+        self.errors[errors_count:] = sorted(self.errors[errors_count:], key=lambda error: error['line'])
+
+    def insert(self, users):
+        if not users:
+            return
+        Membership = User.clusters.through
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            # bulk_create does not set the ids on every backend
+            users_ids = list(User.objects.filter(email__in=[user.email for user in users]).values_list('id', flat=True))
+            Membership.objects.bulk_create([Membership(user_id=uid, cluster_id=cid) for uid in users_ids for cid in self.clusters_ids])
+            GroupMember.objects.bulk_create([GroupMember(user_id=uid, group_id=cid) for uid in users_ids for cid in self.clusters_ids])
+            # Bulk inserts bypass the signals (the memberships are pending, as those of UserViewSet.create)
+            Group.objects.update_counter(self.clusters_ids, members_counter(False), len(users_ids))
+        self.created += len(users_ids)
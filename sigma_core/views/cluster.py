@@ -1,15 +1,23 @@
+from django.utils.http import urlencode
+
 from rest_framework import viewsets, decorators, status, mixins
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from sigma.conditional import conditional, object_version
+from sigma.fieldsets import SparseQuerysetMixin, get_canonical_selection
+from sigma.values_serializer import ValuesListMixin
+from sigma_core import cluster_cache
 from sigma_core.models.cluster import Cluster
 from sigma_core.models.group import Group
 from sigma_core.models.group_member import GroupMember
 from sigma_core.serializers.cluster import BasicClusterSerializer, ClusterSerializer
+from sigma_core.visibility import VisibilityContext
 
 
-class ClusterViewSet(mixins.CreateModelMixin,   # Only sigma admins
-                    mixins.ListModelMixin,      # Everyone (even if not authed)
+class ClusterViewSet(ValuesListMixin,            # Everyone (even if not authed)
+                    SparseQuerysetMixin,
+                    mixins.CreateModelMixin,    # Only sigma admins
                     mixins.RetrieveModelMixin,  # Everyone (even if not authed)
                     mixins.UpdateModelMixin,    # Only sigma admins
                     mixins.DestroyModelMixin,   # Only sigma admins
@@ -37,10 +45,42 @@ class ClusterViewSet(mixins.CreateModelMixin,   # Only sigma admins
             self.permission_classes = [AllowAny, ]
         return super().get_permissions()
 
+    def can_see_members(self, request, pk):
+        return request.user.is_authenticated() and (request.user.is_sigma_admin() or VisibilityContext.for_user(request.user).is_in_cluster(pk))
+
+    def get_version(self, request, pk=None):
+        variant = (ClusterSerializer if self.can_see_members(request, pk) else BasicClusterSerializer).__name__
+        return cluster_cache.get_or_compute(('version', pk, variant),
+            lambda: object_version(self.filter_queryset(self.get_queryset()), pk, ('updated', ), variant))
+
+    def get_cache_query(self, request, paginated=False):
+        """
+        The query parameters the representations depend on, in their canonical form. Cache keys are built from it
+        only: the other parameters, and the ways of writing the same ones, must not let clients fill the cache.
+        """
+        params = get_canonical_selection(request.query_params)
+        if paginated:
+            params[self.paginator.page_size_query_param] = self.paginator.get_page_size(request)
+            cursor = request.query_params.get(self.paginator.cursor_query_param)
+            if cursor:
+                params[self.paginator.cursor_query_param] = cursor
+        return urlencode(sorted(params.items()))
+
+    def list(self, request):
+        # The list is public: its pages only depend on the canonical URL, which the links to the next pages reuse
+        self.pagination_base_url = '%s?%s' % (request.build_absolute_uri(request.path), self.get_cache_query(request, paginated=True))
+        data = cluster_cache.get_or_compute(('list', self.pagination_base_url),
+            lambda: super(ClusterViewSet, self).list(request).data)
+        return Response(data)
+
+    @conditional(get_version)
     def retrieve(self, request, pk=None):
-        if request.user.is_authenticated() and (request.user.is_sigma_admin() or request.user.clusters.filter(pk=pk).exists()):
+        if self.can_see_members(request, pk):
             self.serializer_class = ClusterSerializer
-        return super().retrieve(request, pk=pk)
+        # The members are cached apart from the public representation
+        data = cluster_cache.get_or_compute(('detail', pk, self.serializer_class.__name__, self.get_cache_query(request)),
+            lambda: super(ClusterViewSet, self).retrieve(request, pk=pk).data)
+        return Response(data)
 
     @only_staff
     def create(self, request):
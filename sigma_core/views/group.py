@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 from django.http import Http404
 from django.db.models import Q
 
@@ -6,10 +8,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from dry_rest_permissions.generics import DRYPermissionFiltersBase
 
+from sigma.conditional import conditional, object_version
+from sigma.fieldsets import SparseQuerysetMixin
+from sigma.values_serializer import ValuesListMixin
 from sigma_core.models.user import User
-from sigma_core.models.group import Group
+from sigma_core.models.group import Group, GroupAcknowledgment
 from sigma_core.models.group_member import GroupMember
 from sigma_core.serializers.group import GroupSerializer
+from sigma_core.visibility import VisibilityContext
 
 
 class GroupFilterBackend(DRYPermissionFiltersBase):
@@ -20,18 +26,24 @@ class GroupFilterBackend(DRYPermissionFiltersBase):
         if request.user.is_sigma_admin():
             return queryset
 
-        invited_to_groups_ids = request.user.invited_to_groups.all().values_list('id', flat=True)
-        user_groups_ids = request.user.memberships.filter(is_accepted=True).values_list('group_id', flat=True)
-        return queryset.prefetch_related('memberships', 'group_parents') \
-            .filter(Q(is_private=False) | Q(memberships__user=request.user) | Q(id__in=invited_to_groups_ids) | Q(group_parents__id__in=user_groups_ids)) \
-            .distinct()
+        visibility = VisibilityContext.for_user(request.user)
+        acknowledged_groups_ids = GroupAcknowledgment.objects.filter(validated=True, parent_group_id__in=visibility.accepted_groups_ids).values('subgroup_id')
+        return queryset.filter(Q(is_private=False) | Q(id__in=visibility.groups_ids) | Q(id__in=visibility.invited_groups_ids) | Q(id__in=acknowledged_groups_ids))
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ValuesListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
     permission_classes = [IsAuthenticated, ]
     filter_backends = (GroupFilterBackend, )
+    pagination_ordering = ('name', 'id')
+
+    def get_version(self, request, pk=None):
+        return object_version(self.filter_queryset(self.get_queryset()), pk, ('updated', ))
+
+    @conditional(get_version)
+    def retrieve(self, request, pk=None):
+        return super().retrieve(request, pk=pk)
 
     def update(self, request, pk=None):
         try:
@@ -78,3 +90,59 @@ class GroupViewSet(viewsets.ModelViewSet):
             raise Http404("Group %d not found" % pk)
         except User.DoesNotExist:
             raise Http404("User %d not found" % request.data.get('user_id', None))
+
+    # Bounds the size of the user_id IN (...) lists: larger promotions are invited with members_of
+    max_invited_users = 500
+    USER_NOT_FOUND = 'not_found'
+
+    @decorators.detail_route(methods=['put'])
+    def bulk_invite(self, request, pk=None):
+        """
+        Invite several users in group pk: either the users of user_ids, or all the accepted members of the group
+        members_of. Members and users already invited are skipped. Returns {"results": [{"user_id": ..., "status": ...}]}
+        where status is invited, already_member, already_invited or not_found.
+        ---
+        omit_serializer: true
+        parameters_strategy:
+            form: replace
+        parameters:
+            - name: user_ids
+              type: array
+              items:
+                type: integer
+            - name: members_of
+              type: integer
+        """
+        try:
+            group = Group.objects.get(pk=pk)
+        except Group.DoesNotExist:
+            raise Http404("Group %s not found" % pk)
+        if not request.user.can_invite(group):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        user_ids = request.data.get('user_ids', None)
+        members_of = request.data.get('members_of', None)
+        if (user_ids is None) == (members_of is None):
+            return Response("Expected either user_ids or members_of", status=status.HTTP_400_BAD_REQUEST)
+
+        if user_ids is not None:
+            if not isinstance(user_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in user_ids):
+                return Response("user_ids must be a list of integers", status=status.HTTP_400_BAD_REQUEST)
+            if len(user_ids) > self.max_invited_users:
+                return Response("At most %d users per invitation" % self.max_invited_users, status=status.HTTP_400_BAD_REQUEST)
+            users = User.objects.filter(pk__in=user_ids)
+        else:
+            try:
+                members_of = int(members_of)
+            except (TypeError, ValueError):
+                return Response("members_of must be a group id", status=status.HTTP_400_BAD_REQUEST)
+            # Only the members of the group can list its members
+            if not request.user.is_sigma_admin() and members_of not in VisibilityContext.for_user(request.user).accepted_groups_ids:
+                return Response(status=status.HTTP_403_FORBIDDEN)
+            users = User.objects.filter(pk__in=GroupMember.objects.filter(group_id=members_of, is_accepted=True).values('user_id'))
+
+        outcomes = Group.objects.invite_users(group, users)
+        if members_of is not None:
+            user_ids = sorted(outcomes)
+        results = [{'user_id': user_id, 'status': outcomes.get(user_id, self.USER_NOT_FOUND)} for user_id in OrderedDict.fromkeys(user_ids)]
+        return Response({'results': results}, status=status.HTTP_200_OK)
@@ -8,6 +8,7 @@ from dry_rest_permissions.generics import DRYPermissions
 
 from sigma_core.models.group_field import GroupField
 from sigma_core.serializers.group_field import GroupFieldSerializer
+from sigma_core.visibility import VisibilityContext
 
 class GroupFieldViewSet(mixins.CreateModelMixin,    # Only Group admin
                    mixins.RetrieveModelMixin,       # Every Group member (including not accepted group members - for "open" groups)
@@ -22,14 +23,11 @@ class GroupFieldViewSet(mixins.CreateModelMixin,    # Only Group admin
 
     # You will never see fields for groups you are not a member of
     def get_queryset(self):
-        from sigma_core.models.group_member import GroupMember
         if not self.request.user.is_authenticated():
             return self.queryset.none()
         if self.request.user.is_sigma_admin():
             return self.queryset
-        # @sqlperf: Find which one is the most efficient
-        my_groups = GroupMember.objects.filter(user=self.request.user.id).values_list('group', flat=True)
-        #my_groups = Group.objects.filter(memberships__user=self.request.user.id)
+        my_groups = VisibilityContext.for_user(self.request.user).groups_ids
         return self.queryset.filter(group__in=my_groups)
 
     def create(self, request):
@@ -57,7 +55,7 @@ class GroupFieldViewSet(mixins.CreateModelMixin,    # Only Group admin
         try:
             gf = self.get_queryset().get(id=pk)
             try:
-                gf.validator.validate_input(gf.validator_values, client_input)
+                gf.validate_input(client_input)
                 return Response({"status": "ok"}, status=status.HTTP_200_OK)
             except ValidationError as err:
                 return Response({"status": "ko", "message": err.messages}, status=status.HTTP_200_OK)
@@ -65,3 +63,36 @@ class GroupFieldViewSet(mixins.CreateModelMixin,    # Only Group admin
                 return Response({"status": "ko", "message": "Invalid input"}, status=status.HTTP_200_OK)
         except:
             return Response(status=status.HTTP_404_NOT_FOUND)
+
+    @decorators.list_route(methods=['post'])
+    def validate_all(self, request):
+        """
+        Check the client inputs for several custom fields of the same group at once.
+        Expects {"group": group_id, "values": {field_id: value, ...}} and returns {field_id: {"status": ..., "message": ...}}.
+        """
+        if not request.user.is_authenticated():
+            return Response(status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            group_id = int(request.data.get('group'))
+            values = {int(field_id): value for (field_id, value) in request.data.get('values').items()}
+        except (TypeError, ValueError, AttributeError):
+            return Response("Expected a group and a map of values", status=status.HTTP_400_BAD_REQUEST)
+
+        # Same permission as the validate route, checked once for the whole batch
+        if not request.user.is_sigma_admin() and group_id not in VisibilityContext.for_user(request.user).groups_ids:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        results = {field_id: {"status": "ko", "message": ["No such field in this group"]} for field_id in values}
+        # Fields sharing the same validator values share the same compiled rule
+        for gf in GroupField.objects.filter(group_id=group_id, id__in=values.keys()):
+            client_input = values[gf.id]
+            try:
+                if client_input is None:
+                    raise ValidationError("No value given")
+                gf.validate_input(client_input)
+                results[gf.id] = {"status": "ok"}
+            except ValidationError as err:
+                results[gf.id] = {"status": "ko", "message": err.messages}
+            except:
+                results[gf.id] = {"status": "ko", "message": "Invalid input"}
+        return Response(results, status=status.HTTP_200_OK)
@@ -6,10 +6,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import BaseFilterBackend
 
+from sigma.conditional import conditional, object_version
+from sigma.fieldsets import SparseQuerysetMixin
+from sigma.values_serializer import ValuesListMixin
 from sigma_core.models.user import User
 from sigma_core.models.group import Group, GroupAcknowledgment
 from sigma_core.models.group_member import GroupMember
 from sigma_core.serializers.group_member import GroupMemberSerializer
+from sigma_core.visibility import VisibilityContext
 
 
 class GroupMemberFilterBackend(BaseFilterBackend):
@@ -23,18 +27,16 @@ class GroupMemberFilterBackend(BaseFilterBackend):
         Limits all list requests w.r.t the Normal Rules of Visibility.
         """
         if not request.user.is_sigma_admin():
-            invited_to_groups_ids = request.user.invited_to_groups.all().values_list('id', flat=True)
-            user_groups_ids = request.user.memberships.filter(is_accepted=True).values_list('group_id', flat=True)
+            visibility = VisibilityContext.for_user(request.user)
+            acknowledged_groups_ids = GroupAcknowledgment.objects.filter(validated=True, parent_group_id__in=visibility.accepted_groups_ids).values('subgroup_id')
+            visible_users_ids = GroupMember.objects.filter(group_id__in=visibility.accepted_groups_ids).values('user_id')
             # I can see a GroupMember if one of the following conditions is met:
             #  - I am member of the group
             #  - I am invited to the group
             #  - (the group is public OR acknowledged by one of my groups) AND I can see the user w.r.t. NRVU
-            queryset = queryset.prefetch_related(
-                Prefetch('user__memberships', queryset=GroupMember.objects.filter(is_accepted=True)),
-                Prefetch('group__group_parents', queryset=GroupAcknowledgment.objects.filter(validated=True))
-            ).filter(Q(user_id=request.user.id) | Q(group_id__in=user_groups_ids) | Q(group_id__in=invited_to_groups_ids) | (
-                (Q(group__is_private=False) | Q(group__group_parents__id__in=user_groups_ids)) &
-                    Q(user__memberships__group_id__in=user_groups_ids)
+            queryset = queryset.filter(Q(user_id=request.user.id) | Q(group_id__in=visibility.accepted_groups_ids) | Q(group_id__in=visibility.invited_groups_ids) | (
+                (Q(group__is_private=False) | Q(group_id__in=acknowledged_groups_ids)) &
+                    Q(user_id__in=visible_users_ids)
             ))
 
         for (param, q) in self.filter_q.items():
@@ -42,10 +44,10 @@ class GroupMemberFilterBackend(BaseFilterBackend):
             if x is not None:
                 queryset = queryset.filter(q(x))
 
-        return queryset.distinct()
+        return queryset
 
 
-class GroupMemberViewSet(viewsets.ModelViewSet):
+class GroupMemberViewSet(ValuesListMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = GroupMember.objects.select_related('group', 'user')
     serializer_class = GroupMemberSerializer
     permission_classes = [IsAuthenticated, ]
@@ -66,6 +68,13 @@ class GroupMemberViewSet(viewsets.ModelViewSet):
         """
         return super().list(request)
 
+    def get_version(self, request, pk=None):
+        return object_version(self.filter_queryset(self.get_queryset()), pk, ('updated', ))
+
+    @conditional(get_version)
+    def retrieve(self, request, pk=None):
+        return super().retrieve(request, pk=pk)
+
     def create(self, request):
         serializer = GroupMemberSerializer(data=request.data)
         if not serializer.is_valid():
@@ -11,6 +11,7 @@ from sigma_core.models.group_field import GroupField
 from sigma_core.models.group_member import GroupMember
 from sigma_core.models.group_member_value import GroupMemberValue
 from sigma_core.serializers.group_member_value import GroupMemberValueSerializer
+from sigma_core.visibility import VisibilityContext
 
 class GroupMemberValueViewSet(
         # You can only create a customfield for yourself
@@ -34,14 +35,11 @@ class GroupMemberValueViewSet(
     # HERE we handle permissions filtering
     # You will never see fields for groups you are not a member of
     def get_queryset(self):
-        from sigma_core.models.group_member import GroupMember
         if not self.request.user.is_authenticated():
             return self.queryset.none()
         if self.request.user.is_sigma_admin():
             return self.queryset
-        # @sqlperf: Find which one is the most efficient
-        my_groups = self.available_memberships.filter(user=self.request.user.id).filter(is_accepted=True).values_list('group', flat=True)
-        #my_groups = GroupMember.objects.filter(user=self.request.user.id)
+        my_groups = VisibilityContext.for_user(self.request.user).accepted_groups_ids
         # But can always see your own custom fields
         return self.queryset.filter(Q(membership__group__in=my_groups) | Q(membership__user=self.request.user.id))
 
@@ -4,7 +4,7 @@ import string
 import operator
 from functools import reduce
 
-from django.core.mail import send_mail
+from django.db import transaction
 from django.db.models import Q, Prefetch
 from django.http import Http404
 from django.views.decorators.csrf import csrf_exempt
@@ -13,9 +13,15 @@ from rest_framework import mixins, viewsets, decorators, status, parsers
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from sigma.conditional import conditional, instance_version, object_version
+from sigma.fieldsets import load_only
+from sigma.values_serializer import ValuesSerializer
+from sigma_core.models.cluster import Cluster
 from sigma_core.models.user import User
 from sigma_core.models.group_member import GroupMember
+from sigma_core.models.queued_mail import QueuedMail
 from sigma_core.serializers.user import UserSerializer, MinimalUserSerializer, MyUserSerializer
+from sigma_core.visibility import VisibilityContext
 
 
 reset_mail = {
@@ -40,16 +46,13 @@ class UserViewSet(mixins.CreateModelMixin,      # Only Cluster admins can create
     permission_classes = [IsAuthenticated, ]
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_ordering = ('lastname', 'id')
 
     def perform_create(self, serializer):
-        from sigma_core.models.cluster import Cluster
-        from sigma_core.models.group import Group
-        serializer.save()
-        # Create related GroupMember associations
-        # TODO: Looks like a hacky-way to do this.
-        # But how to do it properly ?
-        memberships = [GroupMember(group=Group(id=c), user=User(id=serializer.data['id']),) for c in serializer.data['clusters_ids']]
-        GroupMember.objects.bulk_create(memberships)
+        user = serializer.save()
+        # Create related GroupMember associations, one by one: their signals update the counters and the clusters cache
+        for cluster_id in serializer.data['clusters_ids']:
+            GroupMember.objects.create(group_id=cluster_id, user=user)
 
     def list(self, request, *args, **kwargs):
         """
@@ -57,32 +60,48 @@ class UserViewSet(mixins.CreateModelMixin,      # Only Cluster admins can create
         """
         # Sigma admins can list all the users
         if request.user.is_sigma_admin():
-            return super().list(self, request, args, kwargs)
+            qs = self.get_queryset()
+        else:
+            # We get visible users ids w.r.t. the Normal Rules of Visibility, based on their belongings to common clusters/groups (let's anticipate the pagination)
+            # Common groups are read from the materialized UserVisibility relation
+            visible_users = VisibilityContext.for_user(request.user).visible_users_filter()
+            qs = User.objects.filter(visible_users, is_active=True)
+        return ValuesSerializer(UserSerializer, context={'request': request}).list_response(self, qs)
 
-        # We get visible users ids w.r.t. the Normal Rules of Visibility, based on their belongings to common clusters/groups (let's anticipate the pagination)
-        # Since clusters are groups, we only check that condition for groups
-        groups_ids = request.user.memberships.filter(is_accepted=True).values_list('group_id', flat=True)
-        qs = User.objects.prefetch_related('memberships').filter(is_active=True, memberships__group__id__in=groups_ids).distinct()
-        s = UserSerializer(qs, many=True, context={'request': request})
-        return Response(s.data, status=status.HTTP_200_OK)
+    def get_user(self, request, pk):
+        """
+        The user to retrieve, loaded once for get_user_version() and retrieve(); None if it does not exist.
+        """
+        if not hasattr(self, '_user'):
+            try:
+                # The clusters are needed by the visibility rules anyway
+                self._user = load_only(User.objects.prefetch_related('clusters'), UserSerializer(context={'request': request})).get(pk=pk)
+            except (User.DoesNotExist, TypeError, ValueError):
+                self._user = None
+        return self._user
+
+    def get_user_serializer_class(self, request, user):
+        # Admin, oneself, common cluster or common group: can see detailed user
+        if VisibilityContext.for_user(request.user).can_see_details(user):
+            return UserSerializer
+        # Others can only see minimal information
+        return MinimalUserSerializer
 
+    def get_user_version(self, request, pk=None):
+        user = self.get_user(request, pk)
+        if user is None:
+            return None
+        return instance_version(user, ('last_modified', 'photo__updated'), self.get_user_serializer_class(request, user).__name__)
+
+    @conditional(get_user_version)
     def retrieve(self, request, pk=None):
         """
         Retrieve an User according to its id (pk).
         """
-        # 1. Retrieve user
-        try:
-            user = User.objects.all().prefetch_related('clusters').select_related('photo').get(pk=pk)
-        except User.DoesNotExist:
+        user = self.get_user(request, pk)
+        if user is None:
             return Response(status=status.HTTP_404_NOT_FOUND)
-
-        # 2. Check permissions to choose serializer
-        # Admin, oneself, common cluster or common group: can see detailed user
-        if request.user.is_sigma_admin() or user.id == request.user.id or request.user.has_common_cluster(user) or request.user.has_common_group(user):
-            s = UserSerializer(user, context={'request': request})
-        else : # Others can only see minimal information
-            s = MinimalUserSerializer(user, context={'request': request})
-
+        s = self.get_user_serializer_class(request, user)(user, context={'request': request})
         return Response(s.data, status=status.HTTP_200_OK)
 
     def update(self, request, pk=None):
@@ -106,16 +125,18 @@ class UserViewSet(mixins.CreateModelMixin,      # Only Cluster admins can create
             return Response(status=status.HTTP_403_FORBIDDEN)
         super().destroy(request, pk)
 
+    def get_me_version(self, request):
+        return object_version(User.objects.all(), request.user.id, ('last_modified', 'photo__updated'), MyUserSerializer.__name__)
+
     @decorators.list_route(methods=['get'])
+    @conditional(get_me_version)
     def me(self, request):
         """
         Give the data of the current user.
         ---
         response_serializer: MyUserSerializer
         """
-        user = User.objects.all().select_related('photo').prefetch_related(
-            Prefetch('memberships', queryset=GroupMember.objects.all().select_related('group'))
-        ).get(pk=request.user.id)
+        user = load_only(User.objects.all(), MyUserSerializer(context={'request': request})).get(pk=request.user.id)
         s = MyUserSerializer(user, context={'request': request})
         return Response(s.data, status=status.HTTP_200_OK)
 
@@ -172,13 +193,66 @@ class UserViewSet(mixins.CreateModelMixin,      # Only Cluster admins can create
         mail = reset_mail.copy()
         mail['recipient_list'] = [user.email]
         mail['message'] = mail['message'].format(email=user.email, password=password, name=user.get_full_name())
-        send_mail(**mail)
 
-        user.set_password(password)
-        user.save()
+        # The mail is delivered by the send_queued_mail worker, once the new password is committed
+        with transaction.atomic():
+            user.set_password(password)
+            user.save()
+            QueuedMail.objects.enqueue(**mail)
 
         return Response('Password reset', status=status.HTTP_200_OK)
 
+    @decorators.list_route(methods=['post'])
+    @decorators.parser_classes([parsers.MultiPartParser, ])
+    def bulk_import(self, request):
+        """
+        Create the users of a CSV or JSON lines file in the given clusters (sigma and cluster admins only), see
+        sigma_core.user_import. Returns the number of created users and the errors of the rejected lines. Files of more
+        than USER_IMPORT['API_MAX_ROWS'] rows are refused: they must be imported with the import_users command.
+        ---
+        omit_serializer: true
+        parameters_strategy:
+            form: replace
+        parameters:
+            - name: file
+              type: file
+              required: true
+            - name: clusters
+              type: integer
+              allowMultiple: true
+              required: true
+            - name: file_format
+              type: string
+              enum: [csv, jsonl]
+              description: Guessed from the file name by default
+        """
+        from sigma_core.user_import import FORMATS, UserImport, count_rows, get_setting
+
+        upload = request.data.get('file')
+        if upload is None:
+            return Response("'file' field is required", status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or upload.name.rpartition('.')[2].lower()
+        if file_format not in FORMATS:
+            return Response("'file_format' must be one of: %s" % ', '.join(FORMATS), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            clusters_ids = {int(c) for c in request.data.getlist('clusters')}
+        except ValueError:
+            return Response("'clusters' must be ids", status=status.HTTP_400_BAD_REQUEST)
+        clusters = list(Cluster.objects.filter(pk__in=clusters_ids))
+        if not clusters or len(clusters) != len(clusters_ids):
+            return Response("'clusters' must be existing clusters ids", status=status.HTTP_400_BAD_REQUEST)
+
+        if not request.user.is_sigma_admin() and not all(request.user.is_cluster_admin(c) for c in clusters):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        # Hash in-process: do not fork the server. Large imports go through the import_users command
+        max_rows = get_setting('API_MAX_ROWS')
+        if count_rows(upload.file, file_format, max_rows) > max_rows:
+            return Response('Files of more than %d rows must be imported with the import_users command' % max_rows, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        users_import = UserImport(clusters_ids, processes=0)
+        users_import.run(upload.file, file_format)
+        return Response({'created': users_import.created, 'errors': users_import.errors}, status=status.HTTP_200_OK)
+
     @decorators.list_route(methods=['post'])
     @decorators.parser_classes([parsers.MultiPartParser, ])
     def addphoto(self, request):
@@ -195,12 +269,11 @@ class UserViewSet(mixins.CreateModelMixin,      # Only Cluster admins can create
         """
         from sigma_files.models import Image
         from sigma_files.serializers import ImageSerializer
+        from sigma_files.variants import process_upload
 
         s = ImageSerializer(data=request.data, context={'request': request})
         s.is_valid(raise_exception=True)
-        img = s.save()
-        img.owner = request.user
-        img.save()
+        img = process_upload(lambda: s.save(owner=request.user))
         request.user.photo = img
         request.user.save()
 
@@ -0,0 +1,133 @@
+from django.db import connection
+from django.db.models import Q
+
+from sigma_chat.models.chat_member import ChatMember
+from sigma_core.models.user_visibility import UserVisibility
+
+
+class VisibilityContext(object):
+    """
+    Everything the Normal Rules of Visibility need to know about an user: the groups he belongs to
+    (accepted or pending), the groups he is invited to, his clusters and his chats.
+
+    It is loaded from a single query and memoized on the user instance, so that every filter backend
+    and permission helper used while handling a request shares it.
+    """
+    ACCEPTED_GROUP = 0
+    PENDING_GROUP = 1
+    INVITED_GROUP = 2
+    CLUSTER = 3
+    CHAT = 4
+
+    def __init__(self, user):
+        self.user = user
+        self.accepted_groups_ids = set()
+        self.pending_groups_ids = set()
+        self.invited_groups_ids = set()
+        self.clusters_ids = set()
+        self.chats_ids = set()
+
+        if user.is_authenticated():
+            self.load()
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Return the context of the given user, computing it on first access.
+        """
+        context = getattr(user, '_visibility_context', None)
+        if context is None:
+            context = cls(user)
+            user._visibility_context = context
+        return context
+
+    @staticmethod
+    def invalidate(user):
+        """
+        Drop the memoized context, eg. after the user's memberships have been modified.
+        """
+        user.__dict__.pop('_visibility_context', None)
+
+    @property
+    def groups_ids(self):
+        """
+        Groups the user is member of, whether his membership has been accepted or not.
+        """
+        return self.accepted_groups_ids | self.pending_groups_ids
+
+    def load(self):
+        from sigma_core.models.user import User
+        from sigma_core.models.group_member import GroupMember
+
+        def column(model, field):
+            return model._meta.get_field(field).column
+
+        invitations = User.invited_to_groups.through
+        clusters = User.clusters.through
+        sql = ' UNION ALL '.join([
+            'SELECT %s, CASE WHEN %s = %%s THEN %d ELSE %d END FROM %s WHERE %s = %%s' % (
+                column(GroupMember, 'group'), column(GroupMember, 'is_accepted'), self.ACCEPTED_GROUP, self.PENDING_GROUP,
+                GroupMember._meta.db_table, column(GroupMember, 'user')),
+            'SELECT %s, %d FROM %s WHERE %s = %%s' % (
+                column(invitations, 'group'), self.INVITED_GROUP, invitations._meta.db_table, column(invitations, 'user')),
+            'SELECT %s, %d FROM %s WHERE %s = %%s' % (
+                column(clusters, 'cluster'), self.CLUSTER, clusters._meta.db_table, column(clusters, 'user')),
+            'SELECT %s, %d FROM %s WHERE %s = %%s AND %s = %%s' % (
+                column(ChatMember, 'chat'), self.CHAT, ChatMember._meta.db_table, column(ChatMember, 'user'), column(ChatMember, 'is_member')),
+        ])
+        params = [True, self.user.id, self.user.id, self.user.id, self.user.id, True]
+
+        sets = {
+            self.ACCEPTED_GROUP: self.accepted_groups_ids,
+            self.PENDING_GROUP: self.pending_groups_ids,
+            self.INVITED_GROUP: self.invited_groups_ids,
+            self.CLUSTER: self.clusters_ids,
+            self.CHAT: self.chats_ids,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for (obj_id, kind) in cursor.fetchall():
+                sets[kind].add(obj_id)
+
+    ###########
+    # Helpers #
+    ###########
+
+    def is_in_cluster(self, cluster_id):
+        try:
+            return int(cluster_id) in self.clusters_ids
+        except (TypeError, ValueError):
+            return False
+
+    def has_common_cluster(self, user):
+        """
+        Return True iff the user has a cluster in common with the given user.
+        """
+        # Clusters are prefetched by UserManager: this does not hit the database
+        return any(c.pk in self.clusters_ids for c in user.clusters.all())
+
+    def has_common_group(self, user):
+        """
+        Return True iff the user is an accepted member of a group the given user belongs to.
+        Warning: non symmetric relation (see User.has_common_group).
+        """
+        if not self.accepted_groups_ids:
+            return False
+        if self.has_common_cluster(user):
+            return True
+        return UserVisibility.objects.filter(viewer_id=self.user.id, target_id=user.id).exists()
+
+    def visible_users_filter(self):
+        """
+        Return a filter on User matching the users whose detailed profile can be seen.
+        """
+        from sigma_core.models.user import User
+        cluster_users_ids = User.clusters.through.objects.filter(cluster_id__in=self.clusters_ids).values('user_id')
+        group_users_ids = UserVisibility.objects.filter(viewer_id=self.user.id).values('target_id')
+        return Q(id=self.user.id) | Q(id__in=cluster_users_ids) | Q(id__in=group_users_ids)
+
+    def can_see_details(self, user):
+        """
+        Return True iff the detailed profile of the given user can be seen w.r.t. the Normal Rules of Visibility.
+        """
+        return self.user.is_sigma_admin() or user.id == self.user.id or self.has_common_cluster(user) or self.has_common_group(user)
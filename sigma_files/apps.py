@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SigmaFilesConfig(AppConfig):
     name = 'sigma_files'
+
+    def ready(self):
+        import sigma_files.signals
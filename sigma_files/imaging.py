@@ -0,0 +1,114 @@
+"""
+Metadata and sized variants of the uploaded images.
+
+For the variants, the original is decoded once, rotated according to its EXIF orientation, and each variant is resized from the previous
+(larger) one. Variants are re-encoded without any metadata but the color profile.
+
+This module must stay free of Django imports: it is imported by the worker processes.
+"""
+import hashlib
+import io
+import multiprocessing
+
+from PIL import Image, ImageOps
+
+
+# Pillow format, file extension
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'png': ('PNG', 'png'),
+    'webp': ('WEBP', 'webp'),
+}
+
+
+# EXIF orientations which swap the width and the height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def get_context():
+    methods = multiprocessing.get_all_start_methods()
+    # Do not fork a possibly multi-threaded server when we can avoid it
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+
+
+def read_metadata(f):
+    """
+    Return the metadata of the image in the binary file object f: dimensions (as displayed, ie. once rotated according
+    to its EXIF orientation), size in bytes, MIME type, SHA-256 and placeholder color (its mean color, '#rrggbb').
+    Raise OSError (or DecompressionBombError) if f is not a valid image.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: f.read(64 * 1024), b''):
+        sha256.update(chunk)
+        size += len(chunk)
+    f.seek(0)
+
+    with Image.open(f) as image:
+        (width, height) = image.size
+        if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            (width, height) = (height, width)
+        mime_type = Image.MIME.get(image.format, '')
+        # Only a mean is needed: let the JPEG decoder downscale as much as it can
+        image.draft('RGB', (64, 64))
+        color = image.convert('RGB').resize((1, 1), Image.BOX).getpixel((0, 0))
+
+    return {
+        'width': width,
+        'height': height,
+        'size': size,
+        'mime_type': mime_type,
+        'sha256': sha256.hexdigest(),
+        'placeholder': '#%02x%02x%02x' % color,
+    }
+
+
+def read_file_metadata(path):
+    """
+    read_metadata() of the file at path, or None if it cannot be read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return read_metadata(f)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def encode(image, fmt, quality, icc_profile):
+    buf = io.BytesIO()
+    options = {'quality': quality} if fmt != 'png' else {'optimize': True}
+    if fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(buf, FORMATS[fmt][0], **options)
+    return buf.getvalue()
+
+
+def render_variants(path, sizes, webp=False, quality=85):
+    """
+    Return the variants of the image file at path, as a list of (name, format, width, height, data).
+
+    sizes maps each variant name to the maximal length of its longest side. Images are never upscaled. Variants are
+    encoded as JPEG (PNG if the image has transparency), and also as WebP if webp is True.
+    """
+    largest = max(sizes.values())
+    with Image.open(path) as original:
+        # Let the JPEG decoder downscale by a power of 2 when it can: much faster for big photos
+        original.draft('RGB', (largest, largest))
+        icc_profile = original.info.get('icc_profile')
+        image = ImageOps.exif_transpose(original)
+        alpha = has_alpha(image)
+        image = image.convert('RGBA' if alpha else 'RGB')
+
+    formats = ['png' if alpha else 'jpeg'] + (['webp'] if webp else [])
+    variants = []
+    for (name, size) in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        for fmt in formats:
+            variants.append((name, fmt, image.width, image.height, encode(image, fmt, quality, icc_profile)))
+    return variants
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from sigma_files.imaging import get_context, read_file_metadata
+from sigma_files.models import Image
+
+
+class Command(BaseCommand):
+    help = 'Compute the metadata (dimensions, size, MIME type, hash, placeholder) of the images uploaded before they were stored, reading the files in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', default=False, help='Compute the metadata of every image again.')
+        parser.add_argument('--batch-size', type=int, default=200, help='Number of images read in parallel and updated per transaction.')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        if not options['all']:
+            images = images.filter(width__isnull=True)
+
+        done_count = 0
+        failed_count = 0
+        last_id = 0
+        with get_context().Pool(options['workers']) as pool:
+            while True:
+                batch = list(images.filter(id__gt=last_id).order_by('id').only('id', 'file')[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                # Only the files are read in the workers (the storage must be on the local filesystem)
+                results = pool.map(read_file_metadata, [image.file.path for image in batch])
+                with transaction.atomic():
+                    for (image, metadata) in zip(batch, results):
+                        if metadata is None:
+                            failed_count += 1
+                            self.stderr.write('Image %d: cannot read %s' % (image.id, image.file.name))
+                            continue
+                        Image.objects.filter(pk=image.id).update(updated=timezone.now(), **metadata)
+                        done_count += 1
+                self.stdout.write('%d images done...' % done_count)
+
+        self.stdout.write('%d images done, %d unreadable.' % (done_count, failed_count))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from sigma_files.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete the upload sessions left inactive for longer than UPLOAD_SESSIONS[\'EXPIRY\'], and their partial files.'
+
+    def handle(self, *args, **options):
+        self.stdout.write('%d abandoned upload sessions deleted.' % UploadSession.objects.delete_expired())
@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from sigma_files.models import Blob, Image
+from sigma_files.storage import BlobStorage, blob_storage, is_blob_name
+
+
+class Command(BaseCommand):
+    help = 'Recount the references to the blobs of the content-addressed storage, fix the drifted counts and delete the unreferenced blobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', default=False, help='Only report the differences, do not write anything.')
+        parser.add_argument('--grace', type=int, default=3600, help='Blobs referenced less than this many seconds ago are left alone (their references may not be committed yet).')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        references = self.count_references()
+
+        drifted_count = 0
+        collected_count = 0
+        for blob in Blob.objects.filter(updated__lt=cutoff).iterator():
+            count = references.get(blob.name, 0)
+            if count == blob.ref_count and count:
+                continue
+            drifted_count += 1
+            if options['check']:
+                self.stdout.write('Blob %s: stored %d references, counted %d' % (blob.name, blob.ref_count, count))
+            elif count:
+                Blob.objects.filter(pk=blob.name, updated__lt=cutoff).update(ref_count=count)
+            else:
+                with transaction.atomic():
+                    if Blob.objects.filter(pk=blob.name, updated__lt=cutoff).delete()[0]:
+                        blob_storage.delete_file(blob.name)
+                        collected_count += 1
+
+        if options['check'] and drifted_count:
+            raise CommandError('%d blobs have drifted reference counts.' % drifted_count)
+        self.stdout.write('%d drifted blobs %s, %d collected.' % (drifted_count, 'found' if options['check'] else 'fixed', collected_count))
+
+    def count_references(self):
+        """
+        Count the references to each blob: the file fields stored in a BlobStorage, and the variants of the images.
+        """
+        references = Counter()
+        for model in apps.get_models():
+            for field in model._meta.local_concrete_fields:
+                if isinstance(field, models.FileField) and isinstance(field.storage, BlobStorage):
+                    names = model._base_manager.exclude(**{field.attname: ''}).values_list(field.attname, flat=True)
+                    references.update(name for name in names.iterator() if is_blob_name(name))
+        for image in Image.objects.only('variants').iterator():
+            for variant in image.variants.values():
+                references.update(name for name in variant['files'].values() if is_blob_name(name))
+        return references
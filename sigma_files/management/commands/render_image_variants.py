@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from sigma_files.models import Image
+from sigma_files.variants import get_pipeline
+
+
+class Command(BaseCommand):
+    help = 'Render the variants of the images which do not have them yet (uploaded before the pipeline, or failed), on the worker pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', default=False, help='Render the variants of every image again (eg. after a change of IMAGE_VARIANTS).')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        if not options['all']:
+            images = images.exclude(variants_status=Image.VARIANTS_READY)
+        pipeline = get_pipeline()
+
+        count = 0
+        last_id = 0
+        while True:
+            batch = list(images.filter(id__gt=last_id).order_by('id').only('id', 'file')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for image in batch:
+                # Wait for a free slot rather than failing
+                pipeline.reserve(blocking=True)
+                pipeline.submit(image)
+            count += len(batch)
+            self.stdout.write('%d images queued...' % count)
+        pipeline.join()
+
+        failed = images.filter(id__lte=last_id, variants_status=Image.VARIANTS_FAILED).count()
+        self.stdout.write('%d images processed, %d failed.' % (count, failed))
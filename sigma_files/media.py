@@ -0,0 +1,156 @@
+"""
+Delivery of the media files.
+
+The transfer is handed over to the front proxy when there is one, with X-Accel-Redirect (nginx) or X-Sendfile (Apache,
+lighttpd): Python only decides what is sent. Otherwise the file is streamed by the WSGI server, which can use sendfile()
+(wsgi.file_wrapper). Files are never modified once stored (their names are random or their hashes), so responses are
+cacheable for ever. Settings:
+
+    MEDIA_SERVING = {
+        'BACKEND': 'python',                    # 'nginx', 'sendfile' (X-Sendfile) or 'python'
+        'INTERNAL_URL': '/protected-media/',    # nginx: internal location aliased to MEDIA_ROOT
+        'MAX_AGE': 365 * 24 * 3600,
+        'PUBLIC': True,                         # Serve MEDIA_URL to anyone (else only through /image/<id>/download/)
+    }
+
+With nginx:
+
+    location /protected-media/ {
+        internal;
+        alias /path/to/MEDIA_ROOT/;
+    }
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from sigma.conditional import is_not_modified
+
+
+DEFAULTS = {
+    'BACKEND': 'python',
+    'INTERNAL_URL': '/protected-media/',
+    'MAX_AGE': 365 * 24 * 3600,
+    'PUBLIC': True,
+}
+
+def get_setting(name):
+    return getattr(settings, 'MEDIA_SERVING', {}).get(name, DEFAULTS[name])
+
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Return the (first, last) bytes of a single range Range header, None if there is no range or an unsupported one
+    (the whole file is sent), or False if the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    (first, last) = match.groups()
+    if not first:
+        if not last:
+            return None
+        # The last bytes
+        (first, last) = (max(0, size - int(last)), size - 1)
+    else:
+        (first, last) = (int(first), min(int(last), size - 1) if last else size - 1)
+    if first > last or first >= size:
+        return False
+    return (first, last)
+
+
+class RangeFile(object):
+    """
+    The bytes first to last of a file. It has no fileno(): WSGI servers do not sendfile() it in full.
+    """
+    def __init__(self, f, first, last):
+        self.file = f
+        self.file.seek(first)
+        self.remaining = last - first + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_response(request, name, public=True):
+    """
+    Send the media file name (relative to MEDIA_ROOT).
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        st = os.stat(path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404()
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404()
+
+    etag = '"%x-%x"' % (int(st.st_mtime), st.st_size)
+    if is_not_modified(request, etag, st.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = file_response(request, name, path, st.st_size)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(st.st_mtime)
+    response['Cache-Control'] = '%s, max-age=%d, immutable' % ('public' if public else 'private', get_setting('MAX_AGE'))
+    return response
+
+
+def file_response(request, name, path, size):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    backend = get_setting('BACKEND')
+    if backend == 'nginx':
+        # nginx handles the ranges and the length itself
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = get_setting('INTERNAL_URL') + quote(name)
+        return response
+    if backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+
+    response_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if response_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+    f = open(path, 'rb')
+    if response_range is None:
+        # Streamed by the server with sendfile() if it supports wsgi.file_wrapper
+        response = FileResponse(f, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        (first, last) = response_range
+        response = FileResponse(RangeFile(f, first, last), status=206, content_type=content_type)
+        response['Content-Length'] = last - first + 1
+        response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Public media files (MEDIA_URL), when the front proxy does not serve them itself.
+    """
+    if not get_setting('PUBLIC'):
+        raise Http404()
+    return media_response(request, path)
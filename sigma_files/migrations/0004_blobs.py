@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 04:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import sigma_files.models
+import sigma_files.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sigma_files', '0003_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.PositiveIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='file',
+            field=models.ImageField(max_length=255, storage=sigma_files.storage.BlobStorage(), upload_to=sigma_files.models.img_path),
+        ),
+    ]
@@ -1,11 +1,78 @@
+import os
 import os.path
+import tempfile
+import uuid
+from datetime import timedelta
 
-from django.db import models
+from PIL import Image as PIL_Image
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jsonfield import JSONField
 
 from dry_rest_permissions.generics import allow_staff_or_superuser
 
 from sigma_core.models.user import User
 from sigma_core.models.group import Group
+from sigma_files.imaging import read_metadata
+from sigma_files.storage import blob_storage
+
+
+class BlobManager(models.Manager):
+    def acquire(self, name, size):
+        """
+        Take a reference on the blob name, creating it if needed. Return True if it was created: its file must be
+        written.
+        """
+        with transaction.atomic():
+            if self.filter(pk=name).update(ref_count=F('ref_count') + 1, updated=timezone.now()):
+                return False
+            try:
+                with transaction.atomic():
+                    self.create(name=name, size=size, ref_count=1)
+                return True
+            except IntegrityError:
+                # Created concurrently
+                self.filter(pk=name).update(ref_count=F('ref_count') + 1, updated=timezone.now())
+                return False
+
+    def release(self, name, delete_file):
+        """
+        Release a reference on the blob name. With the last one, delete the blob, and its file (with delete_file()) once
+        the deletion is committed.
+        """
+        with transaction.atomic():
+            self.filter(pk=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1, updated=timezone.now())
+            blob = self.select_for_update().filter(pk=name).first()
+            if blob is not None and blob.ref_count == 0:
+                blob.delete()
+            if blob is None or blob.ref_count == 0:
+                transaction.on_commit(lambda: self.delete_unreferenced_file(name, delete_file))
+
+    def delete_unreferenced_file(self, name, delete_file):
+        # The blob may have been acquired again (and its file written) since
+        if not self.filter(pk=name, ref_count__gt=0).exists():
+            delete_file()
+
+
+class Blob(models.Model):
+    """
+    A file of the content-addressed storage (see sigma_files.storage), shared by all the files with its content.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveIntegerField()
+    # Number of files (Image.file, variants...) stored as this blob
+    ref_count = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return self.name
 
 
 def img_path(instance, filename):
@@ -15,16 +82,67 @@ def img_path(instance, filename):
 
 
 class Image(models.Model):
-    file = models.ImageField(max_length=255, upload_to=img_path)
+    VARIANTS_PENDING = 'pending'
+    VARIANTS_READY = 'ready'
+    VARIANTS_FAILED = 'failed'
+    VARIANTS_STATUS_CHOICES = (
+        (VARIANTS_PENDING, 'Pending'),
+        (VARIANTS_READY, 'Ready'),
+        (VARIANTS_FAILED, 'Failed'),
+    )
+
+    file = models.ImageField(max_length=255, upload_to=img_path, storage=blob_storage)
     owner = models.ForeignKey(User)
     added = models.DateTimeField(auto_now_add=True)
+    # Also bumped when the variants are stored (see sigma.conditional)
+    updated = models.DateTimeField(auto_now=True)
+
+    # Computed at upload (see read_metadata), so that serializing an image never reads its file
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    size = models.PositiveIntegerField(null=True, blank=True)
+    mime_type = models.CharField(max_length=32, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    placeholder = models.CharField(max_length=7, blank=True)
+
+    # Sized copies rendered by sigma_files.variants: {name: {'width', 'height', 'files': {format: storage name}}}
+    variants = JSONField(default=dict, blank=True)
+    variants_status = models.CharField(max_length=8, choices=VARIANTS_STATUS_CHOICES, default=VARIANTS_PENDING)
 
     def __str__(self):
         return self.file.__str__()
 
-    def delete(self, *args, **kwargs):
-        self.file.delete(save=False)
-        return super(Image, self).delete(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        # A new upload (not stored yet): on creation, or replacing the file
+        if self.file and not self.file._committed:
+            self.read_metadata()
+        return super(Image, self).save(*args, **kwargs)
+
+    def read_metadata(self):
+        """
+        Fill the metadata fields from the file (left empty if it is not a valid image).
+        """
+        (self.width, self.height, self.size) = (None, None, None)
+        (self.mime_type, self.sha256, self.placeholder) = ('', '', '')
+        try:
+            self.file.open('rb')
+            try:
+                metadata = read_metadata(self.file)
+            finally:
+                # The upload is read again when it is stored
+                self.file.seek(0)
+        except (OSError, ValueError, PIL_Image.DecompressionBombError):
+            return
+        for (field, value) in metadata.items():
+            setattr(self, field, value)
+        # Spare the storage another reading of the file
+        if getattr(self.file.file, 'sha256', None) is None:
+            self.file.file.sha256 = metadata['sha256']
+
+    def delete_variants_files(self):
+        for variant in self.variants.values():
+            for name in variant['files'].values():
+                self.file.storage.delete(name)
 
     # Permissions
     @staticmethod
@@ -40,3 +158,80 @@ class Image(models.Model):
 
     def has_object_write_permission(self, request):
         return request.user == self.owner
+
+
+UPLOAD_SESSIONS_DEFAULTS = {
+    'DIRECTORY': None,              # Of the partial files (default: FILE_UPLOAD_TEMP_DIR, or the system's)
+    'MAX_SIZE': 20 * 1024 * 1024,   # Bytes
+    'EXPIRY': 24 * 3600,            # Seconds of inactivity after which a session is abandoned
+}
+
+def get_upload_sessions_setting(name):
+    return getattr(settings, 'UPLOAD_SESSIONS', {}).get(name, UPLOAD_SESSIONS_DEFAULTS[name])
+
+
+class UploadSessionManager(models.Manager):
+    def expiry_date(self):
+        return timezone.now() - timedelta(seconds=get_upload_sessions_setting('EXPIRY'))
+
+    def active(self):
+        return self.filter(updated__gte=self.expiry_date())
+
+    def expired(self):
+        return self.filter(updated__lt=self.expiry_date())
+
+    def delete_expired(self):
+        """
+        Delete the abandoned sessions (and their files). Return their number.
+        """
+        return self.expired().delete()[0]
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload: the file is sent in chunks (see UploadSessionViewSet), appended to a temporary file, then turned
+    into an Image.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    # Number of bytes received
+    offset = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = UploadSessionManager()
+
+    def __str__(self):
+        return '%s (%d/%d)' % (self.filename, self.offset, self.size)
+
+    @property
+    def path(self):
+        directory = get_upload_sessions_setting('DIRECTORY') or settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir()
+        return os.path.join(directory, 'sigma-upload-%s' % self.id.hex)
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def delete_file(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    # Permissions
+    @staticmethod
+    def has_read_permission(request):
+        return True
+
+    def has_object_read_permission(self, request):
+        return request.user == self.owner
+
+    @staticmethod
+    def has_write_permission(request):
+        return True
+
+    def has_object_write_permission(self, request):
+        return request.user == self.owner
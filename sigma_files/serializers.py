@@ -1,14 +1,48 @@
 from rest_framework import serializers
 
+from sigma.fieldsets import SparseFieldsMixin
 from sigma.utils import CurrentUserCreateOnlyDefault
-from sigma_files.models import Image
+from sigma_files.models import Image, UploadSession, get_upload_sessions_setting
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Image
+        field_sources = {'variants': ('variants', )}
 
     file = serializers.ImageField(max_length=255)
-    height = serializers.IntegerField(source='file.height', read_only=True)
-    width = serializers.IntegerField(source='file.width', read_only=True)
+    height = serializers.IntegerField(read_only=True)
+    width = serializers.IntegerField(read_only=True)
+    size = serializers.IntegerField(read_only=True)
+    mime_type = serializers.CharField(read_only=True)
+    sha256 = serializers.CharField(read_only=True)
+    placeholder = serializers.CharField(read_only=True)
     owner = serializers.PrimaryKeyRelatedField(read_only=True, default=CurrentUserCreateOnlyDefault())
+    variants = serializers.SerializerMethodField()
+    variants_status = serializers.CharField(read_only=True)
+
+    def get_variants(self, obj):
+        """
+        {name: {'width', 'height', 'urls': {format: url}}}, empty until the variants are rendered.
+        """
+        request = self.context.get('request')
+        # obj may be a values() record (see sigma.values_serializer): its file is a name
+        storage = Image._meta.get_field('file').storage
+        def url(name):
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return {name: {'width': v['width'], 'height': v['height'], 'urls': {fmt: url(f) for (fmt, f) in v['files'].items()}}
+            for (name, v) in obj.variants.items()}
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'filename', 'size', 'offset', 'created', 'updated', )
+        read_only_fields = ('offset', )
+
+    def validate_size(self, value):
+        max_size = get_upload_sessions_setting('MAX_SIZE')
+        if value == 0 or value > max_size:
+            raise serializers.ValidationError('The size must be between 1 and %d bytes.' % max_size)
+        return value
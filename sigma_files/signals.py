@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from sigma_files.models import Image, UploadSession
+
+
+@receiver(post_delete, sender=Image)
+def delete_image_files(sender, instance, **kwargs):
+    # Also run on cascade deletions (eg. of the owner), which do not call Image.delete()
+    instance.delete_variants_files()
+    instance.file.delete(save=False)
+
+
+@receiver(post_delete, sender=UploadSession)
+def delete_upload_session_file(sender, instance, **kwargs):
+    instance.delete_file()
@@ -0,0 +1,97 @@
+"""
+Content-addressed storage: files are named after the SHA-256 of their content, so that identical uploads share a
+single file (a blob).
+
+Every save() of a file takes a reference on its blob and every delete() releases one: the blob is written by the first
+reference only, and removed with the last one. Reference counts are kept in the Blob table (see the collect_blobs
+command for their reconciliation). Files saved before this storage was used keep their names and are simply deleted.
+
+The SHA-256 of uploads is computed while they are received by the upload handlers of sigma_files.uploadhandler: the
+content is only read again by the storage when it was not uploaded (eg. generated files).
+"""
+import hashlib
+import os
+import os.path
+
+from django.core.files import File, locks
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.utils.crypto import get_random_string
+from django.utils.deconstruct import deconstructible
+
+
+BLOBS_DIR = 'blobs'
+
+
+def hash_content(content):
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def is_blob_name(name):
+    return name.startswith(BLOBS_DIR + '/')
+
+
+@deconstructible
+class BlobStorage(FileSystemStorage):
+    def blob_name(self, sha256, name):
+        # The extension is kept for the web server to guess the content types
+        extension = os.path.splitext(name)[1].lower()[:10]
+        return '%s/%s/%s%s' % (BLOBS_DIR, sha256[:2], sha256, extension)
+
+    def save(self, name, content, max_length=None):
+        from sigma_files.models import Blob
+
+        if name is None:
+            name = content.name
+        if isinstance(content, FieldFile):
+            # Model fields save the uploaded file wrapped in their FieldFile
+            content = content.file
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        sha256 = getattr(content, 'sha256', None) or hash_content(content)
+        name = self.blob_name(sha256, name)
+
+        if Blob.objects.acquire(name, content.size) or not self.exists(name):
+            self.write(name, content)
+        return name
+
+    def write(self, name, content):
+        """
+        Write the file atomically: concurrent uploads of the same content may write it together.
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = '%s.%s.tmp' % (path, get_random_string(8))
+        if hasattr(content, 'temporary_file_path'):
+            # Uploads bigger than FILE_UPLOAD_MAX_MEMORY_SIZE are already on the disk
+            file_move_safe(content.temporary_file_path(), tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                locks.lock(f, locks.LOCK_EX)
+                for chunk in content.chunks():
+                    f.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(tmp_path, self.file_permissions_mode)
+        os.replace(tmp_path, path)
+
+    def delete(self, name):
+        from sigma_files.models import Blob
+
+        if not is_blob_name(name):
+            return self.delete_file(name)
+        Blob.objects.release(name, lambda: self.delete_file(name))
+
+    def delete_file(self, name):
+        """
+        Delete the file itself, whatever its references.
+        """
+        super(BlobStorage, self).delete(name)
+
+
+blob_storage = BlobStorage()
@@ -1,17 +1,40 @@
+import hashlib
+import io
 import json
+import os
+from datetime import timedelta
+from unittest import mock
 from PIL import Image as PIL_Image
 
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.test import APITestCase, force_authenticate
 
 from sigma_core.tests.factories import UserFactory
 from sigma_core.serializers.user import UserSerializer
-from sigma_files.models import Image
+from sigma_files.models import Blob, Image, UploadSession
 from sigma_files.serializers import ImageSerializer
+from sigma_files.imaging import render_variants
+from sigma_files.storage import BlobStorage, blob_storage
+from sigma_files.variants import PipelineSaturated, VariantsPipeline, get_pipeline, process_upload
 
 
+def run_on_commit_callbacks():
+    """
+    Run the callbacks registered with transaction.on_commit(), which TestCase never commits.
+    """
+    callbacks = connection.run_on_commit
+    connection.run_on_commit = []
+    for (savepoints, callback) in callbacks:
+        callback()
+
 class ImageTests(APITestCase):
     @classmethod
     def setUpTestData(self):
@@ -76,3 +99,567 @@ class ImageTests(APITestCase):
         except Image.DoesNotExist:
             img = None # File has been deleted
         self.assertEqual(img, None)
+
+
+@override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16, 'medium': 64}})
+class ImageVariantsTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(ImageVariantsTests, self).setUpTestData()
+        self.user = UserFactory()
+        self.images_url = '/image/'
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, content, name='test.jpg'):
+        response = self.client.post(self.images_url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_on_commit_callbacks()
+        image = Image.objects.get(pk=response.data['id'])
+        self.addCleanup(self.delete_files, image.id)
+        return image
+
+    def delete_files(self, image_id):
+        for image in Image.objects.filter(pk=image_id):
+            image.delete()
+
+    def open_variant(self, image, name, fmt):
+        return PIL_Image.open(image.file.storage.open(image.variants[name]['files'][fmt]))
+
+    def test_upload_renders_variants(self):
+        with open("sigma_files/test_img.png", "rb") as img:
+            image = self.upload(img.read(), 'test.png')
+        self.assertEqual(image.variants_status, Image.VARIANTS_READY)
+        self.assertEqual(set(image.variants), {'thumb', 'medium'})
+        # Transparency is kept: PNG. The aspect ratio is kept (273x297)
+        self.assertEqual(image.variants['thumb']['files'].keys(), {'png'})
+        self.assertEqual((image.variants['thumb']['width'], image.variants['thumb']['height']), (15, 16))
+        self.assertEqual(self.open_variant(image, 'medium', 'png').size, (59, 64))
+
+        response = self.client.get(self.images_url + '%d/' % image.id)
+        self.assertEqual(response.data['variants_status'], 'ready')
+        self.assertEqual(response.data['variants']['thumb']['width'], 15)
+        self.assertTrue(response.data['variants']['thumb']['urls']['png'].startswith('http://testserver/media/blobs/'))
+
+    def test_exif_orientation_and_metadata(self):
+        # Landscape pixels, displayed as portrait (rotated by 90°)
+        exif = PIL_Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010f] = 'Camera maker'
+        buf = io.BytesIO()
+        PIL_Image.new('RGB', (40, 20), 'red').save(buf, 'JPEG', exif=exif.tobytes())
+        image = self.upload(buf.getvalue())
+        thumb = self.open_variant(image, 'thumb', 'jpeg')
+        self.assertEqual(thumb.size, (8, 16))
+        self.assertEqual(dict(thumb.getexif()), {})
+
+    def test_no_upscale(self):
+        buf = io.BytesIO()
+        PIL_Image.new('RGB', (10, 5)).save(buf, 'JPEG')
+        image = self.upload(buf.getvalue())
+        self.assertEqual(self.open_variant(image, 'medium', 'jpeg').size, (10, 5))
+
+    @override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16}, 'WEBP': True})
+    def test_webp(self):
+        buf = io.BytesIO()
+        PIL_Image.new('RGB', (32, 32)).save(buf, 'JPEG')
+        image = self.upload(buf.getvalue())
+        self.assertEqual(image.variants['thumb']['files'].keys(), {'jpeg', 'webp'})
+        self.assertEqual(self.open_variant(image, 'thumb', 'webp').format, 'WEBP')
+
+    def test_invalid_image_fails(self):
+        image = Image.objects.create(file=SimpleUploadedFile('test.jpg', b'not an image'), owner=self.user)
+        self.addCleanup(self.delete_files, image.id)
+        pipeline = get_pipeline()
+        pipeline.reserve()
+        pipeline.submit(image)
+        self.assertEqual(Image.objects.get(pk=image.id).variants_status, Image.VARIANTS_FAILED)
+
+    def test_delete_removes_variants(self):
+        buf = io.BytesIO()
+        PIL_Image.new('RGB', (32, 32)).save(buf, 'JPEG')
+        image = self.upload(buf.getvalue())
+        files = [f for v in image.variants.values() for f in v['files'].values()]
+        self.assertTrue(all(image.file.storage.exists(f) for f in files))
+        image.delete()
+        run_on_commit_callbacks()
+        self.assertFalse(any(image.file.storage.exists(f) for f in files))
+
+    def test_saturated_pipeline(self):
+        pipeline = get_pipeline()
+        reserved = 0
+        try:
+            while True:
+                pipeline.reserve()
+                reserved += 1
+        except PipelineSaturated:
+            pass
+        try:
+            with open("sigma_files/test_img.png", "rb") as img:
+                response = self.client.post(self.images_url, {'file': img}, format='multipart')
+        finally:
+            for _ in range(reserved):
+                pipeline.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(Image.objects.filter(owner=self.user).exists())
+
+    def test_rolled_back_upload_keeps_no_slot(self):
+        pipeline = get_pipeline()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                process_upload(lambda: Image.objects.create(file=SimpleUploadedFile('test.jpg', b'data'), owner=self.user))
+                raise RuntimeError
+        run_on_commit_callbacks()
+        for _ in range(pipeline.capacity):
+            pipeline.reserve()
+        for _ in range(pipeline.capacity):
+            pipeline.release()
+
+    def test_saturated_on_commit(self):
+        pipeline = get_pipeline()
+        image = process_upload(lambda: Image.objects.create(file=SimpleUploadedFile('test.jpg', b'data'), owner=self.user))
+        self.addCleanup(self.delete_files, image.id)
+        for _ in range(pipeline.capacity):
+            pipeline.reserve()
+        try:
+            run_on_commit_callbacks()
+        finally:
+            for _ in range(pipeline.capacity):
+                pipeline.release()
+        # Left to the render_image_variants command
+        self.assertEqual(Image.objects.get(pk=image.id).variants_status, Image.VARIANTS_PENDING)
+
+    def test_worker_pool(self):
+        # The rendering runs in a separate process
+        pipeline = VariantsPipeline(1, 0)
+        try:
+            renders = pipeline.get_pool().apply(render_variants, ("sigma_files/test_img.png", {'thumb': 16}))
+        finally:
+            pipeline.get_pool().terminate()
+        self.assertEqual([r[:4] for r in renders], [('thumb', 'png', 15, 16)])
+
+
+@override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16}})
+class ImageMetadataTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(ImageMetadataTests, self).setUpTestData()
+        self.user = UserFactory()
+        with open("sigma_files/test_img.png", "rb") as img:
+            self.content = img.read()
+
+    def create_image(self, content=None):
+        image = Image.objects.create(file=SimpleUploadedFile('test.png', content or self.content), owner=self.user)
+        self.addCleanup(image.delete)
+        return image
+
+    def test_upload(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/image/', {'file': SimpleUploadedFile('test.png', self.content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        Image.objects.get(pk=response.data['id']).delete()
+        self.assertEqual((response.data['width'], response.data['height']), (273, 297))
+        self.assertEqual(response.data['size'], len(self.content))
+        self.assertEqual(response.data['mime_type'], 'image/png')
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.content).hexdigest())
+        self.assertRegex(response.data['placeholder'], '^#[0-9a-f]{6}$')
+
+    def test_exif_orientation(self):
+        exif = PIL_Image.Exif()
+        exif[0x0112] = 8
+        buf = io.BytesIO()
+        PIL_Image.new('RGB', (40, 20), (255, 0, 0)).save(buf, 'JPEG', exif=exif.tobytes())
+        image = self.create_image(buf.getvalue())
+        self.assertEqual((image.width, image.height), (20, 40))
+        self.assertEqual(image.mime_type, 'image/jpeg')
+        self.assertEqual(image.placeholder[:3], '#fe')
+
+    def test_invalid_image(self):
+        image = self.create_image(b'not an image')
+        self.assertIsNone(image.width)
+        self.assertEqual(image.sha256, '')
+        # The file is stored in full nonetheless
+        self.assertEqual(image.file.read(), b'not an image')
+
+    def test_serialization_does_not_read_the_file(self):
+        image = self.create_image()
+        image.file.storage.delete(image.file.name)
+        data = ImageSerializer(Image.objects.get(pk=image.id)).data
+        self.assertEqual((data['width'], data['height']), (273, 297))
+
+    def test_backfill(self):
+        images = [self.create_image(), self.create_image(b'not an image')]
+        Image.objects.update(width=None, height=None, size=None, mime_type='', sha256='', placeholder='')
+        out = io.StringIO()
+        call_command('backfill_image_metadata', workers=1, stdout=out, stderr=io.StringIO())
+        self.assertIn('1 images done, 1 unreadable.', out.getvalue())
+        image = Image.objects.get(pk=images[0].id)
+        self.assertEqual((image.width, image.height, image.size), (273, 297, len(self.content)))
+        self.assertEqual(image.sha256, hashlib.sha256(self.content).hexdigest())
+
+
+@override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16}})
+class BlobStorageTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(BlobStorageTests, self).setUpTestData()
+        self.user = UserFactory()
+        with open("sigma_files/test_img.png", "rb") as img:
+            self.content = img.read()
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+
+    def create_image(self, content=None, owner=None):
+        image = Image.objects.create(file=SimpleUploadedFile('test.PNG', content or self.content), owner=owner or self.user)
+        self.addCleanup(self.delete_files, image.id)
+        return image
+
+    def delete_files(self, image_id):
+        for image in Image.objects.filter(pk=image_id):
+            image.delete()
+
+    def test_deduplication(self):
+        with mock.patch.object(BlobStorage, 'write', wraps=blob_storage.write) as write:
+            images = [self.create_image(), self.create_image()]
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(images[0].file.name, 'blobs/%s/%s.png' % (self.sha256[:2], self.sha256))
+        self.assertEqual(images[1].file.name, images[0].file.name)
+        blob = Blob.objects.get(pk=images[0].file.name)
+        self.assertEqual((blob.ref_count, blob.size), (2, len(self.content)))
+
+        images[0].delete()
+        self.assertEqual(Blob.objects.get(pk=blob.name).ref_count, 1)
+        self.assertTrue(blob_storage.exists(blob.name))
+        images[1].delete()
+        self.assertFalse(Blob.objects.filter(pk=blob.name).exists())
+        self.assertTrue(blob_storage.exists(blob.name))
+        run_on_commit_callbacks()
+        self.assertFalse(blob_storage.exists(blob.name))
+
+    def test_rolled_back_deletion_keeps_file(self):
+        image = self.create_image()
+        name = image.file.name
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                image.delete()
+                raise RuntimeError
+        run_on_commit_callbacks()
+        self.assertEqual(Blob.objects.get(pk=name).ref_count, 1)
+        self.assertTrue(blob_storage.exists(name))
+
+    def test_acquired_again_before_commit(self):
+        image = self.create_image()
+        name = image.file.name
+        image.delete()
+        self.create_image()
+        run_on_commit_callbacks()
+        self.assertEqual(Blob.objects.get(pk=name).ref_count, 1)
+        self.assertTrue(blob_storage.exists(name))
+
+    def test_replace_file(self):
+        image = self.create_image()
+        get_pipeline().reserve()
+        get_pipeline().submit(image)
+        image = Image.objects.get(pk=image.id)
+        (name, thumb) = (image.file.name, image.variants['thumb']['files']['png'])
+
+        content = io.BytesIO()
+        PIL_Image.new('RGB', (40, 20), (255, 0, 0)).save(content, 'JPEG')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.put('/image/%d/' % image.id, {'file': SimpleUploadedFile('new.jpg', content.getvalue())}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        run_on_commit_callbacks()
+        self.assertEqual((response.data['width'], response.data['height'], response.data['mime_type']), (40, 20, 'image/jpeg'))
+        image = Image.objects.get(pk=image.id)
+        self.assertEqual(image.sha256, hashlib.sha256(content.getvalue()).hexdigest())
+        self.assertEqual(image.variants['thumb']['width'], 16)
+        # The previous file and variants are released
+        self.assertFalse(Blob.objects.filter(pk__in=[name, thumb]).exists())
+        run_on_commit_callbacks()
+        self.assertFalse(blob_storage.exists(name))
+
+    def test_missing_file_is_written_again(self):
+        image = self.create_image()
+        blob_storage.delete_file(image.file.name)
+        self.create_image()
+        self.assertTrue(blob_storage.exists(image.file.name))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_upload_is_hashed_while_received(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch('sigma_files.storage.hash_content', side_effect=AssertionError('Hashed again')):
+            response = self.client.post('/image/', {'file': SimpleUploadedFile('test.png', self.content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = Image.objects.get(pk=response.data['id'])
+        self.addCleanup(self.delete_files, image.id)
+        self.assertIn(self.sha256, image.file.name)
+
+    def test_cascade_deletion(self):
+        owner = UserFactory()
+        image = self.create_image(owner=owner)
+        name = image.file.name
+        owner.delete()
+        self.assertFalse(Blob.objects.filter(pk=name).exists())
+        run_on_commit_callbacks()
+        self.assertFalse(blob_storage.exists(name))
+
+    def test_variants_are_blobs(self):
+        image = self.create_image()
+        get_pipeline().reserve()
+        get_pipeline().submit(image)
+        image = Image.objects.get(pk=image.id)
+        thumb = image.variants['thumb']['files']['png']
+        self.assertTrue(thumb.startswith('blobs/'))
+        self.assertEqual(Blob.objects.get(pk=thumb).ref_count, 1)
+
+    def test_collect_blobs(self):
+        image = self.create_image()
+        get_pipeline().reserve()
+        get_pipeline().submit(image)
+        orphan = blob_storage.save('orphan.txt', ContentFile(b'orphan'))
+        Blob.objects.filter(pk=image.file.name).update(ref_count=5)
+        Blob.objects.filter(pk=orphan).update(ref_count=0)
+
+        # Recent blobs are left alone
+        out = io.StringIO()
+        call_command('collect_blobs', stdout=out)
+        self.assertIn('0 drifted blobs fixed, 0 collected.', out.getvalue())
+
+        Blob.objects.update(updated=timezone.now() - timedelta(days=1))
+        with self.assertRaises(CommandError):
+            call_command('collect_blobs', check=True, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('collect_blobs', stdout=out)
+        # The count of the image (its variant is right), the orphan
+        self.assertIn('2 drifted blobs fixed, 1 collected.', out.getvalue())
+        self.assertEqual(Blob.objects.get(pk=image.file.name).ref_count, 1)
+        self.assertFalse(Blob.objects.filter(pk=orphan).exists())
+        self.assertFalse(blob_storage.exists(orphan))
+
+
+@override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16}}, UPLOAD_SESSIONS={'MAX_SIZE': 1024 * 1024})
+class UploadSessionTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(UploadSessionTests, self).setUpTestData()
+        self.user = UserFactory()
+        self.other_user = UserFactory()
+        with open("sigma_files/test_img.png", "rb") as img:
+            self.content = img.read()
+        self.uploads_url = '/upload/'
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def create_session(self, size=None):
+        response = self.client.post(self.uploads_url, {'filename': 'photo.png', 'size': size or len(self.content)})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        session = UploadSession.objects.get(pk=response.data['id'])
+        self.addCleanup(session.delete_file)
+        return session
+
+    def put_chunk(self, session, first, last, data=None, **extra):
+        data = self.content[first:last + 1] if data is None else data
+        return self.client.put(self.uploads_url + '%s/' % session.id, data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE='bytes %d-%d/%d' % (first, last, session.size), **extra)
+
+    def finalize(self, session):
+        return self.client.post(self.uploads_url + '%s/finalize/' % session.id)
+
+    def test_upload(self):
+        session = self.create_session()
+        self.assertEqual(os.path.getsize(session.path), 0)
+        chunk = 4096
+        for first in range(0, len(self.content), chunk):
+            last = min(first + chunk, len(self.content)) - 1
+            response = self.put_chunk(session, first, last)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['offset'], last + 1)
+
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_on_commit_callbacks()
+        image = Image.objects.get(pk=response.data['id'])
+        self.addCleanup(image.delete)
+        self.assertEqual(image.owner, self.user)
+        self.assertEqual(image.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(image.variants_status, Image.VARIANTS_READY)
+        self.assertEqual(image.file.read(), self.content)
+        # The partial file was moved to the storage
+        self.assertFalse(UploadSession.objects.filter(pk=session.pk).exists())
+        self.assertFalse(os.path.exists(session.path))
+
+    def test_resume(self):
+        session = self.create_session()
+        # The client goes away in the middle of the chunk
+        response = self.put_chunk(session, 0, 999, data=b'', CONTENT_LENGTH='1000', **{'wsgi.input': io.BytesIO(self.content[:600])})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['offset'], 600)
+        response = self.client.get(self.uploads_url + '%s/' % session.id)
+        self.assertEqual(response.data['offset'], 600)
+
+        # Chunks must start at the offset
+        response = self.put_chunk(session, 1000, len(self.content) - 1)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 600)
+
+        response = self.put_chunk(session, 600, len(self.content) - 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = Image.objects.get(pk=response.data['id'])
+        self.addCleanup(image.delete)
+        self.assertEqual(image.file.read(), self.content)
+
+    def test_invalid_ranges(self):
+        session = self.create_session()
+        url = self.uploads_url + '%s/' % session.id
+        response = self.client.put(url, b'abc', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Beyond the size of the file
+        response = self.put_chunk(session, 0, len(self.content), data=self.content + b'x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Length of the body
+        response = self.put_chunk(session, 0, 9, data=b'abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_too_big(self):
+        response = self.client.post(self.uploads_url, {'filename': 'photo.png', 'size': 1024 * 1024 + 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_finalize_incomplete(self):
+        session = self.create_session()
+        self.put_chunk(session, 0, 99)
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['offset'], 100)
+
+    def test_finalize_not_an_image(self):
+        session = self.create_session(size=10)
+        response = self.put_chunk(session, 0, 9, data=b'0123456789')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.finalize(session)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.filter(owner=self.user).exists())
+
+    def test_other_user(self):
+        session = self.create_session()
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.client.get(self.uploads_url + '%s/' % session.id).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.put_chunk(session, 0, 99).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_abort(self):
+        session = self.create_session()
+        response = self.client.delete(self.uploads_url + '%s/' % session.id)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(session.path))
+
+    def test_abandoned_sessions(self):
+        abandoned = self.create_session()
+        UploadSession.objects.filter(pk=abandoned.pk).update(updated=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.client.get(self.uploads_url + '%s/' % abandoned.id).status_code, status.HTTP_404_NOT_FOUND)
+        out = io.StringIO()
+        call_command('clean_upload_sessions', stdout=out)
+        self.assertIn('1 abandoned upload sessions deleted.', out.getvalue())
+        self.assertFalse(os.path.exists(abandoned.path))
+
+        # Also deleted when a session is created
+        abandoned = self.create_session()
+        UploadSession.objects.filter(pk=abandoned.pk).update(updated=timezone.now() - timedelta(days=2))
+        self.create_session()
+        self.assertFalse(UploadSession.objects.filter(pk=abandoned.pk).exists())
+
+
+@override_settings(IMAGE_VARIANTS={'EAGER': True, 'SIZES': {'thumb': 16}})
+class MediaTests(APITestCase):
+    @classmethod
+    def setUpTestData(self):
+        super(MediaTests, self).setUpTestData()
+        self.user = UserFactory()
+        with open("sigma_files/test_img.png", "rb") as img:
+            self.content = img.read()
+
+    def setUp(self):
+        self.image = Image.objects.create(file=SimpleUploadedFile('test.png', self.content), owner=self.user)
+        self.addCleanup(self.image.delete)
+        self.url = '/media/' + self.image.file.name
+
+    def get(self, url, data=None, **extra):
+        response = self.client.get(url, data, **extra)
+        if response.streaming:
+            response.content_bytes = b''.join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_serve(self):
+        response = self.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content_bytes, self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response = self.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_ranges(self):
+        response = self.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response.content_bytes, self.content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/%d' % len(self.content))
+        self.assertEqual(response['Content-Length'], '10')
+
+        response = self.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.content_bytes, self.content[-5:])
+        response = self.get(self.url, HTTP_RANGE='bytes=%d-' % (len(self.content) - 3))
+        self.assertEqual(response.content_bytes, self.content[-3:])
+
+        response = self.get(self.url, HTTP_RANGE='bytes=%d-' % len(self.content))
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */%d' % len(self.content))
+        # Multiple ranges are not supported: the whole file is sent
+        response = self.get(self.url, HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_not_found(self):
+        self.assertEqual(self.get('/media/img/nothing.png').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get('/media/../sigma/settings_default.py').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get('/media/blobs/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(MEDIA_SERVING={'BACKEND': 'nginx'})
+    def test_nginx(self):
+        response = self.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.image.file.name)
+        self.assertEqual(response.content, b'')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @override_settings(MEDIA_SERVING={'BACKEND': 'sendfile'})
+    def test_sendfile(self):
+        response = self.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.image.file.path)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SERVING={'PUBLIC': False})
+    def test_download(self):
+        self.assertEqual(self.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        download_url = '/image/%d/download/' % self.image.id
+        self.assertEqual(self.get(download_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.get(download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content_bytes, self.content)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+
+        get_pipeline().reserve()
+        get_pipeline().submit(self.image)
+        response = self.get(download_url, {'variant': 'thumb', 'file_format': 'png'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PIL_Image.open(io.BytesIO(response.content_bytes)).size, (15, 16))
+        self.assertEqual(self.get(download_url, {'variant': 'huge'}).status_code, status.HTTP_404_NOT_FOUND)
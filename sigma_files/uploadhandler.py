@@ -0,0 +1,34 @@
+"""
+Upload handlers computing the SHA-256 of the uploaded files while they are received, for the content-addressed
+storage (see sigma_files.storage). The hash is set as the `sha256` attribute of the uploaded files.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin(object):
+    def new_file(self, *args, **kwargs):
+        # Before calling the handler: it raises StopFutureHandlers when it takes the file
+        self.sha256 = hashlib.sha256()
+        super(HashingMixin, self).new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # The memory handler passes the files which are too big for it on to the next handler
+        if getattr(self, 'activated', True):
+            self.sha256.update(raw_data)
+        return super(HashingMixin, self).receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super(HashingMixin, self).file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.sha256.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,206 @@
+"""
+Asynchronous rendering of the sized variants (thumbnails...) of the uploaded images.
+
+Uploads check that the pipeline has a slot left before the image is saved, and return as soon as the job is queued
+(once the image is committed): the variants are rendered by a bounded pool of worker processes (see
+sigma_files.imaging), then stored next to the original and recorded on the Image row. When every slot is taken, uploads are refused with a 503 until the pool catches up.
+Settings:
+
+    IMAGE_VARIANTS = {
+        'SIZES': {'thumb': 128, 'medium': 512, 'large': 1600},  # Maximal length of the longest side
+        'WEBP': False,      # Also encode the variants as WebP
+        'QUALITY': 85,
+        'WORKERS': 2,       # Worker processes
+        'QUEUE_SIZE': 16,   # Jobs waiting for a worker, beyond which uploads are refused
+        'EAGER': False,     # Render in the request itself (tests)
+    }
+"""
+import logging
+import os.path
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from sigma_files.imaging import FORMATS, get_context, render_variants
+
+
+logger = logging.getLogger('sigma_files.variants')
+
+DEFAULTS = {
+    'SIZES': {'thumb': 128, 'medium': 512, 'large': 1600},
+    'WEBP': False,
+    'QUALITY': 85,
+    'WORKERS': 2,
+    'QUEUE_SIZE': 16,
+    'EAGER': False,
+}
+
+def get_setting(name):
+    return getattr(settings, 'IMAGE_VARIANTS', {}).get(name, DEFAULTS[name])
+
+
+class PipelineSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many images are being processed, please retry later.'
+    # Sent as Retry-After
+    wait = 5
+
+
+def variant_path(image, name, fmt):
+    return '%s_%s.%s' % (os.path.splitext(image.file.name)[0], name, FORMATS[fmt][1])
+
+
+def store_variants(image_id, renders):
+    """
+    Save the rendered variants of an image and record them on its row, replacing its previous variants.
+    """
+    from sigma_files.models import Image
+    try:
+        image = Image.objects.get(pk=image_id)
+    except Image.DoesNotExist:
+        # Deleted in the meantime
+        return
+    image.delete_variants_files()
+    variants = {}
+    for (name, fmt, width, height, data) in renders:
+        variant = variants.setdefault(name, {'width': width, 'height': height, 'files': {}})
+        variant['files'][fmt] = image.file.storage.save(variant_path(image, name, fmt), ContentFile(data))
+    Image.objects.filter(pk=image_id).update(variants=variants, variants_status=Image.VARIANTS_READY, updated=timezone.now())
+
+
+def mark_failed(image_id):
+    from sigma_files.models import Image
+    Image.objects.filter(pk=image_id).update(variants_status=Image.VARIANTS_FAILED, updated=timezone.now())
+
+
+class VariantsPipeline(object):
+    """
+    Bounded pool of processes rendering the variants. At most workers + queue_size jobs are queued or running.
+    """
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                # Recycle the workers from time to time: decoding big images fragments their memory
+                self.pool = get_context().Pool(self.workers, maxtasksperchild=100)
+            return self.pool
+
+    def reserve(self, blocking=False):
+        """
+        Take a slot for a job, to be handed over to submit(). Raise PipelineSaturated if there is none left.
+        """
+        if not self.slots.acquire(blocking=blocking):
+            raise PipelineSaturated()
+
+    def release(self):
+        self.slots.release()
+
+    def submit(self, image):
+        """
+        Render the variants of an image: in the background, unless EAGER is set. A slot must have been reserved.
+        """
+        args = (image.file.path, get_setting('SIZES'), get_setting('WEBP'), get_setting('QUALITY'))
+        if get_setting('EAGER'):
+            try:
+                self.done(image.id, render_variants(*args))
+            except Exception as err:
+                self.failed(image.id, err)
+            return
+        try:
+            self.get_pool().apply_async(render_variants, args,
+                callback=self.in_result_thread(self.done, image.id),
+                error_callback=self.in_result_thread(self.failed, image.id))
+        except BaseException:
+            self.release()
+            raise
+
+    def submit_committed(self, image):
+        """
+        Reserve a slot and submit an uploaded image. If the slots have been taken since the upload was accepted, leave
+        its variants pending, for the render_image_variants command.
+        """
+        try:
+            self.reserve()
+        except PipelineSaturated:
+            logger.warning('Pipeline saturated, the variants of image %d are left pending', image.id)
+            return
+        self.submit(image)
+
+    @staticmethod
+    def in_result_thread(callback, image_id):
+        # The result thread of the pool lives as long as the pool: do not let its connection go stale
+        def run(result):
+            close_old_connections()
+            callback(image_id, result)
+        return run
+
+    # The callbacks must not raise (they run in the result thread of the pool)
+
+    def done(self, image_id, renders):
+        try:
+            store_variants(image_id, renders)
+        except Exception:
+            logger.exception('Could not store the variants of image %d', image_id)
+            self.mark_failed(image_id)
+        finally:
+            self.release()
+
+    def failed(self, image_id, err):
+        try:
+            logger.error('Could not render the variants of image %d: %r', image_id, err)
+            self.mark_failed(image_id)
+        finally:
+            self.release()
+
+    def mark_failed(self, image_id):
+        try:
+            mark_failed(image_id)
+        except Exception:
+            logger.exception('Could not mark image %d as failed', image_id)
+
+    def join(self):
+        """
+        Wait for every queued job to be done.
+        """
+        for _ in range(self.capacity):
+            self.slots.acquire()
+        for _ in range(self.capacity):
+            self.slots.release()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = VariantsPipeline(get_setting('WORKERS'), get_setting('QUEUE_SIZE'))
+        return _pipeline
+
+
+def process_upload(save):
+    """
+    Call save() which must return the new Image, and queue the rendering of its variants once the image is committed
+    (right away outside of a transaction): the workers would not see it before. Raise PipelineSaturated, before saving
+    anything, if there is no slot left.
+    """
+    pipeline = get_pipeline()
+    # Only a check: the slot is taken on commit, a rolled back upload must not keep it
+    pipeline.reserve()
+    pipeline.release()
+    image = save()
+    transaction.on_commit(lambda: pipeline.submit_committed(image))
+    return image
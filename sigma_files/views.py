@@ -1,12 +1,19 @@
-from django.http import Http404
+import re
 
-from rest_framework import viewsets, decorators, status, parsers
+from django.core.files import File
+from django.http import Http404, UnreadablePostError
+from django.utils import timezone
+
+from rest_framework import viewsets, mixins, decorators, status, parsers
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from dry_rest_permissions.generics import DRYPermissions
 
-from sigma_files.models import Image
-from sigma_files.serializers import ImageSerializer
+from sigma_files.media import media_response
+from sigma_files.models import Image, UploadSession
+from sigma_files.serializers import ImageSerializer, UploadSessionSerializer
+from sigma_files.variants import process_upload
 
 
 class ImageViewSet(viewsets.ModelViewSet):
@@ -14,3 +21,161 @@ class ImageViewSet(viewsets.ModelViewSet):
     serializer_class = ImageSerializer
     permission_classes = [IsAuthenticated, DRYPermissions, ]
     parser_classes = [parsers.JSONParser, parsers.MultiPartParser, ]
+
+    def perform_create(self, serializer):
+        # Returns before the variants are rendered (or answers 503 if the pipeline is saturated)
+        process_upload(serializer.save)
+
+    def perform_update(self, serializer):
+        if 'file' not in serializer.validated_data:
+            serializer.save()
+            return
+        # A new file: release the previous one and its variants, and render the new variants
+        previous = Image.objects.get(pk=serializer.instance.pk)
+        def save():
+            image = serializer.save(variants={}, variants_status=Image.VARIANTS_PENDING)
+            previous.delete_variants_files()
+            previous.file.delete(save=False)
+            return image
+        process_upload(save)
+
+    @decorators.detail_route(methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Send the file of the image, or one of its variants, once its read permission is checked. The transfer itself
+        is done by the front proxy when there is one (see sigma_files.media).
+        ---
+        omit_serializer: true
+        parameters_strategy:
+            query: replace
+        parameters:
+            - name: variant
+              type: string
+              paramType: query
+            - name: file_format
+              type: string
+              paramType: query
+        """
+        image = self.get_object()
+        name = image.file.name
+        if 'variant' in request.query_params:
+            files = image.variants.get(request.query_params['variant'], {}).get('files', {})
+            # Not "format", which selects the renderer
+            name = files.get(request.query_params.get('file_format')) or next(iter(sorted(files.values())), None)
+            if name is None:
+                raise Http404()
+        return media_response(request, name, public=False)
+
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+# Bytes read from the request at once
+CHUNK_SIZE = 64 * 1024
+
+
+class SessionFile(File):
+    """
+    The file of a complete upload session: the storage moves it rather than copying it.
+    """
+    def __init__(self, file, name, path):
+        super(SessionFile, self).__init__(file, name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads of images. The client creates a session with the name and size of the file, sends the file in
+    chunks (PUT, in order), possibly resuming from the offset of the session after a failure, then finalizes the
+    session into an Image. Sessions left inactive for UPLOAD_SESSIONS['EXPIRY'] seconds are deleted.
+    """
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated, DRYPermissions, ]
+    parser_classes = [parsers.JSONParser, ]
+
+    def get_queryset(self):
+        # The sessions of the others, and the abandoned ones, do not exist
+        return UploadSession.objects.active().filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        UploadSession.objects.delete_expired()
+        session = serializer.save(owner=self.request.user)
+        open(session.path, 'wb').close()
+
+    def update(self, request, pk=None):
+        """
+        Send a chunk of the file: its bytes are the body of the request, and their position is given by the
+        Content-Range header ("bytes first-last/size"). Chunks must be sent in order: if the chunk does not start at
+        the offset of the session, answers 409 with the offset to resume from.
+        ---
+        omit_serializer: true
+        """
+        session = self.get_object()
+        match = CONTENT_RANGE.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if match is None:
+            return Response({'detail': 'Missing or invalid Content-Range header.'}, status=status.HTTP_400_BAD_REQUEST)
+        (first, last, size) = (int(x) for x in match.groups())
+        length = last - first + 1
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = None
+        if size != session.size or last >= size or length <= 0 or content_length != length:
+            return Response({'detail': 'Invalid range.'}, status=status.HTTP_400_BAD_REQUEST)
+        if first != session.offset:
+            return Response({'offset': session.offset}, status=status.HTTP_409_CONFLICT)
+
+        received = self.write_chunk(session, request.stream, first, length)
+        # When the same chunk is sent twice concurrently, only one is counted
+        UploadSession.objects.filter(pk=session.pk, offset=first).update(offset=first + received, updated=timezone.now())
+        session.refresh_from_db()
+        if received < length:
+            return Response({'detail': 'Incomplete chunk.', 'offset': session.offset}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UploadSessionSerializer(session).data)
+
+    @staticmethod
+    def write_chunk(session, stream, first, length):
+        """
+        Copy the body of the request at its place in the file, without buffering it. Return the number of bytes
+        written (less than length if the client went away).
+        """
+        try:
+            f = open(session.path, 'r+b')
+        except FileNotFoundError:
+            raise NotFound()
+        with f:
+            f.seek(first)
+            remaining = length
+            while remaining:
+                try:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                except UnreadablePostError:
+                    break
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        return length - remaining
+
+    @decorators.detail_route(methods=['post'])
+    def finalize(self, request, pk=None):
+        """
+        Turn a complete upload into an Image (validated as an uploaded image), and delete the session.
+        ---
+        omit_serializer: true
+        """
+        session = self.get_object()
+        if not session.is_complete:
+            return Response({'detail': 'The upload is not complete.', 'offset': session.offset}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            f = open(session.path, 'rb')
+        except FileNotFoundError:
+            raise NotFound()
+        with f:
+            s = ImageSerializer(data={'file': SessionFile(f, session.filename, session.path)}, context=self.get_serializer_context())
+            s.is_valid(raise_exception=True)
+            image = process_upload(lambda: s.save(owner=request.user))
+        session.delete()
+        return Response(ImageSerializer(image, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)